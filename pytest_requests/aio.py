@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio-native mock transport serving the routes of a
+:class:`pytest_requests.router.RequestsRouterAdapter`.
+
+:class:`AsyncTransport` can be used directly through :meth:`AsyncTransport.send`,
+or plugged into ``httpx.AsyncClient(transport=...)``.
+"""
+
+from requests.models import PreparedRequest
+from requests.structures import CaseInsensitiveDict
+import asyncio
+import json
+from .clock import VirtualClock, read_timeout
+from .faults import READ_TIMEOUT, TRUNCATED_BODY
+from . import stats
+
+__all__ = ["AsyncTransport", "AsyncResponse", "aiter_chunks"]
+
+
+async def _wait(clock, seconds):
+    if isinstance(clock, VirtualClock):
+        clock.sleep(seconds)
+    else:
+        await asyncio.sleep(seconds)
+
+
+async def _throttled(chunks, clock, bandwidth, limit):
+    async for chunk in chunks:
+        delay = len(chunk) / bandwidth
+        if limit is not None and delay > limit:
+            await _wait(clock, limit)
+            raise asyncio.TimeoutError(
+                "Simulated transfer of {0}s exceeds the read timeout of {1}s".format(
+                    delay, limit
+                )
+            )
+        await _wait(clock, delay)
+        yield chunk
+
+
+async def _truncated(chunks, fraction):
+    content = b"".join([chunk async for chunk in chunks])
+    yield content[: int(len(content) * fraction)]
+    raise ConnectionError("Simulated truncated body")
+
+
+async def _counted(chunks, traffic):
+    async for chunk in chunks:
+        traffic.add_bytes(len(chunk))
+        yield chunk
+
+
+async def aiter_chunks(response):
+    """
+    Iterate over the body of a response without blocking the event loop.
+    Asynchronous iterables are awaited, file reads run in the default
+    executor.
+
+    :param response: The response to serve
+    :type  response: :class:`pytest_requests.response.RequestsResponse`
+    """
+    body = response.body
+    if callable(body) and not hasattr(body, "read"):
+        produced = body()
+        if hasattr(produced, "__aiter__"):
+            body = produced
+        else:
+            for chunk in produced:
+                yield chunk if isinstance(chunk, bytes) else chunk.encode()
+            return
+    elif hasattr(body, "__aiter__"):
+        response._claim_iterator()
+    if hasattr(body, "__aiter__"):
+        async for chunk in body:
+            yield chunk if isinstance(chunk, bytes) else chunk.encode()
+    elif response.is_streaming:
+        loop = asyncio.get_running_loop()
+        chunks = response.iter_chunks()
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    else:
+        yield response.content
+
+
+class AsyncResponse(object):
+    """
+    Response served by :class:`AsyncTransport`
+    """
+
+    def __init__(self, url, status_code, headers, chunks):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self._chunks = chunks
+        self._content = None
+
+    async def aiter_bytes(self):
+        """
+        Iterate over the body as it is produced
+        """
+        if self._content is not None:
+            yield self._content
+            return
+        async for chunk in self._chunks:
+            yield chunk
+
+    async def read(self):
+        """
+        Read the whole body
+
+        :rtype: ``bytes``
+        """
+        if self._content is None:
+            self._content = b"".join([chunk async for chunk in self._chunks])
+        return self._content
+
+    @property
+    def content(self):
+        if self._content is None:
+            raise RuntimeError("Call `await response.read()` first")
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _prepared(method, url, headers, content):
+    request = PreparedRequest()
+    request.method = method.upper()
+    request.url = url
+    request.headers = CaseInsensitiveDict(headers or {})
+    request.body = content
+    return request
+
+
+class AsyncTransport(object):
+    """
+    asyncio mock transport. Serving a response never blocks the event
+    loop: simulated delays on a :class:`pytest_requests.clock.RealClock`
+    are awaited, and streaming bodies are produced chunk by chunk.
+
+    Rate limits and faults apply as they do through requests: simulated
+    connection errors raise :class:`ConnectionError`, read timeouts
+    :class:`asyncio.TimeoutError`, and truncated bodies raise
+    :class:`ConnectionError` once the part of the body sent is read.
+    """
+
+    def __init__(self, router):
+        """
+        Instantiate an AsyncTransport
+
+        :param router: The routes to serve
+        :type  router: :class:`pytest_requests.router.RequestsRouterAdapter`
+        """
+        self.router = router
+
+    async def send(self, method, url, headers=None, content=None, timeout=None):
+        """
+        Serve a request
+
+        :param method: The HTTP method
+        :type  method: ``str``
+
+        :param url: The full request URL
+        :type  url: ``str``
+
+        :param headers: The request headers
+        :type  headers: ``dict``
+
+        :param content: The request body
+        :type  content: ``bytes``
+
+        :param timeout: The read timeout in seconds, or a requests-style
+            ``(connect, read)`` tuple
+        :type  timeout: ``float`` or ``tuple``
+
+        :raises asyncio.TimeoutError: When the simulated delay passes the
+            timeout, or on a simulated read timeout
+
+        :raises ConnectionError: On a simulated connection error
+
+        :rtype: :class:`AsyncResponse`
+        """
+        request = _prepared(method, url, headers, content)
+        matched = self.router.match(request.method, url, request)
+        if matched is None:
+            raise AssertionError("No route matched {0} {1}".format(method, url))
+        route, params = matched
+        limit = read_timeout(timeout)
+        rejected, limit_headers, fault = route.admit(request, self.router.limit)
+        if rejected is not None:
+            route.journal.record(request)
+            response, delay = rejected, 0.0
+        else:
+            if fault is not None and fault.fails_call:
+                route.journal.record(request)
+                if fault.kind != READ_TIMEOUT:
+                    raise ConnectionError("Simulated connection error")
+                if limit:
+                    await _wait(route.clock, limit)
+                raise asyncio.TimeoutError("Simulated read timeout")
+            response, delay = route.serve(request, params, fault)
+        if delay:
+            waited = delay if limit is None else min(delay, limit)
+            await _wait(route.clock, waited)
+            if waited < delay:
+                raise asyncio.TimeoutError(
+                    "Simulated delay of {0}s exceeds the read timeout of {1}s".format(
+                        delay, limit
+                    )
+                )
+        headers = response.headers
+        if limit_headers is not None:
+            headers = dict(headers, **limit_headers)
+        chunks = aiter_chunks(response)
+        if route.bandwidth and response.is_streaming:
+            chunks = _throttled(chunks, route.clock, float(route.bandwidth), limit)
+        if fault is not None and fault.kind == TRUNCATED_BODY:
+            chunks = _truncated(chunks, fault.fraction)
+        traffic = stats.current()
+        if traffic is not None:
+            # The body is produced as it is read, and counted then
+            traffic.record(request.method, route.name, 0)
+            chunks = _counted(chunks, traffic)
+        return AsyncResponse(url, response.status_code, headers, chunks)
+
+    async def handle_async_request(self, request):
+        """
+        Serve a request from ``httpx.AsyncClient``
+
+        :param request: The request instance
+        :type  request: :class:`httpx.Request`
+
+        :rtype: :class:`httpx.Response`
+        """
+        import httpx
+
+        timeout = request.extensions.get("timeout", {}).get("read")
+        try:
+            response = await self.send(
+                request.method,
+                str(request.url),
+                headers=dict(request.headers),
+                content=await request.aread(),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError as error:
+            raise httpx.ReadTimeout(str(error), request=request)
+        except ConnectionError as error:
+            raise httpx.ConnectError(str(error), request=request)
+
+        class Stream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                try:
+                    async for chunk in response.aiter_bytes():
+                        yield chunk
+                except ConnectionError as error:
+                    raise httpx.RemoteProtocolError(str(error), request=request)
+
+        return httpx.Response(
+            response.status_code,
+            headers=list(response.headers.items()),
+            stream=Stream(),
+            request=request,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the overhead of the mocked transport.
+
+Run with ``python -m pytest_requests.benchmark``, add ``--json PATH`` to
+write the results as JSON so they can be compared between releases.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import timeit
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import requests
+from . import __version__
+from .cassette import Cassette, write_cassette
+from .patch import patch, RequestsPatchedAdapter
+from .response import good
+from .router import RequestsRouterAdapter
+
+__all__ = ["run", "main"]
+
+BODY_SIZES = (1024, 1024 * 1024, 16 * 1024 * 1024)
+
+ROUTE_COUNTS = (10, 100, 1000, 10000)
+
+#: Routes and body size of the shared store benchmark
+STORE_ROUTES = 2000
+STORE_BODY_SIZE = 8 * 1024
+
+
+def _prepared(url="http://127.0.0.1/api/test"):
+    return requests.Request("GET", url).prepare()
+
+
+def _measure(name, func, number, repeat, **extra):
+    timings = timeit.repeat(func, number=number, repeat=repeat)
+    result = {
+        "name": name,
+        "number": number,
+        "repeat": repeat,
+        "best_us": min(timings) / number * 1e6,
+        "mean_us": sum(timings) / len(timings) / number * 1e6,
+    }
+    result.update(extra)
+    return result
+
+
+def bench_patch_enter_exit(number, repeat):
+    def enter_exit():
+        with patch("/api/test"):
+            pass
+
+    return [_measure("patch_enter_exit", enter_exit, number, repeat)]
+
+
+def bench_send(number, repeat):
+    request = _prepared()
+    adapter = RequestsPatchedAdapter("/api/test")
+    adapter.returns = good("hello")
+    router = RequestsRouterAdapter()
+    for i in range(1000):
+        router.get("/api/{0}".format(i)).returns = good("hello")
+    router.get("/api/test").returns = good("hello")
+    return [
+        _measure("send_patch", lambda: adapter.send(request), number, repeat),
+        _measure("send_router", lambda: router.send(request), number, repeat),
+    ]
+
+
+def pattern_router(count):
+    """
+    A router with ``count`` regular expression routes and as many prefix
+    routes, and URLs matching the last registered of each
+    """
+    router = RequestsRouterAdapter()
+    for i in range(count):
+        router.get(re.compile(r"/api/v1/r{0}/items/(?P<id>\d+)".format(i)))
+        router.get("/static/r{0}/*".format(i))
+    last = count - 1
+    return router, (
+        "http://127.0.0.1/api/v1/r{0}/items/42".format(last),
+        "http://127.0.0.1/static/r{0}/css/site.css".format(last),
+    )
+
+
+def bench_pattern_routes(number, repeat, counts=ROUTE_COUNTS):
+    results = []
+    for count in counts:
+        router, (regex_url, prefix_url) = pattern_router(count)
+        for kind, url in (("regex", regex_url), ("prefix", prefix_url)):
+            results.append(
+                _measure(
+                    "match_pattern",
+                    lambda: router.match("GET", url),
+                    number,
+                    repeat,
+                    kind=kind,
+                    routes=count,
+                )
+            )
+    return results
+
+
+def bench_to_response(number, repeat):
+    request = _prepared()
+    results = []
+    for size in BODY_SIZES:
+        response = good(b"x" * size)
+        results.append(
+            _measure(
+                "to_response",
+                lambda: response.to_response(request),
+                number,
+                repeat,
+                body_size=size,
+            )
+        )
+    return results
+
+
+def bench_concurrent(number, repeat, threads=(1, 8, 64)):
+    request = _prepared()
+    adapter = RequestsPatchedAdapter("/api/test")
+    adapter.returns = good("hello")
+    results = []
+    for workers in threads:
+        calls = [request] * number
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+
+            def fan_out():
+                for _ in pool.map(adapter.send, calls):
+                    pass
+
+            result = _measure("send_concurrent", fan_out, 1, repeat, threads=workers)
+        result["best_us"] /= len(calls)
+        result["mean_us"] /= len(calls)
+        results.append(result)
+    return results
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    body = b"hello"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@contextlib.contextmanager
+def loopback_server():
+    """
+    Serve a fixed body from a real HTTP server on 127.0.0.1
+
+    :returns: The base URL of the server
+    :rtype: ``str``
+    """
+    server = _Server(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield "http://127.0.0.1:{0}".format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_session_get(number, repeat):
+    results = []
+    with loopback_server() as base_url:
+        with requests.Session() as session:
+            url = base_url + "/api/test"
+            session.get(url)
+            results.append(
+                _measure(
+                    "session_get",
+                    lambda: session.get(url),
+                    number,
+                    repeat,
+                    transport="loopback",
+                )
+            )
+    with patch("/api/test") as adapter:
+        adapter.returns = good("hello")
+        with requests.Session() as session:
+            results.append(
+                _measure(
+                    "session_get",
+                    lambda: session.get(url),
+                    number,
+                    repeat,
+                    transport="mock",
+                )
+            )
+    return results
+
+
+def _store_interactions(count, size):
+    for i in range(count):
+        body = {"id": i, "data": "x" * size}
+        yield "GET", "/api/items/{0}".format(i), good(body)
+
+
+def _private_rss_kb():
+    """
+    The memory private to the process, in kB: its dirty private pages on
+    Linux, which excludes the pages of a mapped store shared with other
+    processes, the peak resident set size elsewhere
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as fh:
+            for line in fh:
+                if line.startswith("Private_Dirty:"):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _rebuild_worker(count, size, results):
+    before = _private_rss_kb()
+    started = timeit.default_timer()
+    router = RequestsRouterAdapter()
+    for method, target, response in _store_interactions(count, size):
+        router.add(method, target).returns = response
+        response.content
+    elapsed = timeit.default_timer() - started
+    results.put((elapsed, _private_rss_kb() - before))
+
+
+def _attach_worker(path, count, results):
+    before = _private_rss_kb()
+    started = timeit.default_timer()
+    cassette = Cassette(path)
+    for i in range(0, count, max(count // 10, 1)):
+        cassette.lookup("GET", "/api/items/{0}".format(i)).content
+    elapsed = timeit.default_timer() - started
+    results.put((elapsed, _private_rss_kb() - before))
+    cassette.close()
+
+
+def bench_store_memory(
+    number, repeat, workers=4, count=STORE_ROUTES, size=STORE_BODY_SIZE
+):
+    """
+    Setup time and private memory of worker processes building their own
+    routes, against workers attaching to a shared store and serving a few
+    of its routes
+    """
+    directory = tempfile.mkdtemp(prefix="pytest-requests-bench-")
+    path = os.path.join(directory, "store.cas")
+    write_cassette(path, _store_interactions(count, size))
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    results = []
+    try:
+        for mode, target, args in (
+            ("rebuild", _rebuild_worker, (count, size)),
+            ("attach", _attach_worker, (path, count)),
+        ):
+            queue = context.Queue()
+            processes = [
+                context.Process(target=target, args=args + (queue,))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            measures = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+            timings = [elapsed for elapsed, _ in measures]
+            results.append(
+                {
+                    "name": "store_worker_setup",
+                    "number": 1,
+                    "repeat": workers,
+                    "best_us": min(timings) * 1e6,
+                    "mean_us": sum(timings) / len(timings) * 1e6,
+                    "mode": mode,
+                    "routes": count,
+                    "workers": workers,
+                    "rss_kb": max(rss for _, rss in measures),
+                }
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+BENCHMARKS = (
+    bench_patch_enter_exit,
+    bench_send,
+    bench_pattern_routes,
+    bench_to_response,
+    bench_concurrent,
+    bench_session_get,
+    bench_store_memory,
+)
+
+
+def run(number=1000, repeat=5):
+    """
+    Run every benchmark
+
+    :param number: The number of calls per timing
+    :type  number: ``int``
+
+    :param repeat: The number of timings per benchmark
+    :type  repeat: ``int``
+
+    :returns: The results, with the environment they were measured in
+    :rtype: ``dict``
+    """
+    results = []
+    for benchmark in BENCHMARKS:
+        results.extend(benchmark(number, repeat))
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "requests": requests.__version__,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="Write the results here")
+    args = parser.parse_args(argv)
+
+    report = run(number=args.number, repeat=args.repeat)
+    for result in report["results"]:
+        extra = ", ".join(
+            "{0}={1}".format(key, value)
+            for key, value in sorted(result.items())
+            if key not in ("name", "number", "repeat", "best_us", "mean_us")
+        )
+        print(
+            "{0:<20} {1:>12.2f} us  {2}".format(
+                result["name"], result["best_us"], extra
+            )
+        )
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
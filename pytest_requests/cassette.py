@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+from requests.adapters import BaseAdapter
+from requests.compat import urlparse
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import struct
+from .dispatch import install
+from .journal import CallJournal
+from .response import RequestsResponse, _served_size
+from . import stats
+
+__all__ = ["replay", "serve", "write_cassette", "Cassette", "CassetteAdapter"]
+
+# File layout, all integers little-endian:
+#
+#   header  MAGIC, interaction count, slot count, offset of the slot table
+#   records for each interaction: metadata length, body length, metadata
+#           (JSON with method, target, status and headers), body
+#   table   open-addressed hash table of (key hash, record offset) slots
+#
+# Opening a cassette only reads the header, lookups probe the table and
+# read a single record, so neither depends on the number of interactions.
+MAGIC = b"PYRQCAS1"
+_HEADER = struct.Struct("<8sQQQ")
+_RECORD = struct.Struct("<IQ")
+_SLOT = struct.Struct("<QQ")
+
+
+@contextlib.contextmanager
+def replay(name, directory=None):
+    """
+    Patch requests to replay the interactions stored in a cassette
+
+    :param name: The file name of the cassette
+    :type  name: ``str``
+
+    :param directory: The directory holding the cassette
+    :type  directory: ``str``
+    """
+    with Cassette(os.path.join(directory or os.curdir, name)) as cassette:
+        with serve(cassette) as adapter:
+            yield adapter
+
+
+@contextlib.contextmanager
+def serve(cassette):
+    """
+    Patch requests to replay the interactions of an open cassette
+
+    :param cassette: The cassette
+    :type  cassette: :class:`Cassette`
+    """
+    with install(CassetteAdapter(cassette)) as adapter:
+        yield adapter
+
+
+def _target(url_parts):
+    if url_parts.query:
+        return url_parts.path + "?" + url_parts.query
+    return url_parts.path
+
+
+def _hash(method, target):
+    key = "{0} {1}".format(method.upper(), target).encode("utf-8")
+    value = struct.unpack("<Q", hashlib.sha1(key).digest()[:8])[0]
+    return value or 1
+
+
+def write_cassette(path, interactions):
+    """
+    Write interactions to a cassette file
+
+    :param path: The path of the cassette
+    :type  path: ``str``
+
+    :param interactions: ``(method, target, response)`` tuples, where the
+        target is the URI path, with the query string if any
+    :type  interactions: iterable of ``tuple``
+    """
+    slots = []
+    with open(path, "wb") as fh:
+        fh.write(b"\0" * _HEADER.size)
+        for method, target, response in interactions:
+            meta = json.dumps(
+                {
+                    "method": method.upper(),
+                    "target": target,
+                    "status": response.status_code,
+                    "headers": dict(response.headers),
+                }
+            ).encode("utf-8")
+            content = response.content
+            slots.append((_hash(method, target), fh.tell()))
+            fh.write(_RECORD.pack(len(meta), len(content)))
+            fh.write(meta)
+            fh.write(content)
+
+        slot_count = 1
+        while slot_count < 2 * len(slots):
+            slot_count *= 2
+        table = [(0, 0)] * slot_count
+        mask = slot_count - 1
+        for key_hash, offset in slots:
+            slot = key_hash & mask
+            while table[slot][0]:
+                slot = (slot + 1) & mask
+            table[slot] = (key_hash, offset)
+
+        table_offset = fh.tell()
+        fh.write(b"".join(_SLOT.pack(*entry) for entry in table))
+        fh.seek(0)
+        fh.write(_HEADER.pack(MAGIC, len(slots), slot_count, table_offset))
+
+
+class Cassette(object):
+    """
+    Memory-mapped, read-only cassette of recorded interactions.
+    Responses are built the first time they are looked up.
+    """
+
+    def __init__(self, path):
+        """
+        Open a cassette
+
+        :param path: The path of the cassette
+        :type  path: ``str``
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._slot_count, self._table = _HEADER.unpack_from(
+            self._map, 0
+        )
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("{0} is not a cassette".format(path))
+        self._responses = {}
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def lookup(self, method, target):
+        """
+        Find the response recorded for a request
+
+        :param method: The HTTP method
+        :type  method: ``str``
+
+        :param target: The URI path, with the query string if any
+        :type  target: ``str``
+
+        :rtype: :class:`pytest_requests.response.RequestsResponse`
+        """
+        method = method.upper()
+        key = (method, target)
+        response = self._responses.get(key)
+        if response is not None:
+            return response
+
+        key_hash = _hash(method, target)
+        mask = self._slot_count - 1
+        slot = key_hash & mask
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(
+                self._map, self._table + slot * _SLOT.size
+            )
+            if slot_hash == 0:
+                return None
+            if slot_hash == key_hash:
+                response = self._read(offset, method, target)
+                if response is not None:
+                    self._responses[key] = response
+                    return response
+            slot = (slot + 1) & mask
+
+    def _read(self, offset, method, target):
+        meta_length, body_length = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size
+        meta = json.loads(self._map[start : start + meta_length].decode("utf-8"))
+        if meta["method"] != method or meta["target"] != target:
+            return None
+        start += meta_length
+        return RequestsResponse(
+            self._map[start : start + body_length],
+            status_code=meta["status"],
+            headers=meta["headers"],
+        )
+
+
+class CassetteAdapter(BaseAdapter):
+    """
+    Patched requests HTTP Adapter replaying a cassette
+    """
+
+    def __init__(self, cassette):
+        """
+        Instantiate a CassetteAdapter
+
+        :param cassette: The cassette to replay
+        :type  cassette: :class:`Cassette`
+        """
+        self.cassette = cassette
+        self.journal = CallJournal()
+
+    def __call__(self):
+        return self
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        self.journal.record(request)
+        url_parts = urlparse(request.url)
+        target = _target(url_parts)
+        response = self.cassette.lookup(request.method, target)
+        if response is None:
+            raise AssertionError(
+                "No interaction recorded for {0} {1}".format(request.method, target)
+            )
+        result = response.to_response(request, stream=stream)
+        traffic = stats.current()
+        if traffic is not None:
+            traffic.record(request.method, url_parts.path, _served_size(result))
+        return result
+
+    def close(self):
+        pass
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from requests.exceptions import ReadTimeout
+
+__all__ = ["VirtualClock", "RealClock"]
+
+
+class VirtualClock(object):
+    """
+    Clock controlled by the test. Sleeping advances the clock instantly,
+    so simulated delays cost no real time.
+    """
+
+    def __init__(self, start=0.0):
+        """
+        Instantiate a VirtualClock
+
+        :param start: The initial time in seconds
+        :type  start: ``float``
+        """
+        self.start = start
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += seconds
+
+    advance = sleep
+
+    def reset(self):
+        """
+        Go back to the initial time
+        """
+        with self._lock:
+            self._now = self.start
+
+
+class RealClock(object):
+    """
+    Clock backed by the system clock, for soak tests that need real delays
+    """
+
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def reset(self):
+        pass
+
+
+def read_timeout(timeout):
+    """
+    The read part of a requests ``timeout`` argument
+
+    :param timeout: The timeout given to requests, a number or a
+        ``(connect, read)`` tuple
+    :type  timeout: ``float`` or ``tuple``
+
+    :rtype: ``float``
+    """
+    if isinstance(timeout, tuple):
+        return timeout[1]
+    return timeout
+
+
+def simulate_delay(clock, delay, timeout, request):
+    """
+    Wait for a simulated delay on a clock, raising
+    :class:`requests.exceptions.ReadTimeout` once the caller's timeout passes
+
+    :param clock: The clock to wait on
+    :type  clock: :class:`VirtualClock` or :class:`RealClock`
+
+    :param delay: The delay in seconds
+    :type  delay: ``float``
+
+    :param timeout: The timeout given to requests
+    :type  timeout: ``float`` or ``tuple``
+
+    :param request: The request instance
+    :type  request: :class:`requests.PreparedRequest`
+    """
+    limit = read_timeout(timeout)
+    if limit is not None and delay > limit:
+        clock.sleep(limit)
+        raise ReadTimeout(
+            "Simulated delay of {0}s exceeds the read timeout of {1}s".format(
+                delay, limit
+            ),
+            request=request,
+        )
+    if delay:
+        clock.sleep(delay)
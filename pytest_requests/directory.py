@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Canned responses laid out as files mirroring the URL space.
+
+A file ``fixtures/api/v1/users/123.json`` answers ``GET /api/v1/users/123``
+and ``GET /api/v1/users/123.json``, an ``index`` file answers the path of
+its directory. The content type comes from the file extension:
+
+>>> directory = FixtureDirectory("fixtures", cache=config.cache)
+>>> router.get("/*").returns = directory
+
+The index of the tree is cached, for instance in the pytest cache, with the
+modification time of every directory: a run where no file was added,
+removed or renamed only checks those times instead of scanning the tree.
+Bodies are memory-mapped the first time their path is requested, and read
+from the map on every call.
+"""
+
+import mimetypes
+import mmap
+import os
+import threading
+from .response import RequestsResponse
+
+__all__ = ["FixtureDirectory", "scan"]
+
+#: The key of the index in the cache
+CACHE_KEY = "pytest_requests/fixture_index"
+#: The name of the files answering the path of their directory
+INDEX_NAME = "index"
+
+_CONTENT_TYPES = {".json": "application/json"}
+
+
+def content_type(name):
+    """
+    Guess the content type of a file from its extension
+
+    :param name: The file name
+    :type  name: ``str``
+
+    :rtype: ``str``
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension in _CONTENT_TYPES:
+        return _CONTENT_TYPES[extension]
+    guessed, encoding = mimetypes.guess_type(name)
+    if guessed is None or encoding is not None:
+        return "application/octet-stream"
+    return guessed
+
+
+def scan(root):
+    """
+    Index the files under a directory by the URI paths they answer
+
+    :param root: The directory
+    :type  root: ``str``
+
+    :returns: The index, with the URI paths mapped to the file path
+        relative to the root and its content type under ``"files"``, and
+        the modification time of every directory under ``"dirs"``
+    :rtype: ``dict``
+    """
+    files = {}
+    dirs = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        relative = os.path.relpath(directory, root)
+        relative = "" if relative == os.curdir else relative
+        dirs[relative] = os.stat(directory).st_mtime
+        base = "/" + relative.replace(os.sep, "/") if relative else ""
+        for name in sorted(filenames):
+            if name.startswith("."):
+                continue
+            entry = [os.path.join(relative, name), content_type(name)]
+            stem = os.path.splitext(name)[0]
+            files.setdefault("{0}/{1}".format(base, name), entry)
+            if stem == INDEX_NAME:
+                files.setdefault(base or "/", entry)
+            else:
+                files.setdefault("{0}/{1}".format(base, stem), entry)
+    return {"files": files, "dirs": dirs}
+
+
+def _fresh(root, index):
+    for relative, mtime in index["dirs"].items():
+        try:
+            if os.stat(os.path.join(root, relative)).st_mtime != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class FixtureDirectory(object):
+    """
+    Responder serving the files of a directory tree. Register it on
+    a prefix route; paths without a file are answered ``404``.
+    """
+
+    #: Size of the chunks read from the mapped files
+    chunk_size = 64 * 1024
+
+    def __init__(self, root, cache=None):
+        """
+        Index a directory
+
+        :param root: The directory
+        :type  root: ``str``
+
+        :param cache: Where the index is kept between runs, an object with
+            the ``get(key, default)`` and ``set(key, value)`` methods of
+            ``config.cache``
+        :type  cache: :class:`_pytest.cacheprovider.Cache`
+        """
+        self.root = os.path.abspath(root)
+        key = "{0}/{1}".format(CACHE_KEY, self.root.replace(os.sep, "/").strip("/"))
+        index = cache.get(key, None) if cache is not None else None
+        #: Whether the tree was scanned, rather than read from the cache
+        self.scanned = index is None or not _fresh(self.root, index)
+        if self.scanned:
+            index = scan(self.root)
+            if cache is not None:
+                cache.set(key, index)
+        self.files = index["files"]
+        self._responses = {}
+        self._maps = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.files)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Unmap the files served so far
+        """
+        with self._lock:
+            for mapped in self._maps:
+                mapped.close()
+            del self._maps[:]
+            self._responses.clear()
+
+    def lookup(self, path):
+        """
+        Find the response for a URI path
+
+        :param path: The URI path
+        :type  path: ``str``
+
+        :returns: The response, or ``None`` if no file answers the path
+        :rtype: :class:`pytest_requests.response.RequestsResponse`
+        """
+        response = self._responses.get(path)
+        if response is not None:
+            return response
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+        relative, mime = entry
+        with self._lock:
+            response = self._responses.get(path)
+            if response is None:
+                body = self._map(os.path.join(self.root, relative))
+                response = RequestsResponse(
+                    body, 200, headers={"Content-Type": mime}
+                ).freeze()
+                self._responses[path] = response
+        return response
+
+    def _map(self, path):
+        with open(path, "rb") as fh:
+            if not os.fstat(fh.fileno()).st_size:
+                return b""
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        chunk_size = self.chunk_size
+
+        def chunks():
+            for start in range(0, len(mapped), chunk_size):
+                yield mapped[start : start + chunk_size]
+
+        return chunks
+
+    def __call__(self, request, **params):
+        path = request.path_url.split("?", 1)[0]
+        response = self.lookup(path)
+        if response is None:
+            return RequestsResponse("", 404)
+        return response
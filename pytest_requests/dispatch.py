@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Dispatch the adapters requests builds to the active mocked adapter.
+
+Patching ``requests.sessions.HTTPAdapter`` costs a lookup, an attribute
+swap and the bookkeeping of :mod:`mock` each time, which adds up when it is
+done around every test. Instead the patch is made once, with a dispatcher
+standing in for the adapter class, and installing a mocked adapter only
+pushes it on the dispatcher:
+
+>>> with held():
+...     with install(router):
+...         requests.get("https://test.api/api/test")
+
+Sessions created while no mocked adapter is installed get a real
+:class:`requests.adapters.HTTPAdapter`. The ``send`` method of the real
+adapter is patched as well, so that the adapters an application mounts
+itself also send through the mocked adapter, applying their
+``max_retries`` with a :class:`pytest_requests.faults.RetryAdapter`.
+"""
+
+from mock import patch as mock_patch
+from requests.adapters import HTTPAdapter
+import contextlib
+import threading
+from .faults import RetryAdapter
+
+__all__ = ["install", "held", "active"]
+
+
+class _Dispatcher(object):
+    """
+    Stands in for :class:`requests.adapters.HTTPAdapter` in
+    :mod:`requests.sessions`, building the adapters of new sessions from the
+    mocked adapter installed last
+    """
+
+    def __init__(self):
+        #: The installed mocked adapters, the last one serving requests
+        self.adapters = []
+        self._holds = 0
+        self._patches = ()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        adapters = self.adapters
+        if adapters:
+            return adapters[-1](*args, **kwargs)
+        return HTTPAdapter(*args, **kwargs)
+
+    def hold(self, adapter=None):
+        """
+        Patch requests unless it already is, and install an adapter
+        """
+        with self._lock:
+            if not self._holds:
+                self._patches = (
+                    mock_patch("requests.sessions.HTTPAdapter", new=self),
+                    mock_patch.object(HTTPAdapter, "send", new=_send),
+                )
+                for patch in self._patches:
+                    patch.start()
+            self._holds += 1
+            if adapter is not None:
+                self.adapters.append(adapter)
+
+    def release(self, adapter=None):
+        """
+        Uninstall an adapter, and undo the patch once nothing holds it
+        """
+        with self._lock:
+            if adapter is not None:
+                adapters = self.adapters
+                for index in range(len(adapters) - 1, -1, -1):
+                    if adapters[index] is adapter:
+                        del adapters[index]
+                        break
+            self._holds -= 1
+            if not self._holds:
+                for patch in reversed(self._patches):
+                    patch.stop()
+                self._patches = ()
+
+
+_dispatcher = _Dispatcher()
+_real_send = HTTPAdapter.send
+
+
+def _send(self, request, *args, **kwargs):
+    """
+    Replaces :meth:`requests.adapters.HTTPAdapter.send`, sending through
+    the mocked adapter installed last with the retries of the real adapter
+    """
+    adapters = _dispatcher.adapters
+    if not adapters:
+        return _real_send(self, request, *args, **kwargs)
+    retrying = RetryAdapter(adapters[-1], self.max_retries)
+    return retrying.send(request, *args, **kwargs)
+
+
+def active():
+    """
+    The mocked adapter installed last
+
+    :returns: The adapter, or ``None`` if none is installed
+    """
+    adapters = _dispatcher.adapters
+    return adapters[-1] if adapters else None
+
+
+@contextlib.contextmanager
+def held():
+    """
+    Keep requests patched for the duration of the block, so that the
+    adapters installed in it do not patch it again
+    """
+    _dispatcher.hold()
+    try:
+        yield
+    finally:
+        _dispatcher.release()
+
+
+class _Installed(object):
+    """
+    The block an adapter is installed for. A plain context manager, since
+    the shared routers are installed around every test.
+    """
+
+    __slots__ = ("adapter",)
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+
+    def __enter__(self):
+        _dispatcher.hold(self.adapter)
+        return self.adapter
+
+    def __exit__(self, *exc_info):
+        _dispatcher.release(self.adapter)
+
+
+def install(adapter):
+    """
+    Patch requests to send through a mocked adapter for the duration of
+    a ``with`` block
+
+    :param adapter: The adapter, such as a router
+    :type  adapter: :class:`pytest_requests.router.RequestsRouterAdapter`
+
+    :rtype: context manager
+    """
+    return _Installed(adapter)
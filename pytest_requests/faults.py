@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded fault injection, to test retry and backoff logic.
+
+A :class:`FaultPolicy` set on a route makes some of its calls fail:
+
+>>> route.faults = FaultPolicy(seed=1)
+>>> route.faults.connection_error(0.1)
+>>> route.faults.server_error(0.05, status_code=503, burst=3)
+
+The same seed fails the same calls on every run. Requests made through
+the mocked adapters skip urllib3, so the ``Retry`` of an adapter mounted on
+a session is applied by a :class:`RetryAdapter` instead, the way urllib3
+would:
+
+>>> retry = Retry(total=5, backoff_factor=0.5)
+>>> session.mount("https://", HTTPAdapter(max_retries=retry))
+
+Calling a mocked adapter with ``max_retries`` also returns
+a :class:`RetryAdapter`.
+"""
+
+from requests.exceptions import ConnectionError, ReadTimeout, RetryError
+from urllib3.exceptions import (
+    ConnectTimeoutError,
+    MaxRetryError,
+    ReadTimeoutError,
+)
+from urllib3.response import HTTPResponse
+from urllib3.util.retry import Retry
+from requests.adapters import BaseAdapter
+from io import BytesIO
+import random
+import threading
+from .clock import read_timeout
+from .response import RequestsResponse
+from .responder import fingerprint
+
+__all__ = ["FaultPolicy", "RetryAdapter"]
+
+CONNECTION_ERROR = "connection_error"
+READ_TIMEOUT = "read_timeout"
+TRUNCATED_BODY = "truncated_body"
+SERVER_ERROR = "server_error"
+
+
+class _Fault(object):
+    """
+    A kind of failure, applied by the route serving the failing call
+    """
+
+    __slots__ = ("kind", "probability", "burst", "response", "fraction")
+
+    def __init__(self, kind, probability, burst, response=None, fraction=None):
+        if not 0 <= probability <= 1:
+            raise ValueError("probability must be between 0 and 1")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.kind = kind
+        self.probability = probability
+        self.burst = burst
+        #: The response served instead of the configured one
+        self.response = response
+        self.fraction = fraction
+
+    @property
+    def fails_call(self):
+        """
+        Whether the call fails before any response is served
+        """
+        return self.kind in (CONNECTION_ERROR, READ_TIMEOUT)
+
+    def fail(self, clock, request, timeout):
+        """
+        Raise the error of a call failing before any response is served
+        """
+        if self.kind == CONNECTION_ERROR:
+            raise ConnectionError("Simulated connection error", request=request)
+        limit = read_timeout(timeout)
+        if limit:
+            clock.sleep(limit)
+        raise ReadTimeout("Simulated read timeout", request=request)
+
+    def truncate(self, response):
+        """
+        Cut the body of a served :class:`requests.Response` short of its
+        ``Content-Length``, when the fault truncates bodies
+
+        :rtype: :class:`requests.Response`
+        """
+        if self.kind != TRUNCATED_BODY:
+            return response
+        content = response.content
+        sent = content[: int(len(content) * self.fraction)]
+        headers = response.headers
+        headers["Content-Length"] = str(len(content))
+        headers.pop("Transfer-Encoding", None)
+        headers.pop("Content-Encoding", None)
+        response._content = False
+        response._content_consumed = False
+        response.raw = HTTPResponse(
+            body=BytesIO(sent),
+            headers=headers,
+            status=response.status_code,
+            preload_content=False,
+            enforce_content_length=True,
+        )
+        return response
+
+
+class FaultPolicy(object):
+    """
+    Decide which calls to a route fail, and how, from a seeded random
+    number generator, and count the attempts made for each logical request.
+
+    Every call draws one number: the faults are tried in the order they
+    were added, each taking its probability of the draws, so their
+    probabilities must add up to at most 1. A fault with a ``burst`` also
+    fails the calls that follow, whatever they draw.
+    """
+
+    # The generation of the routes the counters were last used in, see
+    # :meth:`pytest_requests.patch.RequestsPatchedAdapter.admit`
+    _generation = None
+
+    def __init__(self, seed=0, key=None):
+        """
+        Instantiate a FaultPolicy
+
+        :param seed: The seed of the random number generator
+        :type  seed: ``int``
+
+        :param key: The function identifying the logical request an
+            attempt belongs to, by default
+            :func:`pytest_requests.responder.fingerprint` of the whole
+            request, so repeating the same request counts as a retry
+        :type  key: ``callable``
+        """
+        self.rng = random.Random(seed)
+        self.key = key if key is not None else fingerprint()
+        self._faults = []
+        self._burst = 0
+        self._burst_fault = None
+        self._lock = threading.Lock()
+        #: The number of faults injected, by kind
+        self.injected = {}
+        self._attempts = {}
+
+    def _add(self, kind, probability, burst, **options):
+        fault = _Fault(kind, probability, burst, **options)
+        if sum(f.probability for f in self._faults) + probability > 1:
+            raise ValueError("The probabilities of the faults add up to more than 1")
+        self._faults.append(fault)
+        return self
+
+    def connection_error(self, probability, burst=1):
+        """
+        Fail calls with :class:`requests.exceptions.ConnectionError`,
+        before a response is served
+
+        :param probability: The probability a call fails
+        :type  probability: ``float``
+
+        :param burst: The number of consecutive calls failing each time
+        :type  burst: ``int``
+        """
+        return self._add(CONNECTION_ERROR, probability, burst)
+
+    def read_timeout(self, probability, burst=1):
+        """
+        Fail calls with :class:`requests.exceptions.ReadTimeout`, after
+        waiting for the read timeout of the call on the route's clock
+
+        :param probability: The probability a call fails
+        :type  probability: ``float``
+
+        :param burst: The number of consecutive calls failing each time
+        :type  burst: ``int``
+        """
+        return self._add(READ_TIMEOUT, probability, burst)
+
+    def truncated_body(self, probability, fraction=0.5, burst=1):
+        """
+        Cut the body of responses short of their ``Content-Length``, so
+        that reading it raises :class:`requests.exceptions.ChunkedEncodingError`
+
+        :param probability: The probability a call fails
+        :type  probability: ``float``
+
+        :param fraction: The part of the body sent
+        :type  fraction: ``float``
+
+        :param burst: The number of consecutive calls failing each time
+        :type  burst: ``int``
+        """
+        return self._add(TRUNCATED_BODY, probability, burst, fraction=fraction)
+
+    def server_error(self, probability, status_code=503, burst=1, retry_after=None):
+        """
+        Answer calls with a server error instead of the configured response
+
+        :param probability: The probability a call fails
+        :type  probability: ``float``
+
+        :param status_code: The HTTP status code
+        :type  status_code: ``int``
+
+        :param burst: The number of consecutive calls failing each time
+        :type  burst: ``int``
+
+        :param retry_after: The ``Retry-After`` header, in seconds
+        :type  retry_after: ``int``
+        """
+        headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+        response = RequestsResponse("", status_code, headers=headers).freeze()
+        return self._add(SERVER_ERROR, probability, burst, response=response)
+
+    def decide(self, request):
+        """
+        Count an attempt of a request and pick the fault it gets
+
+        :param request: The request instance
+        :type  request: :class:`requests.PreparedRequest`
+
+        :returns: The fault, or ``None`` if the call succeeds
+        """
+        key = self.key(request)
+        with self._lock:
+            self._attempts[key] = self._attempts.get(key, 0) + 1
+            if self._burst:
+                self._burst -= 1
+                fault = self._burst_fault
+            else:
+                fault = None
+                roll = self.rng.random()
+                for candidate in self._faults:
+                    if roll < candidate.probability:
+                        fault = candidate
+                        self._burst = fault.burst - 1
+                        self._burst_fault = fault
+                        break
+                    roll -= candidate.probability
+            if fault is not None:
+                self.injected[fault.kind] = self.injected.get(fault.kind, 0) + 1
+        return fault
+
+    @property
+    def attempts(self):
+        """
+        The number of attempts made
+
+        :rtype: ``int``
+        """
+        return sum(self._attempts.values())
+
+    @property
+    def requests(self):
+        """
+        The number of logical requests made
+
+        :rtype: ``int``
+        """
+        return len(self._attempts)
+
+    def retries(self):
+        """
+        The number of retries each logical request caused
+
+        :rtype: ``dict``
+        """
+        return dict((key, count - 1) for key, count in self._attempts.items())
+
+    def amplification(self):
+        """
+        The number of attempts per logical request, ``1.0`` without retries
+
+        :rtype: ``float``
+        """
+        if not self._attempts:
+            return 0.0
+        return self.attempts / float(self.requests)
+
+    def reset(self):
+        """
+        Forget the attempts and faults counted so far and end any burst,
+        keeping the faults and the state of the random number generator
+        """
+        with self._lock:
+            self._attempts.clear()
+            self.injected.clear()
+            self._burst = 0
+            self._burst_fault = None
+
+
+class RetryAdapter(BaseAdapter):
+    """
+    Mocked adapter applying a :class:`urllib3.util.retry.Retry` the way
+    urllib3 does behind :class:`requests.adapters.HTTPAdapter`: connection
+    errors, read timeouts and the statuses of ``status_forcelist`` are
+    retried, backing off on the clock of the wrapped adapter.
+    """
+
+    def __init__(self, adapter, max_retries):
+        """
+        Instantiate a RetryAdapter
+
+        :param adapter: The mocked adapter sending each attempt
+        :type  adapter: :class:`pytest_requests.patch.RequestsPatchedAdapter`
+            or :class:`pytest_requests.router.RequestsRouterAdapter`
+
+        :param max_retries: The retry configuration, or a number of retries
+        :type  max_retries: :class:`urllib3.util.retry.Retry` or ``int``
+        """
+        self.adapter = adapter
+        self.max_retries = Retry.from_int(max_retries)
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        retries = self.max_retries
+        method, url = request.method, request.url
+        while True:
+            try:
+                response = self.adapter.send(
+                    request,
+                    stream=stream,
+                    timeout=timeout,
+                    verify=verify,
+                    cert=cert,
+                    proxies=proxies,
+                )
+            except (ConnectionError, ReadTimeout) as error:
+                if isinstance(error, ReadTimeout):
+                    reason = ReadTimeoutError(None, url, str(error))
+                else:
+                    reason = ConnectTimeoutError(str(error))
+                try:
+                    retries = retries.increment(method, url, error=reason)
+                except MaxRetryError as exhausted:
+                    raise ConnectionError(exhausted, request=request)
+                except (ConnectTimeoutError, ReadTimeoutError):
+                    raise error
+                self._sleep(retries.get_backoff_time())
+                continue
+
+            retry_after = response.headers.get("Retry-After")
+            if not retries.is_retry(method, response.status_code, bool(retry_after)):
+                return response
+            status = HTTPResponse(
+                body=b"", headers=response.headers, status=response.status_code
+            )
+            try:
+                retries = retries.increment(method, url, response=status)
+            except MaxRetryError as exhausted:
+                if retries.raise_on_status:
+                    raise RetryError(exhausted, request=request)
+                return response
+            delay = None
+            if retry_after and retries.respect_retry_after_header:
+                delay = retries.get_retry_after(status)
+            self._sleep(delay if delay is not None else retries.get_backoff_time())
+
+    def _sleep(self, seconds):
+        if seconds:
+            self.adapter.clock.sleep(seconds)
+
+    def close(self):
+        self.adapter.close()
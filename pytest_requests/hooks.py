@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Hooks added by pytest-requests, implement them in a ``conftest.py``.
+"""
+
+
+def pytest_requests_build_store(config, store):
+    """
+    Add interactions to the route store shared by every test of the run.
+
+    The store is built once, in the pytest-xdist controller or in the
+    single pytest process, and every worker maps the same read-only file
+    without copying it. Tests use it through the ``requests_store``
+    fixture.
+
+    :param config: The pytest config
+    :type  config: :class:`_pytest.config.Config`
+
+    :param store: Call ``store.add(method, target, response)`` for each
+        interaction, where the target is the URI path, with the query
+        string if any
+    :type  store: :class:`pytest_requests.store.StoreBuilder`
+
+    >>> def pytest_requests_build_store(config, store):
+    ...     for user in load_users():
+    ...         store.add("GET", "/api/users/{0}".format(user["id"]), good(user))
+    """
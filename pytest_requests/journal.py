@@ -0,0 +1,631 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from requests.compat import urlparse
+from io import BufferedReader, BytesIO, RawIOBase
+import hashlib
+import itertools
+import json
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl
+
+__all__ = ["CallJournal", "CallRecord", "Generation"]
+
+
+class Generation(object):
+    """
+    Counter shared by a group of patches. Bumping it resets the call
+    state of every patch in the group, lazily, the next time each patch
+    is used, so a reset costs the same however many patches there are.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def bump(self):
+        self.value += 1
+
+
+_missing = object()
+
+#: Size of the chunks read from file object request bodies
+CHUNK_SIZE = 64 * 1024
+
+
+class _SpillFile(object):
+    """
+    Temporary file the streaming bodies recorded by a thread are spilled
+    to, one after the other, so that spilling does not take a file
+    descriptor per call
+    """
+
+    #: Size after which the thread starts a new file, so that the space
+    #: taken by evicted bodies is given back when their file is closed
+    max_size = 64 * 1024 * 1024
+
+    __slots__ = ("file", "size", "records", "_lock")
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+        #: The number of records whose body is in the file
+        self.records = 0
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def write(self, chunk):
+        with self._lock:
+            self.file.seek(self.size)
+            self.file.write(chunk)
+            self.size += len(chunk)
+
+    def readinto(self, offset, buffer):
+        with self._lock:
+            self.file.seek(offset)
+            return self.file.readinto(buffer)
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+
+class _SpilledBody(RawIOBase):
+    """
+    Reads the part of a spill file holding one body
+    """
+
+    def __init__(self, spill, offset, size):
+        self._spill = spill
+        self._position = offset
+        self._end = offset + size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        left = self._end - self._position
+        if left <= 0:
+            return 0
+        view = memoryview(buffer)[:left]
+        count = self._spill.readinto(self._position, view)
+        self._position += count
+        return count
+
+
+class _Parsed(object):
+    """
+    Query parameters and JSON body of a call, parsed on first use and
+    kept for the matchers evaluated after it
+    """
+
+    __slots__ = ()
+
+    def params(self):
+        """
+        The query parameters, each name mapped to the list of its values
+
+        :rtype: ``dict``
+        """
+        params = self._params
+        if params is None:
+            params = {}
+            for name, value in parse_qsl(self.query, True):
+                params.setdefault(name, []).append(value)
+            self._params = params
+        return params
+
+    def json(self):
+        """
+        The decoded JSON body, or ``None`` if the body was not retained or
+        is not JSON
+        """
+        parsed = self._json
+        if parsed is _missing:
+            parsed = None
+            if self.body is not None:
+                try:
+                    parsed = json.loads(self.body.decode("utf-8"))
+                except ValueError:
+                    pass
+            self._json = parsed
+        return parsed
+
+
+class CallRecord(_Parsed):
+    """
+    Compact record of a single call, kept instead of the request itself.
+
+    Streaming request bodies, file objects and iterators, are drained
+    chunk by chunk when the call is recorded: only their size, digest and
+    first bytes are kept, unless the journal spills them to a temporary
+    file, so recording an upload takes the same memory whatever its size.
+    """
+
+    __slots__ = (
+        "sequence",
+        "thread",
+        "timestamp",
+        "method",
+        "scheme",
+        "host",
+        "path",
+        "query",
+        "headers",
+        "body_size",
+        "body_digest",
+        "body",
+        "body_prefix",
+        "body_file",
+        "body_offset",
+        "streamed",
+        "served",
+        "_params",
+        "_json",
+    )
+
+    def __init__(
+        self, sequence, thread, request, header_names=None, body_limit=0, spill=None
+    ):
+        url_parts = urlparse(request.url)
+        self.sequence = sequence
+        self.thread = thread
+        self.timestamp = time.time()
+        self.method = request.method
+        self.scheme = url_parts.scheme
+        self.host = url_parts.hostname
+        self.path = url_parts.path
+        self.query = url_parts.query
+        if header_names is None:
+            self.headers = dict(
+                (key.lower(), value) for key, value in request.headers.items()
+            )
+        else:
+            self.headers = dict(
+                (key.lower(), value)
+                for key, value in request.headers.items()
+                if key.lower() in header_names
+            )
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        elif isinstance(body, (bytearray, memoryview)):
+            body = bytes(body)
+        #: The temporary file holding a spilled streaming body, shared
+        #: with the other bodies spilled by the same thread
+        self.body_file = None
+        #: Where the spilled body starts in :attr:`body_file`
+        self.body_offset = None
+        #: Whether the body was drained from a file object or an iterator
+        self.streamed = False
+        if isinstance(body, bytes):
+            self.body_size = len(body)
+            self.body_digest = hashlib.sha1(body).hexdigest()
+            self.body = body if len(body) <= body_limit else None
+            self.body_prefix = body[:body_limit]
+        elif body is not None and (hasattr(body, "read") or hasattr(body, "__iter__")):
+            self._drain(body, body_limit, spill)
+        else:
+            self.body_size = None
+            self.body_digest = None
+            self.body = None
+            self.body_prefix = None
+        #: The position of the response served in a
+        #: :class:`pytest_requests.responder.ResponseSequence`
+        self.served = None
+        self._params = None
+        self._json = _missing
+
+    def _drain(self, body, body_limit, spill):
+        """
+        Consume a streaming body chunk by chunk, the way a server reads an
+        upload, keeping its size, its digest and its first bytes
+        """
+        if hasattr(body, "read"):
+            chunks = iter(lambda: body.read(CHUNK_SIZE), b"")
+        else:
+            chunks = iter(body)
+        size = 0
+        digest = hashlib.sha1()
+        prefix = []
+        kept = 0
+        if spill is not None:
+            spill = spill()
+            offset = spill.size
+        for chunk in chunks:
+            if not chunk:
+                if hasattr(body, "read"):
+                    break
+                continue
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            size += len(chunk)
+            digest.update(chunk)
+            if kept < body_limit:
+                prefix.append(chunk[: body_limit - kept])
+                kept += len(prefix[-1])
+            if spill is not None:
+                spill.write(chunk)
+        prefix = b"".join(prefix)
+        self.streamed = True
+        self.body_size = size
+        self.body_digest = digest.hexdigest()
+        self.body = prefix if size <= body_limit else None
+        self.body_prefix = prefix
+        if spill is not None:
+            spill.records += 1
+            self.body_file = spill
+            self.body_offset = offset
+
+    def open_body(self):
+        """
+        A file object reading the whole body, from memory when the journal
+        kept it, or from the temporary file a streaming body was spilled to
+
+        :returns: The file object, or ``None`` if the body was not kept,
+            or was spilled and then evicted or reset
+        """
+        if self.body is not None:
+            return BytesIO(self.body)
+        spill = self.body_file
+        if spill is not None and not spill.closed:
+            return BufferedReader(
+                _SpilledBody(spill, self.body_offset, self.body_size), CHUNK_SIZE
+            )
+        return None
+
+    @property
+    def truncated(self):
+        """
+        Whether the body was larger than the ``body_limit`` of the journal
+        and cannot be read back, only its first bytes in :attr:`body_prefix`
+
+        :rtype: ``bool``
+        """
+        if self.body is not None or self.body_size is None:
+            return False
+        return self.body_file is None or self.body_file.closed
+
+    def json(self):
+        """
+        The decoded JSON body, read back from the spill file when the body
+        was larger than the ``body_limit`` of the journal, or ``None`` if
+        the body was not retained or is not JSON
+        """
+        if self._json is _missing and self.body is None:
+            body = self.open_body()
+            if body is not None:
+                try:
+                    self._json = json.load(body)
+                except ValueError:
+                    self._json = None
+        return _Parsed.json(self)
+
+    def has_headers(self, headers):
+        """
+        Whether the call was made with all of the given headers
+
+        :param headers: Header names and values, names are case-insensitive
+        :type  headers: ``dict``
+
+        :rtype: ``bool``
+        """
+        for key, value in headers.items():
+            if self.headers.get(key.lower(), _missing) != value:
+                return False
+        return True
+
+    def __repr__(self):
+        return "<CallRecord {0} {1}>".format(self.method, self.path)
+
+
+class _Shard(object):
+    """
+    The calls recorded by a single thread, as a ring buffer indexed on
+    method and path
+    """
+
+    __slots__ = ("generation", "thread", "records", "index", "totals", "spills")
+
+    def __init__(self, generation, thread):
+        self.generation = generation
+        self.thread = thread
+        self.spills = []
+        self.clear()
+
+    def clear(self):
+        self.records = deque()
+        self.index = {}
+        self.totals = {}
+        self.close()
+
+    def spill(self):
+        """
+        The file the next streaming body is spilled to
+        """
+        spills = self.spills
+        if not spills or spills[-1].size >= _SpillFile.max_size:
+            if spills and not spills[-1].records:
+                spills.pop().close()
+            spills.append(_SpillFile())
+        return spills[-1]
+
+    def close(self):
+        """
+        Close the files the bodies were spilled to
+        """
+        for spill in self.spills:
+            spill.close()
+        self.spills = []
+
+    def append(self, record, capacity):
+        key = (record.method, record.path)
+        if capacity is not None and len(self.records) >= capacity:
+            evicted = self.records.popleft()
+            evicted_key = (evicted.method, evicted.path)
+            bucket = self.index[evicted_key]
+            bucket.popleft()
+            if not bucket:
+                del self.index[evicted_key]
+            spill = evicted.body_file
+            if spill is not None:
+                spill.records -= 1
+                if not spill.records and spill is not self.spills[-1]:
+                    spill.close()
+                    self.spills.remove(spill)
+        self.records.append(record)
+        bucket = self.index.get(key)
+        if bucket is None:
+            bucket = self.index[key] = deque()
+        bucket.append(record)
+        self.totals[key] = self.totals.get(key, 0) + 1
+
+
+class CallJournal(object):
+    """
+    Thread-safe record of the calls made to a patch.
+
+    Every thread appends to its own shard, so recording a call never
+    takes a lock; the shards are merged when the journal is queried.
+    Each shard keeps at most ``capacity`` records, evicting the oldest,
+    but call counts stay exact. The bound is per thread: a journal
+    recording the calls of ``n`` threads keeps up to ``n * capacity``
+    records.
+    """
+
+    #: Default number of records kept per thread
+    capacity = 10000
+
+    #: Largest request body, in bytes, kept in the records for matchers;
+    #: the first bytes of larger bodies are kept as ``body_prefix``
+    body_limit = 4096
+
+    #: Whether streaming request bodies are written to temporary files,
+    #: so that :meth:`CallRecord.open_body` can read them back in full.
+    #: The bodies recorded by a thread share a file, closed with its
+    #: records when the journal is reset
+    spill = False
+
+    def __init__(
+        self, generation=None, capacity=None, headers=None, body_limit=None, spill=None
+    ):
+        """
+        Instantiate a :class:`CallJournal`
+
+        :param generation: The generation shared with other journals,
+            used to reset them all at once; :meth:`reset` only resets
+            this journal
+        :type  generation: :class:`Generation`
+
+        :param capacity: The number of records kept by each thread that
+            makes calls, ``None`` for the default
+        :type  capacity: ``int``
+
+        :param headers: The names of the headers to record, ``None`` to
+            record every header
+        :type  headers: ``list``
+
+        :param body_limit: The largest request body kept in the records,
+            ``None`` for the default
+        :type  body_limit: ``int``
+
+        :param spill: Whether streaming request bodies are written to
+            temporary files, ``None`` for the default
+        :type  spill: ``bool``
+        """
+        #: The :class:`Generation` shared with other journals
+        self.shared = generation if generation is not None else Generation()
+        self._resets = 0
+        if capacity is not None:
+            self.capacity = capacity
+        if body_limit is not None:
+            self.body_limit = body_limit
+        if spill is not None:
+            self.spill = spill
+        self.header_names = (
+            None if headers is None else frozenset(h.lower() for h in headers)
+        )
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def _shard(self):
+        generation = (self.shared.value, self._resets)
+        shard = getattr(self._local, "shard", None)
+        if shard is None or shard.generation != generation:
+            if shard is not None:
+                self._live_shards()
+            shard = _Shard(generation, threading.current_thread().ident)
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def _live_shards(self, thread=None):
+        generation = (self.shared.value, self._resets)
+        shards = self._shards
+        for shard in shards:
+            if shard.generation != generation:
+                # Drop the shards of earlier generations, including those
+                # of threads that are gone and will never record again
+                with self._lock:
+                    shards = []
+                    for shard in self._shards:
+                        if shard.generation == generation:
+                            shards.append(shard)
+                        else:
+                            shard.close()
+                    self._shards = shards
+                break
+        return [shard for shard in shards if thread is None or shard.thread == thread]
+
+    def record(self, request):
+        """
+        Record a call
+
+        :param request: The request instance
+        :type  request: :class:`requests.PreparedRequest`
+
+        :rtype: :class:`CallRecord`
+        """
+        shard = self._shard()
+        record = CallRecord(
+            next(self._sequence),
+            shard.thread,
+            request,
+            self.header_names,
+            self.body_limit,
+            shard.spill if self.spill else None,
+        )
+        shard.append(record, self.capacity)
+        return record
+
+    @property
+    def generation(self):
+        """
+        The current generation, which changes every time the journal is
+        reset, on its own or with the journals sharing its generation
+
+        :rtype: ``tuple``
+        """
+        return (self.shared.value, self._resets)
+
+    def reset(self):
+        """
+        Forget every call recorded so far, leaving the journals sharing
+        its generation alone
+        """
+        with self._lock:
+            self._resets += 1
+        self._live_shards()
+
+    def _keys(self, shard, method, path):
+        if method is not None and path is not None:
+            return [(method, path)]
+        return [
+            key
+            for key in list(shard.totals)
+            if (method is None or key[0] == method) and (path is None or key[1] == path)
+        ]
+
+    def count(self, method=None, path=None, headers=None, thread=None, match=None):
+        """
+        The number of calls made, optionally only those with the given
+        method, path and headers, or accepted by a matcher.
+
+        Counts by method and path are exact, counts filtered by headers
+        or a matcher only consider the records still held in the journal.
+
+        :param method: The HTTP method
+        :type  method: ``str``
+
+        :param path: The URI path
+        :type  path: ``str``
+
+        :param headers: Header names and values
+        :type  headers: ``dict``
+
+        :param thread: The identifier of the calling thread
+        :type  thread: ``int``
+
+        :param match: Only count the calls it accepts
+        :type  match: :class:`pytest_requests.matchers.Matcher`
+
+        :rtype: ``int``
+        """
+        method = method.upper() if method else None
+        if match is not None:
+            return len(match.filter(self._records(method, path, thread)))
+        total = 0
+        for shard in self._live_shards(thread):
+            if headers is None:
+                if method is None and path is None:
+                    total += sum(shard.totals.values())
+                else:
+                    for key in self._keys(shard, method, path):
+                        total += shard.totals.get(key, 0)
+                continue
+            for key in self._keys(shard, method, path):
+                for record in list(shard.index.get(key, ())):
+                    if record.has_headers(headers):
+                        total += 1
+        return total
+
+    def calls(self, method=None, path=None, thread=None, match=None):
+        """
+        The records held, in the order the calls were made
+
+        :param match: Only return the calls it accepts
+        :type  match: :class:`pytest_requests.matchers.Matcher`
+
+        :rtype: ``list`` of :class:`CallRecord`
+        """
+        method = method.upper() if method else None
+        records = self._records(method, path, thread)
+        if match is not None:
+            records = match.filter(records)
+        records.sort(key=lambda record: record.sequence)
+        return records
+
+    def _records(self, method, path, thread):
+        records = []
+        for shard in self._live_shards(thread):
+            if method is None and path is None:
+                records.extend(shard.records)
+            else:
+                for key in self._keys(shard, method, path):
+                    records.extend(shard.index.get(key, ()))
+        return records
+
+    def last(self, thread=None):
+        """
+        The record of the most recent call, or ``None`` if there was none
+
+        :rtype: :class:`CallRecord`
+        """
+        records = [
+            shard.records[-1] for shard in self._live_shards(thread) if shard.records
+        ]
+        if not records:
+            return None
+        return max(records, key=lambda record: record.sequence)
+
+    def counts_by_thread(self):
+        """
+        The number of calls made by each thread
+
+        :rtype: ``dict``
+        """
+        counts = {}
+        for shard in self._live_shards():
+            total = sum(shard.totals.values())
+            if total:
+                counts[shard.thread] = counts.get(shard.thread, 0) + total
+        return counts
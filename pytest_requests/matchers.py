@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative request matchers, compiled once into plain predicates.
+
+The same :class:`Matcher` selects the route serving a request and filters
+the calls recorded by a :class:`pytest_requests.journal.CallJournal`:
+
+>>> tenant = matches(headers={"X-Tenant": "acme"}, query={"page": "1"})
+>>> router.get("/api/users", match=tenant).returns = good([])
+>>> route.journal.count(match=json_path("user.name", "ada"))
+
+Expected values are literals compared for equality, compiled regular
+expressions searched for, or callables returning a ``bool``.
+"""
+
+from requests.compat import urlparse
+import re
+from .journal import _Parsed, _missing
+
+__all__ = [
+    "Matcher",
+    "RequestView",
+    "all_of",
+    "body_regex",
+    "header",
+    "headers",
+    "json_path",
+    "json_subset",
+    "matches",
+    "query",
+]
+
+
+class Matcher(object):
+    """
+    A compiled predicate over a call.
+
+    Calls are :class:`pytest_requests.journal.CallRecord` instances or
+    :class:`RequestView` wrapping a request being sent.
+    """
+
+    __slots__ = ("test", "description")
+
+    def __init__(self, test, description):
+        """
+        Instantiate a Matcher
+
+        :param test: The predicate, taking a call and returning a ``bool``
+        :type  test: ``callable``
+
+        :param description: Shown in assertion messages
+        :type  description: ``str``
+        """
+        self.test = test
+        self.description = description
+
+    def __call__(self, call):
+        return self.test(call)
+
+    def filter(self, calls):
+        """
+        The calls accepted by this matcher
+
+        :rtype: ``list``
+        """
+        test = self.test
+        return [call for call in calls if test(call)]
+
+    def __and__(self, other):
+        return all_of(self, other)
+
+    def __repr__(self):
+        return "<Matcher {0}>".format(self.description)
+
+
+class RequestView(_Parsed):
+    """
+    The parts of a :class:`requests.PreparedRequest` matchers look at,
+    with the same interface as a recorded call
+    """
+
+    __slots__ = ("headers", "query", "body", "_params", "_json")
+
+    def __init__(self, request):
+        self.headers = request.headers
+        self.query = urlparse(request.url).query
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.body = body if isinstance(body, bytes) else None
+        self._params = None
+        self._json = _missing
+
+
+def _predicate(expected):
+    """
+    Compile an expected value into a predicate over the actual value
+    """
+    if hasattr(expected, "search"):
+        search = expected.search
+        return lambda value: isinstance(value, str) and search(value) is not None
+    if callable(expected):
+        return expected
+    return lambda value: value == expected
+
+
+_unreserved = re.compile(r"^[A-Za-z0-9_.~-]+$").match
+
+
+def _description(expected):
+    if hasattr(expected, "pattern"):
+        return "/{0}/".format(expected.pattern)
+    return repr(expected)
+
+
+def all_of(*matchers):
+    """
+    Match calls accepted by every one of the matchers
+
+    :rtype: :class:`Matcher`
+    """
+    tests = tuple(matcher.test for matcher in matchers)
+    description = " and ".join(matcher.description for matcher in matchers)
+    if len(tests) == 1:
+        return Matcher(tests[0], description)
+
+    def test(call):
+        for one in tests:
+            if not one(call):
+                return False
+        return True
+
+    return Matcher(test, description)
+
+
+def header(name, expected):
+    """
+    Match calls with a header, ``None`` matching calls without it
+
+    :param name: The header name, case-insensitive
+    :type  name: ``str``
+
+    :param expected: The expected value, pattern or predicate
+    :type  expected: ``str``
+
+    :rtype: :class:`Matcher`
+    """
+    key = name.lower()
+    description = "header {0}={1}".format(name, _description(expected))
+    if expected is None:
+        return Matcher(lambda call: call.headers.get(key) is None, description)
+    if isinstance(expected, str):
+        return Matcher(lambda call: call.headers.get(key) == expected, description)
+    predicate = _predicate(expected)
+    return Matcher(lambda call: predicate(call.headers.get(key)), description)
+
+
+def headers(expected):
+    """
+    Match calls with every one of the headers
+
+    :param expected: Header names mapped to values, patterns or predicates
+    :type  expected: ``dict``
+
+    :rtype: :class:`Matcher`
+    """
+    return all_of(*[header(name, value) for name, value in expected.items()])
+
+
+def query(expected):
+    """
+    Match calls whose query string holds at least the given parameters.
+    A parameter repeated in the query matches if any of its values does.
+
+    :param expected: Parameter names mapped to values, patterns or
+        predicates
+    :type  expected: ``dict``
+
+    :rtype: :class:`Matcher`
+    """
+    checks = tuple(
+        (name, _predicate(value)) for name, value in sorted(expected.items())
+    )
+    # Names and values only made of unreserved characters appear verbatim
+    # in the raw query string, which rules out most calls without parsing.
+    literal = []
+    for name, value in sorted(expected.items()):
+        if _unreserved(name):
+            if isinstance(value, str) and _unreserved(value):
+                literal.append("{0}={1}".format(name, value))
+            else:
+                literal.append(name)
+    literal = tuple(literal)
+    description = "query {0}".format(
+        ", ".join(
+            "{0}={1}".format(name, _description(expected[name])) for name, _ in checks
+        )
+    )
+
+    def test(call):
+        raw = call.query
+        for part in literal:
+            if part not in raw:
+                return False
+        params = call.params()
+        for name, predicate in checks:
+            values = params.get(name)
+            if values is None:
+                return False
+            for value in values:
+                if predicate(value):
+                    break
+            else:
+                return False
+        return True
+
+    return Matcher(test, description)
+
+
+def _compile_json(expected):
+    """
+    Compile the expected part of a JSON document into a predicate.
+    Objects match supersets of their keys, arrays match arrays of the
+    same length item by item, anything else is a leaf value.
+    """
+    if isinstance(expected, dict):
+        checks = tuple((key, _compile_json(value)) for key, value in expected.items())
+
+        def test(value):
+            if not isinstance(value, dict):
+                return False
+            for key, check in checks:
+                item = value.get(key, _missing)
+                if item is _missing or not check(item):
+                    return False
+            return True
+
+        return test
+    if isinstance(expected, (list, tuple)):
+        checks = tuple(_compile_json(item) for item in expected)
+
+        def test(value):
+            if not isinstance(value, list) or len(value) != len(checks):
+                return False
+            for item, check in zip(value, checks):
+                if not check(item):
+                    return False
+            return True
+
+        return test
+    return _predicate(expected)
+
+
+def _json(call):
+    """
+    The JSON body of a call, refusing to guess about the bodies the journal
+    only kept the first bytes of
+    """
+    body = call.json()
+    if body is None and getattr(call, "truncated", False):
+        raise ValueError(
+            "{0!r} has a body of {1} bytes, over the body_limit of the journal: "
+            "raise body_limit or set spill to match its JSON".format(
+                call, call.body_size
+            )
+        )
+    return body
+
+
+def json_subset(expected):
+    """
+    Match calls whose JSON body contains the expected document. Recorded
+    bodies larger than
+    :attr:`pytest_requests.journal.CallJournal.body_limit` are read back
+    when the journal spills them, and raise ``ValueError`` otherwise.
+
+    :param expected: The expected document, where any value may be
+        a pattern or a predicate
+    :type  expected: ``dict`` or ``list``
+
+    :rtype: :class:`Matcher`
+    """
+    check = _compile_json(expected)
+
+    def test(call):
+        body = _json(call)
+        return body is not None and check(body)
+
+    return Matcher(test, "json {0!r}".format(expected))
+
+
+def json_path(path, expected):
+    """
+    Match calls with a value at a dotted path of their JSON body, such as
+    ``"items.0.name"``, numeric segments indexing arrays. Large bodies are
+    handled as by :func:`json_subset`.
+
+    :param path: The dotted path
+    :type  path: ``str``
+
+    :param expected: The expected value, document, pattern or predicate
+    :type  expected: ``object``
+
+    :rtype: :class:`Matcher`
+    """
+    steps = tuple(int(step) if step.isdigit() else step for step in path.split("."))
+    check = _compile_json(expected)
+
+    def test(call):
+        value = _json(call)
+        for step in steps:
+            if isinstance(step, int):
+                if not isinstance(value, list) or step >= len(value):
+                    return False
+                value = value[step]
+            else:
+                if not isinstance(value, dict):
+                    return False
+                value = value.get(step, _missing)
+                if value is _missing:
+                    return False
+        return check(value)
+
+    return Matcher(test, "json {0}={1}".format(path, _description(expected)))
+
+
+def body_regex(pattern, flags=0):
+    """
+    Match calls whose body matches a regular expression somewhere.
+    Only bodies retained by the journal can match, see
+    :attr:`pytest_requests.journal.CallJournal.body_limit`.
+
+    :param pattern: The regular expression, compiled patterns keep
+        their flags
+    :type  pattern: ``str`` or ``bytes``
+
+    :param flags: The flags of the regular expression
+    :type  flags: ``int``
+
+    :rtype: :class:`Matcher`
+    """
+    if hasattr(pattern, "pattern"):
+        # re.UNICODE only applies to str patterns
+        flags |= pattern.flags & ~re.UNICODE
+        pattern = pattern.pattern
+    if isinstance(pattern, str):
+        pattern = pattern.encode("utf-8")
+    search = re.compile(pattern, flags).search
+
+    def test(call):
+        body = call.body
+        return body is not None and search(body) is not None
+
+    return Matcher(test, "body /{0}/".format(pattern.decode("utf-8", "replace")))
+
+
+def matches(headers=None, query=None, json=None, body=None):
+    """
+    Compile a matcher from the expected parts of a request
+
+    :param headers: See :func:`headers`
+    :type  headers: ``dict``
+
+    :param query: See :func:`query`
+    :type  query: ``dict``
+
+    :param json: See :func:`json_subset`
+    :type  json: ``dict`` or ``list``
+
+    :param body: See :func:`body_regex`
+    :type  body: ``str``
+
+    :rtype: :class:`Matcher`
+    """
+    parts = []
+    if headers:
+        parts.append(_headers(headers))
+    if query:
+        parts.append(_query(query))
+    if json is not None:
+        parts.append(json_subset(json))
+    if body is not None:
+        parts.append(body_regex(body))
+    if not parts:
+        raise ValueError("Nothing to match")
+    return all_of(*parts)
+
+
+# :func:`matches` takes keyword arguments named after these functions
+_headers = headers
+_query = query
@@ -1,21 +1,25 @@
 # -*- coding: utf-8 -*-
 
-from mock import patch as mock_patch
 from requests.adapters import BaseAdapter
 from requests.compat import urlparse
 import contextlib
-from .response import RequestsResponse
+import random
+import timeit
+from .dispatch import install
+from .response import RequestsResponse, _chunk_reader, _served_size
+from .responder import ResponseSequence
+from .journal import CallJournal
+from .clock import VirtualClock, simulate_delay
+from .faults import RetryAdapter
+from . import stats
 
 __all__ = ["patch"]
 
 
 @contextlib.contextmanager
-def patch(uri):
-    adapter = RequestsPatchedAdapter(uri)
-    patched_adapter = mock_patch("requests.sessions.HTTPAdapter", new=adapter)
-    patched_adapter.start()
-    yield adapter
-    patched_adapter.stop()
+def patch(uri, clock=None, **journal):
+    with install(RequestsPatchedAdapter(uri, clock=clock, **journal)) as adapter:
+        yield adapter
 
 
 class RequestsPatchedAdapter(BaseAdapter):
@@ -23,19 +27,51 @@ class RequestsPatchedAdapter(BaseAdapter):
     Context-Wrapper for the patched requests HTTP Adapter
     """
 
-    def __init__(self, uri=None):
+    def __init__(self, uri=None, generation=None, clock=None, match=None, **journal):
         """
         Instantiate a RequestsPatchedAdapter
 
         :param uri: The URI to patch
         :type  uri: ``str``
+
+        :param generation: The generation shared with other patches,
+            used to reset them all at once
+        :type  generation: :class:`pytest_requests.journal.Generation`
+
+        :param clock: The clock simulated delays are spent on, a new
+            :class:`pytest_requests.clock.VirtualClock` by default
+        :type  clock: :class:`pytest_requests.clock.VirtualClock`
+
+        :param match: The requests served by this patch when it is a route
+            of a router
+        :type  match: :class:`pytest_requests.matchers.Matcher`
+
+        :param journal: The ``capacity``, ``headers``, ``body_limit`` and
+            ``spill`` options of the journal recording the calls, see
+            :class:`pytest_requests.journal.CallJournal`
         """
         self.uri = uri
+        self.matcher = match
         self._response = None
-        self._call_count = 0
-        self._request = None
+        self.journal = CallJournal(generation, **journal)
+        self.clock = clock if clock is not None else VirtualClock()
+        #: Seconds before the response starts, a number, a ``(low, high)``
+        #: range or a callable taking :attr:`rng` and returning a number
+        self.latency = None
+        #: Bytes per second the body is transferred at, chunk by chunk as
+        #: it is read for streaming bodies
+        self.bandwidth = None
+        self.rng = random.Random(0)
+        #: The :class:`pytest_requests.faults.FaultPolicy` failing some calls
+        self.faults = None
+        #: The :class:`pytest_requests.ratelimit.RateLimit` rejecting calls
+        #: once its budget is spent
+        self.limit = None
 
-    def __call__(self):
+    def __call__(self, *args, **kwargs):
+        max_retries = kwargs.get("max_retries")
+        if max_retries:
+            return RetryAdapter(self, max_retries)
         return self
 
     @property
@@ -47,24 +83,237 @@ class RequestsPatchedAdapter(BaseAdapter):
         """
         Set the value that the patch returns
 
-        :param value: The response to patch
-        :type  value: :class:`pytest_requests.response.RequestsResponse`
+        :param value: The response to patch, a list or an iterator of
+            responses served one per call, see
+            :class:`pytest_requests.responder.ResponseSequence`, or
+            a callable taking the request and the values captured from
+            the URI and returning the response, see
+            :class:`pytest_requests.responder.Responder`
+        :type  value: :class:`pytest_requests.response.RequestsResponse`,
+            ``list``, iterator or ``callable``
         """
-        if not isinstance(value, RequestsResponse):
-            raise TypeError("Returns value must be an instance of `RequestsResponse`")
+        if isinstance(value, (list, tuple)) or (
+            hasattr(value, "__next__") and not isinstance(value, RequestsResponse)
+        ):
+            value = ResponseSequence(value)
+        if not isinstance(value, RequestsResponse) and not callable(value):
+            raise TypeError(
+                "Returns value must be an instance of `RequestsResponse`, "
+                "a sequence of them or a callable"
+            )
         self._response = value
 
     def send(
         self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
     ):
-        self._request = request
-        self._call_count += 1
-        url_parts = urlparse(request.url)
-        if url_parts.path != self.uri:
+        path = urlparse(request.url).path
+        params = self.match_path(path)
+        if params is None:
+            self.journal.record(request)
             raise AssertionError(
-                "URI path not matched, was {0} not {1}".format(url_parts.path, self.uri)
+                "URI path not matched, was {0} not {1}".format(path, self.name)
             )
-        return self._response.to_response(request)
+        return self.respond(request, stream=stream, timeout=timeout, params=params)
+
+    @property
+    def name(self):
+        """
+        The URI, or the pattern of a regular expression URI
+
+        :rtype: ``str``
+        """
+        return getattr(self.uri, "pattern", self.uri)
+
+    def match_path(self, path):
+        """
+        Match a path against the URI: exactly, as a prefix when the URI
+        ends with ``*``, or in full when the URI is a compiled regular
+        expression.
+
+        :param path: The URI path of a request
+        :type  path: ``str``
+
+        :returns: The named groups of a regular expression, or the rest
+            of the path after a prefix as ``rest``, or ``None`` if the
+            path does not match
+        :rtype: ``dict``
+        """
+        uri = self.uri
+        if hasattr(uri, "fullmatch"):
+            found = uri.fullmatch(path)
+            return None if found is None else found.groupdict()
+        if uri.endswith("*"):
+            prefix = uri[:-1]
+            if not path.startswith(prefix):
+                return None
+            return {"rest": path[len(prefix) :]}
+        return {} if path == uri else None
+
+    def respond(self, request, stream=False, timeout=None, params=None, limit=None):
+        """
+        Record the request and build the response, without checking
+        that the request URI matches this patch. Used by routers that
+        have already matched the request to this patch.
+
+        :param request: The request instance
+        :type  request: :class:`requests.PreparedRequest`
+
+        :param params: Values captured from the URI by the router
+        :type  params: ``dict``
+
+        :param limit: The rate limit of the router, applied before
+            :attr:`limit`
+        :type  limit: :class:`pytest_requests.ratelimit.RateLimit`
+
+        :rtype: :class:`requests.Response`
+        """
+        traffic = stats.current()
+        timed = traffic is not None and traffic.sampled()
+        started = timeit.default_timer() if timed else None
+        rejected, limit_headers, fault = self.admit(request, limit)
+        if rejected is not None:
+            self.journal.record(request)
+            response, delay = rejected, 0.0
+        else:
+            if fault is not None and fault.fails_call:
+                self.journal.record(request)
+                fault.fail(self.clock, request, timeout)
+            response, delay = self.serve(request, params, fault)
+        if delay:
+            simulate_delay(self.clock, delay, timeout, request)
+        building = timeit.default_timer() if timed else None
+        result = response.to_response(request, stream=stream)
+        if limit_headers is not None:
+            result.headers.update(limit_headers)
+        if fault is not None:
+            result = fault.truncate(result)
+        if self.bandwidth and response.is_streaming:
+            self._throttle(result, request, timeout)
+        if traffic is not None:
+            size = _served_size(result)
+            if timed:
+                finished = timeit.default_timer()
+                traffic.record(
+                    request.method,
+                    self.name,
+                    size,
+                    finished - started,
+                    finished - building,
+                )
+            else:
+                traffic.record(request.method, self.name, size)
+        return result
+
+    def admit(self, request, limit=None):
+        """
+        Apply the rate limits and pick the fault of a call, before it is
+        served. Used by :meth:`respond` and by the transports that do not
+        go through requests.
+
+        Rate limits and fault policies are reset the first time they are
+        used after the calls of the route are reset, so the buckets and
+        the attempt counters do not carry over from test to test with the
+        shared routers.
+
+        :param request: The request instance
+        :type  request: :class:`requests.PreparedRequest`
+
+        :param limit: The rate limit of the router, applied before
+            :attr:`limit`
+        :type  limit: :class:`pytest_requests.ratelimit.RateLimit`
+
+        :returns: The response rejecting the call, or ``None``, the rate
+            limit headers to add to the response, or ``None``, and the
+            fault picked by :attr:`faults`, or ``None``
+        :rtype: ``tuple``
+        """
+        # The limit of the router is shared by its routes, and only reset
+        # with all of them
+        shared = self.journal.shared.value
+        generation = self.journal.generation
+        for policy, current in (
+            (limit, shared),
+            (self.limit, generation),
+            (self.faults, generation),
+        ):
+            if policy is not None and policy._generation != current:
+                policy.reset()
+                policy._generation = current
+        rejected = limit_headers = fault = None
+        for limiter in (limit, self.limit):
+            if limiter is not None and rejected is None:
+                rejected, limit_headers = limiter.acquire(request, self.clock)
+        if rejected is None and self.faults is not None:
+            fault = self.faults.decide(request)
+        return rejected, limit_headers, fault
+
+    def serve(self, request, params=None, fault=None):
+        """
+        Record the request and pick the response to serve, without
+        building a :class:`requests.Response`. Used by transports that
+        do not go through requests.
+
+        :param request: The request instance
+        :type  request: :class:`requests.PreparedRequest`
+
+        :param params: Values captured from the URI by the router
+        :type  params: ``dict``
+
+        :param fault: The fault picked for the call by :attr:`faults`
+
+        :returns: The :class:`pytest_requests.response.RequestsResponse`
+            to serve and the simulated delay in seconds
+        :rtype: ``tuple``
+        """
+        record = self.journal.record(request)
+        if fault is not None and fault.response is not None:
+            return fault.response, self._delay(fault.response)
+        response = self._response
+        if isinstance(response, ResponseSequence):
+            record.served, response = response.advance()
+        elif not isinstance(response, RequestsResponse):
+            response = response(request, **(params or {}))
+        return response, self._delay(response)
+
+    def _delay(self, response):
+        latency = self.latency
+        if latency is None:
+            delay = 0.0
+        elif isinstance(latency, tuple):
+            delay = self.rng.uniform(*latency)
+        elif callable(latency):
+            delay = latency(self.rng)
+        else:
+            delay = latency
+        if self.bandwidth and not response.is_streaming:
+            delay += len(response.content) / float(self.bandwidth)
+        return delay
+
+    def _throttle(self, result, request, timeout):
+        """
+        Transfer a streaming body at :attr:`bandwidth`: chunk by chunk as
+        it is read when the request streams it, at once otherwise
+        """
+        clock = self.clock
+        bandwidth = float(self.bandwidth)
+        reader = _chunk_reader(result)
+        if reader is None:
+            delay = _served_size(result) / bandwidth
+            simulate_delay(clock, delay, timeout, request)
+        else:
+            reader.throttle = lambda size: simulate_delay(
+                clock, size / bandwidth, timeout, request
+            )
+
+    def reset(self):
+        """
+        Forget the calls made so far, keeping the configured response
+        """
+        self.journal.reset()
+
+    @property
+    def call_count(self):
+        return self.journal.count()
 
     def was_called_once(self):
         """
@@ -72,22 +321,43 @@ class RequestsPatchedAdapter(BaseAdapter):
 
         :rtype: ``bool``
         """
-        if self._call_count != 1:
-            raise AssertionError(
-                "URL was called {0} times, not 1".format(self._call_count)
-            )
+        call_count = self.journal.count()
+        if call_count != 1:
+            raise AssertionError("URL was called {0} times, not 1".format(call_count))
         else:
             return True
 
-    def was_called_with_headers(self, headers):
+    def was_called_with(self, match):
+        """
+        Assert that at least one of the recorded calls is accepted by
+        a matcher
+
+        :param match: The matcher, see :mod:`pytest_requests.matchers`
+        :type  match: :class:`pytest_requests.matchers.Matcher`
+
+        :rtype: ``bool``
+        """
+        if not self.journal.count(match=match):
+            raise AssertionError(
+                "URL was not called with {0}".format(match.description)
+            )
+        return True
+
+    def was_called_with_headers(self, headers, thread=None):
         """
         Assert that URL was called with specific headers
 
+        :param thread: Check the last call made by the thread with this
+            identifier rather than the last call overall
+        :type  thread: ``int``
+
         :rtype: ``bool``
         """
+        call = self.journal.last(thread=thread)
+        assert call is not None
         for key, value in headers.items():
-            assert key in self._request.headers
-            assert value == self._request.headers[key]
+            assert key.lower() in call.headers
+            assert value == call.headers[key.lower()]
         return True
 
     def close(self):
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
 from collections import namedtuple
+import functools
+import os
 import pytest
-from .response import good, bad
-from .patch import patch
+from . import stats
+
+# requests, mock and the rest of the package are only imported when a
+# fixture is first used, so runs that never mock requests do not pay for
+# them at plugin load.
+
+Namespace = namedtuple("Namespace", ["good", "bad", "patch", "router", "replay"])
 
 
 def pytest_addoption(parser):
@@ -16,10 +23,260 @@ def pytest_addoption(parser):
         help='Set the value for the fixture "bar".',
     )
 
+    group.addoption(
+        "--requests-report",
+        action="store",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Show the N tests making the most mocked HTTP calls.",
+    )
+    group.addoption(
+        "--requests-report-json",
+        action="store",
+        default=None,
+        metavar="PATH",
+        help="Write the mocked HTTP traffic of every test as JSON.",
+    )
+
     parser.addini("HELLO", "Dummy pytest.ini setting")
+    parser.addini(
+        "requests_cassette_dir",
+        "Directory holding the cassettes replayed by requests_mock.replay, "
+        "relative to the rootdir",
+        default="cassettes",
+    )
+    parser.addini(
+        "requests_fixture_dir",
+        "Directory holding the canned responses served by requests_fixtures, "
+        "laid out like the URL space, relative to the rootdir",
+        default="fixtures",
+    )
+
+
+def pytest_addhooks(pluginmanager):
+    from . import hooks
+
+    pluginmanager.add_hookspecs(hooks)
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "requests_mock_keep: keep the calls recorded by the session- and "
+        "module-scoped routers from earlier tests",
+    )
+    config._requests_store = None
+
+
+def pytest_sessionstart(session):
+    config = session.config
+    if hasattr(config, "workerinput"):
+        return
+    if not config.hook.pytest_requests_build_store.get_hookimpls():
+        return
+    from .store import build_store
+
+    config._requests_store = build_store(config)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    # pytest-xdist: hand the path of the store to every worker
+    if node.config._requests_store is not None:
+        node.workerinput["requests_store"] = node.config._requests_store
+
+
+def pytest_sessionfinish(session):
+    path = session.config._requests_store
+    if path is not None:
+        from .store import remove_store
+
+        remove_store(path)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    stats.begin(item.nodeid)
+    item._requests_traffic = stats.current()
+    try:
+        yield
+    finally:
+        if stats.current() is item._requests_traffic:
+            stats.end()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    traffic = getattr(item, "_requests_traffic", None)
+    if call.when != "teardown" or traffic is None or stats.current() is not traffic:
+        return
+    stats.end()
+    if traffic.calls:
+        # Carried by the report, so that pytest-xdist sends it from the
+        # worker to the controller, where the summary is written
+        outcome.get_result().requests_traffic = traffic.state()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    count = config.getoption("--requests-report")
+    path = config.getoption("--requests-report-json")
+    if not count and not path:
+        return
+    results = [
+        stats.TestTraffic.from_state(report.requests_traffic)
+        for reports in terminalreporter.stats.values()
+        for report in reports
+        if getattr(report, "requests_traffic", None) is not None
+    ]
+    if count:
+        stats.report(terminalreporter, results, count)
+    if path:
+        stats.write_json(path, results)
 
 
 @pytest.fixture
 def requests_mock(request):
-    namespace = namedtuple("Namespace", ["good", "bad", "patch"])
-    return namespace(good, bad, patch)
+    from .response import good, bad
+    from .patch import patch
+    from .router import router
+    from .cassette import replay
+
+    directory = os.path.join(
+        str(request.config.rootdir), request.config.getini("requests_cassette_dir")
+    )
+    return Namespace(
+        good, bad, patch, router, functools.partial(replay, directory=directory)
+    )
+
+
+def _shared_router(request, adapter):
+    if request.node.get_closest_marker("requests_mock_keep") is None:
+        adapter.reset()
+    return adapter
+
+
+# The shared routers are built once per scope, and requests is patched once
+# for the session: each test only pushes its router on the dispatcher
+# standing in for the adapter class, see :mod:`pytest_requests.dispatch`.
+
+
+@pytest.fixture(scope="session")
+def _requests_dispatch():
+    from .dispatch import held
+
+    with held():
+        yield
+
+
+@pytest.fixture(scope="session")
+def _requests_mock_session_router(_requests_dispatch):
+    from .router import RequestsRouterAdapter
+
+    return RequestsRouterAdapter()
+
+
+@pytest.fixture(scope="module")
+def _requests_mock_module_router(_requests_dispatch):
+    from .router import RequestsRouterAdapter
+
+    return RequestsRouterAdapter()
+
+
+@pytest.fixture
+def requests_mock_session(request, _requests_mock_session_router):
+    """
+    A router built once for the whole session. Routes persist
+    between tests, the calls recorded against them are reset before
+    each test unless it is marked with ``requests_mock_keep``.
+    """
+    from .dispatch import install
+
+    with install(_shared_router(request, _requests_mock_session_router)) as adapter:
+        yield adapter
+
+
+@pytest.fixture
+def requests_mock_module(request, _requests_mock_module_router):
+    """
+    A router built once per test module, see ``requests_mock_session``
+    """
+    from .dispatch import install
+
+    with install(_shared_router(request, _requests_mock_module_router)) as adapter:
+        yield adapter
+
+
+@pytest.fixture
+def requests_server():
+    """
+    A :class:`pytest_requests.server.MockServer` listening on 127.0.0.1.
+    Register routes on ``requests_server.router`` and send requests to
+    ``requests_server.url``.
+    """
+    from .server import MockServer
+
+    with MockServer() as server:
+        yield server
+
+
+@pytest.fixture(scope="session")
+def _requests_store_cassette(request):
+    config = request.config
+    if hasattr(config, "workerinput"):
+        path = config.workerinput.get("requests_store")
+    else:
+        path = config._requests_store
+    if path is None:
+        raise pytest.UsageError(
+            "requests_store needs a pytest_requests_build_store hook in a conftest.py"
+        )
+    from .cassette import Cassette
+
+    with Cassette(path) as cassette:
+        yield cassette
+
+
+@pytest.fixture
+def requests_store(_requests_store_cassette):
+    """
+    Patch requests to serve the interactions of the route store built once
+    per run by the ``pytest_requests_build_store`` hook. With pytest-xdist
+    every worker maps the same read-only store.
+    """
+    from .cassette import serve
+
+    with serve(_requests_store_cassette) as adapter:
+        yield adapter
+
+
+@pytest.fixture(scope="session")
+def _requests_fixture_directory(request):
+    config = request.config
+    root = os.path.join(str(config.rootdir), config.getini("requests_fixture_dir"))
+    if not os.path.isdir(root):
+        raise pytest.UsageError(
+            "requests_fixtures needs the {0} directory, see the "
+            "requests_fixture_dir ini setting".format(root)
+        )
+    from .directory import FixtureDirectory
+
+    with FixtureDirectory(root, cache=getattr(config, "cache", None)) as directory:
+        yield directory
+
+
+@pytest.fixture
+def requests_fixtures(_requests_fixture_directory):
+    """
+    A router answering ``GET`` requests with the files of the fixture
+    directory, see the ``requests_fixture_dir`` ini setting. The tree is
+    indexed once per session, and the index is kept in the pytest cache
+    until a directory of the tree changes. Routes added to the router
+    take precedence over the files.
+    """
+    from .router import router
+
+    with router() as adapter:
+        adapter.get("/*").returns = _requests_fixture_directory
+        yield adapter
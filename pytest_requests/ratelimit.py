@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Server-side rate limiting with token buckets, to test how clients back off.
+
+A :class:`RateLimit` set on a route, or on a router for all of its routes,
+answers ``429 Too Many Requests`` once the budget is spent:
+
+>>> route.limit = RateLimit(10, burst=5)
+>>> router.limit = RateLimit(100, period=60, key=host)
+
+Buckets refill on the clock of the route, so a test running on a
+:class:`pytest_requests.clock.VirtualClock` spends no real time waiting
+for them. Every response carries ``X-RateLimit-Limit``,
+``X-RateLimit-Remaining`` and ``X-RateLimit-Reset``, in seconds, and
+rejected calls also carry ``Retry-After``.
+"""
+
+from requests.compat import urlparse
+import math
+import threading
+from .response import RequestsResponse
+
+__all__ = ["RateLimit", "host"]
+
+
+def host(request):
+    """
+    Key requests on their host name, to get a bucket per host
+
+    :param request: The request instance
+    :type  request: :class:`requests.PreparedRequest`
+
+    :rtype: ``str``
+    """
+    return urlparse(request.url).hostname
+
+
+class _Bucket(object):
+    """
+    The tokens left for one key, and the calls it served
+    """
+
+    __slots__ = ("tokens", "updated", "first", "last", "allowed", "limited")
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.first = now
+        self.last = now
+        self.allowed = 0
+        self.limited = 0
+
+
+class RateLimit(object):
+    """
+    Allow ``limit`` calls per ``period`` seconds, with bursts of up to
+    ``burst`` calls. Each call takes a token from its bucket, and tokens
+    come back at a steady ``limit / period`` per second.
+    """
+
+    # The generation of the routes the buckets were last used in, see
+    # :meth:`pytest_requests.patch.RequestsPatchedAdapter.admit`
+    _generation = None
+
+    def __init__(self, limit, period=1.0, burst=None, key=None, status_code=429):
+        """
+        Instantiate a RateLimit
+
+        :param limit: The number of calls allowed per period
+        :type  limit: ``int``
+
+        :param period: The period in seconds
+        :type  period: ``float``
+
+        :param burst: The size of the bucket, ``limit`` by default
+        :type  burst: ``int``
+
+        :param key: The function picking the bucket of a request, such as
+            :func:`host`, by default one bucket for every call
+        :type  key: ``callable``
+
+        :param status_code: The HTTP status code of rejected calls
+        :type  status_code: ``int``
+        """
+        if limit <= 0 or period <= 0:
+            raise ValueError("limit and period must be positive")
+        self.limit = limit
+        self.period = period
+        self.burst = burst if burst is not None else limit
+        if self.burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.key = key
+        self.status_code = status_code
+        #: Tokens regained per second
+        self.rate = limit / float(period)
+        #: The buckets by key
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, request, clock):
+        """
+        Take a token for a call
+
+        :param request: The request instance
+        :type  request: :class:`requests.PreparedRequest`
+
+        :param clock: The clock the buckets refill on
+        :type  clock: :class:`pytest_requests.clock.VirtualClock`
+
+        :returns: The response rejecting the call, or ``None`` if it is
+            allowed, and the rate limit headers
+        :rtype: ``tuple``
+        """
+        key = self.key(request) if self.key is not None else None
+        now = clock.now()
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = _Bucket(float(self.burst), now)
+            elapsed = now - bucket.updated
+            if elapsed > 0:
+                bucket.tokens = min(self.burst, bucket.tokens + elapsed * self.rate)
+            bucket.updated = now
+            bucket.last = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.allowed += 1
+                rejected = False
+            else:
+                bucket.limited += 1
+                rejected = True
+            tokens = bucket.tokens
+
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(int(tokens)),
+            "X-RateLimit-Reset": str(_seconds((self.burst - tokens) / self.rate)),
+        }
+        if not rejected:
+            return None, headers
+        headers["Retry-After"] = str(_seconds((1 - tokens) / self.rate))
+        response = RequestsResponse("", self.status_code, headers=headers)
+        return response, headers
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            raise KeyError("No call was made for {0!r}".format(key))
+        return bucket
+
+    @property
+    def allowed(self):
+        """
+        The number of calls allowed, in every bucket
+
+        :rtype: ``int``
+        """
+        return sum(bucket.allowed for bucket in self.buckets.values())
+
+    @property
+    def limited(self):
+        """
+        The number of calls rejected, in every bucket
+
+        :rtype: ``int``
+        """
+        return sum(bucket.limited for bucket in self.buckets.values())
+
+    def throughput(self, key=None):
+        """
+        The calls allowed per second between the first and the last call
+        of a bucket, to compare with :attr:`rate`
+
+        :param key: The key of the bucket
+        :type  key: ``object``
+
+        :returns: The throughput, or ``0.0`` if every call was made at once
+        :rtype: ``float``
+        """
+        bucket = self._bucket(key)
+        elapsed = bucket.last - bucket.first
+        if elapsed <= 0:
+            return 0.0
+        return bucket.allowed / elapsed
+
+    def utilization(self, key=None):
+        """
+        The part of the budget a bucket had between its first and its last
+        call that was used: ``1.0`` for a client using its whole quota,
+        less for a client waiting longer than it needs to
+
+        :param key: The key of the bucket
+        :type  key: ``object``
+
+        :rtype: ``float``
+        """
+        bucket = self._bucket(key)
+        budget = self.burst + (bucket.last - bucket.first) * self.rate
+        return min(1.0, bucket.allowed / budget)
+
+    def stats(self):
+        """
+        The calls allowed and rejected, and the throughput, by bucket
+
+        :rtype: ``dict``
+        """
+        return dict(
+            (
+                key,
+                {
+                    "allowed": bucket.allowed,
+                    "limited": bucket.limited,
+                    "throughput": self.throughput(key),
+                    "utilization": self.utilization(key),
+                },
+            )
+            for key, bucket in self.buckets.items()
+        )
+
+    def reset(self):
+        """
+        Refill every bucket and forget the calls counted so far
+        """
+        with self._lock:
+            self.buckets.clear()
+
+
+def _seconds(seconds):
+    """
+    Round a wait up to whole seconds, as ``Retry-After`` requires
+    """
+    return int(math.ceil(round(seconds, 9)))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from requests.compat import urlparse
+import hashlib
+import threading
+from urllib.parse import parse_qsl
+from .response import RequestsResponse
+
+__all__ = ["Responder", "ResponseSequence", "fingerprint", "memoize"]
+
+
+def fingerprint(query=True, headers=(), body=True):
+    """
+    Build a function computing the cache key of a request from its method,
+    path and the selected parts of the request.
+
+    :param query: Include the query string, or only the named parameters
+    :type  query: ``bool`` or ``list``
+
+    :param headers: The names of the headers to include
+    :type  headers: ``list``
+
+    :param body: Include a hash of the body
+    :type  body: ``bool``
+
+    :rtype: ``callable``
+    """
+    header_names = tuple(headers)
+    query_names = None if isinstance(query, bool) else frozenset(query)
+
+    def key(request):
+        url_parts = urlparse(request.url)
+        parts = [request.method, url_parts.path]
+        if query_names is not None:
+            parts.append(
+                tuple(
+                    sorted(
+                        (name, value)
+                        for name, value in parse_qsl(url_parts.query, True)
+                        if name in query_names
+                    )
+                )
+            )
+        elif query:
+            parts.append(tuple(sorted(parse_qsl(url_parts.query, True))))
+        for name in header_names:
+            parts.append(request.headers.get(name))
+        if body:
+            content = request.body
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            if isinstance(content, bytes):
+                parts.append(hashlib.sha1(content).hexdigest())
+        return tuple(parts)
+
+    return key
+
+
+class Responder(object):
+    """
+    Compute responses from the request, optionally memoizing them in
+    a least-recently-used cache.
+
+    The function is called with the :class:`requests.PreparedRequest`
+    and the values captured from the route URI as keyword arguments,
+    and returns a :class:`pytest_requests.response.RequestsResponse`.
+    """
+
+    def __init__(self, func, maxsize=0, key=None):
+        """
+        Instantiate a Responder
+
+        :param func: The function computing responses
+        :type  func: ``callable``
+
+        :param maxsize: The number of responses to keep, ``0`` to disable
+            memoization, ``None`` for no limit
+        :type  maxsize: ``int``
+
+        :param key: The function computing the cache key of a request,
+            :func:`fingerprint` of the whole request by default
+        :type  key: ``callable``
+        """
+        self.func = func
+        self.maxsize = maxsize
+        self.key = key if key is not None else fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, request, **params):
+        if self.maxsize == 0:
+            return self._compute(request, params)
+
+        key = (self.key(request), tuple(sorted(params.items())))
+        with self._lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return response
+            self.misses += 1
+
+        response = self._compute(request, params)
+        with self._lock:
+            self._cache[key] = response
+            if self.maxsize is not None and len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+        return response
+
+    def _compute(self, request, params):
+        response = self.func(request, **params)
+        if not isinstance(response, RequestsResponse):
+            raise TypeError("Responders must return an instance of `RequestsResponse`")
+        return response
+
+    @property
+    def currsize(self):
+        return len(self._cache)
+
+    def stats(self):
+        """
+        The cache statistics
+
+        :rtype: ``dict``
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "currsize": self.currsize,
+            "maxsize": self.maxsize,
+        }
+
+    def cache_clear(self):
+        """
+        Empty the cache and reset the statistics
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+def memoize(maxsize=128, key=None):
+    """
+    Decorate a function as a memoized :class:`Responder`
+
+    >>> @memoize(maxsize=256, key=fingerprint(query=["page"], body=False))
+    ... def render(request, id):
+    ...     return good(template.render(id=id))
+    """
+
+    def decorator(func):
+        return Responder(func, maxsize=maxsize, key=key)
+
+    return decorator
+
+
+class ResponseSequence(object):
+    """
+    Serve responses one per call, in order, from a sequence, an iterator
+    or a function returning an iterator, such as a generator function.
+
+    Iterators are consumed lazily, one response per call, so a sequence of
+    a million pages never holds more than the page being served. Cycling
+    restarts sequences and functions from the start; cycling an iterator
+    keeps the responses it produced.
+
+    >>> route.returns = ResponseSequence(
+    ...     good({"page": i}) for i in range(1000000)
+    ... )
+    """
+
+    def __init__(self, responses, cycle=False, repeat_last=False):
+        """
+        Instantiate a ResponseSequence
+
+        :param responses: The responses to serve
+        :type  responses: ``list``, iterator or ``callable``
+
+        :param cycle: Start again from the first response once every
+            response has been served
+        :type  cycle: ``bool``
+
+        :param repeat_last: Keep serving the last response once every
+            response has been served
+        :type  repeat_last: ``bool``
+        """
+        if cycle and repeat_last:
+            raise ValueError("cycle and repeat_last cannot be combined")
+        self.responses = responses
+        self.cycle = cycle
+        self.repeat_last = repeat_last
+        #: The number of responses served
+        self.served = 0
+        self._produced = [] if cycle and not self._restartable else None
+        self._iterator = self._start()
+        self._index = 0
+        self._last = None
+        self._lock = threading.Lock()
+
+    @property
+    def _restartable(self):
+        return isinstance(self.responses, (list, tuple)) or callable(self.responses)
+
+    def _start(self):
+        if callable(self.responses):
+            return iter(self.responses())
+        return iter(self.responses)
+
+    def advance(self):
+        """
+        Pick the next response
+
+        :returns: The position of the response in the sequence and the
+            response
+        :rtype: ``tuple``
+        """
+        with self._lock:
+            response = next(self._iterator, None)
+            if response is None:
+                if self._index == 0 and self._last is None:
+                    raise AssertionError("The response sequence is empty")
+                if self.repeat_last:
+                    self.served += 1
+                    return self._index - 1, self._last
+                if not self.cycle:
+                    raise AssertionError(
+                        "The response sequence was exhausted after {0} calls, "
+                        "pass cycle=True or repeat_last=True to keep "
+                        "serving it".format(self.served)
+                    )
+                if self._produced is not None:
+                    # The iterator is spent, cycle over what it produced
+                    self.responses, self._produced = self._produced, None
+                self._iterator = self._start()
+                self._index = 0
+                response = next(self._iterator, None)
+                if response is None:
+                    raise AssertionError("The response sequence is empty")
+            if not isinstance(response, RequestsResponse):
+                raise TypeError(
+                    "Response sequences must hold instances of `RequestsResponse`"
+                )
+            if self._produced is not None:
+                self._produced.append(response)
+            index = self._index
+            self._index += 1
+            self._last = response
+            self.served += 1
+            return index, response
+
+    def __call__(self, request, **params):
+        return self.advance()[1]
@@ -2,8 +2,20 @@
 
 import sys
 from requests import Response
+from requests.structures import CaseInsensitiveDict
+from urllib3.response import HTTPResponse
 from io import BytesIO
 import json
+import zlib
+from . import stats
+
+#: Body types served as JSON
+JSON_TYPES = (dict, list, tuple, int, float)
+
+#: Content codings responses can be served with
+CONTENT_ENCODINGS = ("gzip", "deflate")
+
+_json_encoder = None
 
 
 # Instead of depending on six
@@ -25,7 +37,7 @@ else:
             return string
 
 
-def good(body, status_code=200, headers={}):
+def good(body, status_code=200, headers=None):
     """
     Return a "good" response, e.g. HTTP 200 OK
     with a given body.
@@ -46,7 +58,7 @@ def good(body, status_code=200, headers={}):
     return RequestsResponse(body, status_code=status_code, headers=headers)
 
 
-def bad(body, status_code=500, headers={}):
+def bad(body, status_code=500, headers=None):
     """
     Return a "bad" response, e.g. HTTP 500 Server-Error
     with a given body.
@@ -67,17 +79,213 @@ def bad(body, status_code=500, headers={}):
     return RequestsResponse(body, status_code=status_code, headers=headers)
 
 
+def set_json_encoder(encoder):
+    """
+    Set the function used to serialize JSON bodies, e.g. ``orjson.dumps``.
+    It takes the body and returns ``str`` or ``bytes``; ``None`` restores
+    :func:`json.dumps`.
+
+    :param encoder: The encoder
+    :type  encoder: ``callable``
+    """
+    global _json_encoder
+    _json_encoder = encoder
+
+
+class _FrozenDict(dict):
+    """
+    Read-only ``dict``, still equal to and an instance of ``dict``
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Frozen mocked responses are read-only")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+
+class _FrozenList(list):
+    """
+    Read-only ``list``, still equal to and an instance of ``list``
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Frozen mocked responses are read-only")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = clear = extend = insert = pop = remove = reverse = sort = _readonly
+
+
+def _copy_json(obj):
+    if isinstance(obj, dict):
+        return dict((key, _copy_json(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_copy_json(value) for value in obj]
+    return obj
+
+
+def _freeze_json(obj):
+    if isinstance(obj, (_FrozenDict, _FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        return _FrozenDict((key, _freeze_json(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return _FrozenList(_freeze_json(value) for value in obj)
+    return obj
+
+
+def _is_streaming(body):
+    """
+    Whether a body is produced piece by piece rather than held in memory:
+    a file path, a file object, an iterator or a callable returning an
+    iterable of chunks. Asynchronous iterables are streaming bodies too,
+    served by :mod:`pytest_requests.aio`.
+    """
+    if isinstance(body, (bytes, str) + JSON_TYPES):
+        return False
+    return (
+        hasattr(body, "__fspath__")
+        or hasattr(body, "read")
+        or hasattr(body, "__next__")
+        or hasattr(body, "next")
+        or hasattr(body, "__aiter__")
+        or callable(body)
+    )
+
+
+def _compressor(encoding):
+    # gzip wraps the deflate stream in a gzip header, HTTP's "deflate"
+    # is the zlib format
+    wbits = zlib.MAX_WBITS | 16 if encoding == "gzip" else zlib.MAX_WBITS
+    return zlib.compressobj(6, zlib.DEFLATED, wbits)
+
+
+def _compress(content, encoding):
+    compressor = _compressor(encoding)
+    return compressor.compress(content) + compressor.flush()
+
+
+def _compress_chunks(chunks, encoding):
+    compressor = _compressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkReader(object):
+    """
+    File-like ``raw`` object reading from an iterator of chunks, holding
+    at most one chunk in memory at a time. The bytes are counted in the
+    traffic of the test as they are read.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b""
+        self._traffic = stats.current()
+        #: Called with the size of every chunk read, to simulate its transfer
+        self.throttle = None
+        self.closed = False
+
+    def _next(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return None
+        chunk = ensure_bytes(chunk)
+        if self._traffic is not None:
+            self._traffic.add_bytes(len(chunk))
+        if self.throttle is not None:
+            self.throttle(len(chunk))
+        return chunk
+
+    def read(self, amt=None, decode_content=None):
+        if amt is None:
+            data = self._buffer + b"".join(iter(self._next, None))
+            self._buffer = b""
+            return data
+        while len(self._buffer) < amt:
+            chunk = self._next()
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def close(self):
+        self.closed = True
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def _chunk_reader(response):
+    """
+    The :class:`_ChunkReader` a served :class:`requests.Response` reads its
+    body from, directly or through a urllib3 response, or ``None``
+    """
+    raw = response.raw
+    reader = getattr(raw, "_fp", raw)
+    return reader if isinstance(reader, _ChunkReader) else None
+
+
+def _served_size(response):
+    """
+    The size of the body of a served :class:`requests.Response`, as far as
+    it is known when the response is built: bodies read through
+    a :class:`_ChunkReader` are counted as they are read instead
+    """
+    if response._content:
+        return len(response._content)
+    if _chunk_reader(response) is not None:
+        return 0
+    return int(response.headers.get("Content-Length", 0))
+
+
+class _BodyCache(object):
+    """
+    The encoded forms of a body, shared by every response derived from
+    the same template with the same body
+    """
+
+    __slots__ = ("content", "json", "compressed", "consumed")
+
+    def __init__(self):
+        self.content = None
+        self.json = None
+        self.compressed = {}
+        #: Whether an iterator body was served, and cannot be served again
+        self.consumed = False
+
+
 class RequestsResponse(object):
     """
-    Abstraction of :class:`requests.Response`
+    Abstraction of :class:`requests.Response`.
+
+    A response can be frozen with :meth:`freeze` into a template, safe to
+    define once per module or session and to serve from many threads at
+    once. Templates cannot be changed; :meth:`with_body`, :meth:`with_status`
+    and :meth:`with_headers` derive new templates sharing the unchanged
+    parts, including the encoded body.
     """
 
-    def __init__(self, body, status_code, headers={}):
+    #: Size of the chunks read from file bodies
+    chunk_size = 64 * 1024
+
+    _template = False
+
+    def __init__(self, body, status_code, headers=None):
         """
         Instantiate a :class:`RequestsResponse`
 
-        :param body: The body of the response, or a dictionary for JSON data
-        :type  body: ``str`` or ``dict``
+        :param body: The body of the response, a dictionary, list or other
+            JSON-compatible value for JSON data, or a streaming source:
+            a file path, a file object, an iterator of chunks or a callable
+            returning an iterable of chunks. An iterator can only be served
+            once, serving it again raises ``AssertionError``
+        :type  body: ``str``, ``dict``, ``os.PathLike``, file object or
+            iterable
 
         :param status_code: The HTTP status code
         :type  status_code: ``int``
@@ -85,26 +293,257 @@ class RequestsResponse(object):
         :param headers: Headers for the response
         :type  headers: ``dict``
         """
-        if isinstance(body, dict):
-            body = json.dumps(body)
-
         self.body = body
         self.status_code = status_code
-        self.headers = headers
+        self.headers = dict(headers) if headers else {}
+        #: Function serializing JSON bodies, overriding :func:`set_json_encoder`
+        self.json_encoder = None
+        self._parsed_json = None
+        #: The ``Content-Encoding`` the body is served with, see :meth:`as_encoded`
+        self.content_encoding = None
+        #: Whether the body is served with ``Transfer-Encoding: chunked``
+        self.chunked = False
+
+    def __setattr__(self, name, value):
+        if self._template:
+            raise AttributeError(
+                "Frozen mocked responses are read-only, derive a new one with "
+                "with_body(), with_status() or with_headers()"
+            )
+        object.__setattr__(self, name, value)
+
+    @property
+    def body(self):
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+        self._cache = _BodyCache()
+
+    @property
+    def is_frozen(self):
+        """
+        Whether the response is an immutable template
+
+        :rtype: ``bool``
+        """
+        return self._template
+
+    def freeze(self):
+        """
+        Make the response an immutable template. JSON bodies and headers
+        are made read-only, so they can no longer be changed in place.
+
+        :rtype: :class:`RequestsResponse`
+        """
+        if self._template:
+            return self
+        if self.is_json:
+            frozen = _freeze_json(self._body)
+            if frozen is not self._body:
+                self.body = frozen
+        if not isinstance(self.headers, _FrozenDict):
+            self.headers = _FrozenDict(self.headers)
+        self._template = True
+        return self
+
+    def _derive(self, **changes):
+        variant = object.__new__(type(self))
+        state = variant.__dict__
+        state.update(self.__dict__)
+        state.update(changes)
+        state.pop("_template", None)
+        return variant.freeze()
+
+    def with_body(self, body):
+        """
+        Derive a frozen response with another body
+
+        :param body: The body, see :class:`RequestsResponse`
+        :type  body: ``str``
+
+        :rtype: :class:`RequestsResponse`
+        """
+        return self._derive(_body=body, _cache=_BodyCache())
+
+    def with_status(self, status_code):
+        """
+        Derive a frozen response with another status code
+
+        :param status_code: The HTTP status code
+        :type  status_code: ``int``
+
+        :rtype: :class:`RequestsResponse`
+        """
+        if not isinstance(status_code, int):
+            raise TypeError("Status Code must be of type `int`")
+        return self._derive(status_code=status_code)
+
+    def with_headers(self, headers):
+        """
+        Derive a frozen response with more headers, a ``None`` value
+        removing the header
+
+        :param headers: The headers to add or replace
+        :type  headers: ``dict``
+
+        :rtype: :class:`RequestsResponse`
+        """
+        merged = dict(self.headers)
+        for key, value in headers.items():
+            if value is None:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        return self._derive(headers=_FrozenDict(merged))
+
+    @property
+    def is_json(self):
+        """
+        Whether the body is a JSON-compatible value serialized on send
+
+        :rtype: ``bool``
+        """
+        return isinstance(self._body, JSON_TYPES)
+
+    @property
+    def is_streaming(self):
+        """
+        Whether the body is read piece by piece when it is served
+
+        :rtype: ``bool``
+        """
+        return _is_streaming(self._body)
+
+    @property
+    def content(self):
+        """
+        The encoded body of the response. The body is encoded the first
+        time it is needed and the bytes are reused for every later send.
+        Streaming bodies are read in full every time.
+
+        :rtype: ``bytes``
+        """
+        if _is_streaming(self._body):
+            return b"".join(self.iter_chunks())
+        cache = self._cache
+        if cache.content is None:
+            body = self._body
+            if self.is_json:
+                body = (self.json_encoder or _json_encoder or json.dumps)(body)
+            cache.content = ensure_bytes(body)
+        return cache.content
+
+    def compressed_content(self, encoding=None):
+        """
+        The body compressed with a content coding. The compressed bytes
+        are computed once and shared by every response derived from the
+        same template with the same body.
+
+        :param encoding: ``"gzip"`` or ``"deflate"``, the
+            :attr:`content_encoding` of the response by default
+        :type  encoding: ``str``
+
+        :rtype: ``bytes``
+        """
+        encoding = encoding or self.content_encoding
+        if encoding not in CONTENT_ENCODINGS:
+            raise ValueError(
+                "Content-Encoding must be one of {0}".format(
+                    ", ".join(CONTENT_ENCODINGS)
+                )
+            )
+        if _is_streaming(self._body):
+            return _compress(self.content, encoding)
+        compressed = self._cache.compressed.get(encoding)
+        if compressed is None:
+            compressed = _compress(self.content, encoding)
+            self._cache.compressed[encoding] = compressed
+        return compressed
+
+    def iter_chunks(self):
+        """
+        Iterate over the body in chunks
+
+        :rtype: iterator of ``bytes``
+        """
+        body = self._body
+        if not _is_streaming(body):
+            yield self.content
+        elif hasattr(body, "__fspath__"):
+            with open(body.__fspath__(), "rb") as fh:
+                for chunk in iter(lambda: fh.read(self.chunk_size), b""):
+                    yield chunk
+        elif hasattr(body, "read"):
+            if hasattr(body, "seek"):
+                body.seek(0)
+            for chunk in iter(lambda: body.read(self.chunk_size), b""):
+                if not chunk:
+                    break
+                yield ensure_bytes(chunk)
+        else:
+            if callable(body):
+                body = body()
+            else:
+                self._claim_iterator()
+            if hasattr(body, "__aiter__"):
+                raise TypeError(
+                    "Asynchronous bodies can only be served by pytest_requests.aio"
+                )
+            for chunk in body:
+                yield ensure_bytes(chunk)
+
+    def _claim_iterator(self):
+        """
+        Mark an iterator body as served. An iterator can only be read
+        once, so serving it again would silently send an empty body.
+        """
+        cache = self._cache
+        if cache.consumed:
+            raise AssertionError(
+                "The iterator body of this response was already served, "
+                "pass a callable returning an iterator to serve it again"
+            )
+        cache.consumed = True
 
     def as_json(self):
         """
         Set the response as a application/json MIME type
         """
-        self.headers["Content-Type"] = "application/json"
+        return self.as_type("application/json")
+
+    def parsed_json(self, mode="frozen"):
+        """
+        Make ``response.json()`` return the original body instead of
+        parsing the encoded bytes again.
+
+        :param mode: ``"frozen"`` returns the same read-only copy every
+            time, ``"copy"`` returns a fresh mutable copy on every call,
+            which is slower than parsing the bytes for large bodies,
+            ``None`` parses the bytes as usual
+        :type  mode: ``str``
+        """
+        if mode not in ("copy", "frozen", None):
+            raise ValueError("mode must be 'copy', 'frozen' or None")
+        if self._template:
+            return self._derive(_parsed_json=mode)
+        self._parsed_json = mode
         return self
 
+    def _json(self, **kwargs):
+        if self._parsed_json == "copy":
+            return _copy_json(self._body)
+        cache = self._cache
+        if cache.json is None:
+            cache.json = _freeze_json(self._body)
+        return cache.json
+
     def as_html(self):
         """
         Set the response as a text/html MIME type
         """
-        self.headers["Content-Type"] = "text/html"
-        return self
+        return self.as_type("text/html")
 
     def as_type(self, mime_type):
         """
@@ -113,10 +552,37 @@ class RequestsResponse(object):
         :param mime_type: The MIME type, e.g. text/html
         :type  mime_type: ``str``
         """
+        if self._template:
+            return self.with_headers({"Content-Type": mime_type})
         self.headers["Content-Type"] = mime_type
         return self
 
-    def to_response(self, request):
+    def as_encoded(self, encoding="gzip", chunked=False):
+        """
+        Serve the body compressed, through a :class:`urllib3.HTTPResponse`
+        so that requests decodes it as it would a real response.
+
+        :param encoding: ``"gzip"`` or ``"deflate"``, ``None`` to serve
+            the body as is
+        :type  encoding: ``str``
+
+        :param chunked: Send the body with ``Transfer-Encoding: chunked``
+            rather than a ``Content-Length``
+        :type  chunked: ``bool``
+        """
+        if encoding is not None and encoding not in CONTENT_ENCODINGS:
+            raise ValueError(
+                "Content-Encoding must be one of {0}".format(
+                    ", ".join(CONTENT_ENCODINGS)
+                )
+            )
+        if self._template:
+            return self._derive(content_encoding=encoding, chunked=chunked)
+        self.content_encoding = encoding
+        self.chunked = chunked
+        return self
+
+    def to_response(self, request, stream=False):
         """
         Convert the response to a native :class:`requests.Response`
         instance
@@ -124,13 +590,65 @@ class RequestsResponse(object):
         :param request: The request instance
         :type  request: :class:`requests.Request`
 
+        :param stream: Whether the request was made with ``stream=True``,
+            in which case streaming bodies are served chunk by chunk
+        :type  stream: ``bool``
+
         :rtype: :class:`requests.Response`
         """
         response = Response()
         response.url = request.url
-        response.raw = BytesIO(ensure_bytes(self.body))
         response.status_code = self.status_code
-        response.headers = self.headers
+        response.headers = CaseInsensitiveDict(self.headers)
         response.request = request
-        response._content = ensure_bytes(self.body)
+        if self.content_encoding is not None or self.chunked:
+            self._encode(response, stream)
+            return response
+        if stream and _is_streaming(self._body):
+            response.raw = _ChunkReader(self.iter_chunks())
+            return response
+
+        content = self.content
+        # BytesIO shares the immutable buffer until it is written to
+        response.raw = BytesIO(content)
+        response._content = content
+        if self._parsed_json is not None and self.is_json:
+            response.json = self._json
         return response
+
+    def _encode(self, response, stream):
+        """
+        Serve the body, compressed or chunked, from a urllib3 response,
+        leaving the content to be read and decoded by requests
+        """
+        encoding = self.content_encoding
+        headers = response.headers
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        if stream and _is_streaming(self._body):
+            chunks = self.iter_chunks()
+            if encoding is not None:
+                chunks = _compress_chunks(chunks, encoding)
+            body = _ChunkReader(chunks)
+            chunked = True
+        else:
+            if encoding is not None:
+                content = self.compressed_content(encoding)
+            else:
+                content = self.content
+            chunked = self.chunked
+            body = _ChunkReader(iter((content,))) if chunked else BytesIO(content)
+        if chunked:
+            headers.pop("Content-Length", None)
+            headers["Transfer-Encoding"] = "chunked"
+        else:
+            headers["Content-Length"] = str(len(content))
+        response.raw = HTTPResponse(
+            body=body,
+            headers=headers,
+            status=self.status_code,
+            preload_content=False,
+            decode_content=True,
+        )
+        if self._parsed_json is not None and self.is_json:
+            response.json = self._json
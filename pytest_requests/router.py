@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+from requests.adapters import BaseAdapter
+from requests.compat import urlparse
+import contextlib
+import re
+from .dispatch import install
+from .patch import RequestsPatchedAdapter
+from .journal import Generation
+from .clock import VirtualClock
+from .faults import RetryAdapter
+from .matchers import RequestView
+
+__all__ = ["router", "install", "RequestsRouterAdapter"]
+
+
+@contextlib.contextmanager
+def router(clock=None):
+    with install(RequestsRouterAdapter(clock=clock)) as adapter:
+        yield adapter
+
+
+def _is_template(uri):
+    return "{" in uri
+
+
+def _is_regex(uri):
+    return hasattr(uri, "pattern")
+
+
+def _split(path):
+    return path.split("/")
+
+
+def _literal_prefix(regex):
+    """
+    The literal text at the start of every path a compiled regular
+    expression matches, used to index it. Empty when the expression
+    ignores case or has a top-level alternation.
+    """
+    pattern = regex.pattern
+    if regex.flags & re.IGNORECASE or _has_top_level_alternation(pattern):
+        return ""
+    prefix = []
+    index = 1 if pattern.startswith("^") else 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            escaped = pattern[index + 1 : index + 2]
+            if not escaped or escaped.isalnum():
+                break
+            prefix.append(escaped)
+            index += 2
+            continue
+        if char in ".^$*+?{}[]|()":
+            # The last character is optional when a quantifier follows it
+            if char in "*?{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+        index += 1
+    return "".join(prefix)
+
+
+def _has_top_level_alternation(pattern):
+    depth = 0
+    escaped = in_class = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+    return False
+
+
+def _prefix_segments(prefix):
+    """
+    The complete path segments of a literal prefix, locating the node
+    of the prefix trie holding the routes starting with it
+    """
+    end = prefix.rfind("/")
+    return _split(prefix[:end]) if end > 0 else []
+
+
+def _insert(candidates, route, names):
+    """
+    Add a route to the candidates registered for the same URI. Routes
+    with a matcher are tried first, in registration order; a new route
+    without a matcher replaces the previous fallback.
+    """
+    if route.matcher is None:
+        candidates[:] = [c for c in candidates if c[0].matcher is not None]
+        candidates.append((route, names))
+    else:
+        fallbacks = [c for c in candidates if c[0].matcher is None]
+        candidates[len(candidates) - len(fallbacks) :] = [(route, names)] + fallbacks
+
+
+def _accepts(route, request, view):
+    """
+    Whether the matcher of a route, if any, accepts the request. The
+    request is only wrapped for the matchers, once, when needed.
+    """
+    matcher = route.matcher
+    if matcher is None:
+        return True
+    if request is None:
+        return False
+    if not view:
+        view.append(RequestView(request))
+    return matcher.test(view[0])
+
+
+def _select(candidates, request, view):
+    """
+    The first candidate accepting the request
+    """
+    for route, names in candidates:
+        if _accepts(route, request, view):
+            return route, names
+    return None
+
+
+def _collect(root, segments):
+    """
+    The entries of the prefix trie nodes along a path
+    """
+    entries = list(root.routes)
+    node = root
+    for segment in segments:
+        node = node.children.get(segment)
+        if node is None:
+            break
+        entries.extend(node.routes)
+    return entries
+
+
+class _Node(object):
+    """
+    A node of the path-segment trie used for templated URIs
+    """
+
+    __slots__ = ("children", "param", "routes")
+
+    def __init__(self):
+        self.children = {}
+        self.param = None
+        self.routes = []
+
+
+class RequestsRouterAdapter(BaseAdapter):
+    """
+    Patched requests HTTP Adapter serving many routes at once.
+
+    Exact URIs are kept in a hashed index keyed on ``(method, host, path)``,
+    templated URIs such as ``/users/{id}`` in a path-segment trie, so the
+    cost of dispatching a request does not grow with the number of routes.
+
+    Regular expression routes and prefix routes such as ``/static/*`` are
+    indexed in a trie on the literal text they start with, so only the
+    routes that can match a path are tried. A path is served by, in order
+    of priority: an exact route, a templated route, the first regular
+    expression route registered that matches it, the route with the
+    longest matching prefix.
+
+    Routes registered with a :class:`pytest_requests.matchers.Matcher`
+    only serve the requests it accepts; several of them may share a URI,
+    with a route without a matcher as the fallback.
+    """
+
+    def __init__(self, clock=None):
+        """
+        Instantiate a RequestsRouterAdapter
+
+        :param clock: The clock shared by the routes for simulated delays,
+            a new :class:`pytest_requests.clock.VirtualClock` by default
+        :type  clock: :class:`pytest_requests.clock.VirtualClock`
+        """
+        self._exact = {}
+        self._templates = {}
+        self._regexes = {}
+        self._prefixes = {}
+        #: ``(method, host, uri, route)`` for every registered route
+        self.routes = []
+        self._generation = Generation()
+        self.clock = clock if clock is not None else VirtualClock()
+        #: The :class:`pytest_requests.ratelimit.RateLimit` shared by every
+        #: route, applied before the limit of the route
+        self.limit = None
+
+    def __call__(self, *args, **kwargs):
+        max_retries = kwargs.get("max_retries")
+        if max_retries:
+            return RetryAdapter(self, max_retries)
+        return self
+
+    def add(self, method, uri, host=None, match=None, **journal):
+        """
+        Register a route and return the patch serving it
+
+        :param method: The HTTP method, or ``None`` to match any method
+        :type  method: ``str``
+
+        :param uri: The URI path, optionally with ``{name}`` segments or
+            ending with ``*`` to match every path starting with it, or
+            a compiled regular expression matching the whole path; the
+            named groups and the rest of the path after the prefix, as
+            ``rest``, are passed to callable responders
+        :type  uri: ``str`` or compiled regular expression
+
+        :param host: The host name, or ``None`` to match any host
+        :type  host: ``str``
+
+        :param match: Only serve the requests accepted by this matcher,
+            see :mod:`pytest_requests.matchers`
+        :type  match: :class:`pytest_requests.matchers.Matcher`
+
+        :param journal: The ``capacity``, ``headers``, ``body_limit`` and
+            ``spill`` options of the journal of the route, see
+            :class:`pytest_requests.journal.CallJournal`
+
+        :rtype: :class:`pytest_requests.patch.RequestsPatchedAdapter`
+        """
+        key = (method.upper() if method else None, host.lower() if host else None)
+        route = RequestsPatchedAdapter(
+            uri, generation=self._generation, clock=self.clock, match=match, **journal
+        )
+        sequence = len(self.routes)
+        self.routes.append(key + (uri, route))
+        if _is_regex(uri):
+            node = self._regexes.setdefault(key, _Node())
+            for segment in _prefix_segments(_literal_prefix(uri)):
+                node = node.children.setdefault(segment, _Node())
+            node.routes.append((sequence, route))
+            return route
+        if uri.endswith("*"):
+            node = self._prefixes.setdefault(key, _Node())
+            for segment in _prefix_segments(uri[:-1]):
+                node = node.children.setdefault(segment, _Node())
+            node.routes.append((-len(uri), sequence, route))
+            return route
+        if not _is_template(uri):
+            _insert(self._exact.setdefault(key + (uri,), []), route, ())
+            return route
+
+        names = []
+        node = self._templates.setdefault(key, _Node())
+        for segment in _split(uri):
+            if segment.startswith("{") and segment.endswith("}"):
+                names.append(segment[1:-1])
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+        _insert(node.routes, route, tuple(names))
+        return route
+
+    def get(self, uri, host=None, match=None, **journal):
+        return self.add("GET", uri, host=host, match=match, **journal)
+
+    def post(self, uri, host=None, match=None, **journal):
+        return self.add("POST", uri, host=host, match=match, **journal)
+
+    def put(self, uri, host=None, match=None, **journal):
+        return self.add("PUT", uri, host=host, match=match, **journal)
+
+    def delete(self, uri, host=None, match=None, **journal):
+        return self.add("DELETE", uri, host=host, match=match, **journal)
+
+    def match(self, method, url, request=None):
+        """
+        Find the route for a request
+
+        :param method: The HTTP method
+        :type  method: ``str``
+
+        :param url: The full request URL
+        :type  url: ``str``
+
+        :param request: The request checked by the matchers of the
+            routes, which are skipped when it is not given
+        :type  request: :class:`requests.PreparedRequest`
+
+        :returns: The matched patch and the values captured from the
+            path, or ``None`` if no route matches
+        :rtype: ``tuple``
+        """
+        url_parts = urlparse(url)
+        path = url_parts.path
+        host = url_parts.hostname
+        method = method.upper()
+        keys = ((method, host), (method, None), (None, host), (None, None))
+
+        view = []
+        for key in keys:
+            candidates = self._exact.get(key + (path,))
+            if candidates:
+                found = _select(candidates, request, view)
+                if found is not None:
+                    return found[0], {}
+
+        segments = None
+        for key in keys:
+            root = self._templates.get(key)
+            if root is None:
+                continue
+            if segments is None:
+                segments = _split(path)
+            values = []
+            found = _walk(root, segments, 0, values, request, view)
+            if found is not None:
+                route, names = found
+                return route, dict(zip(names, values))
+
+        for index in (self._regexes, self._prefixes):
+            for key in keys:
+                root = index.get(key)
+                if root is None:
+                    continue
+                if segments is None:
+                    segments = _split(path)
+                for entry in sorted(_collect(root, segments)):
+                    route = entry[-1]
+                    params = route.match_path(path)
+                    if params is not None and _accepts(route, request, view):
+                        return route, params
+        return None
+
+    def reset(self):
+        """
+        Forget the calls made to every route, keeping the routes and
+        their responses, and restart the clock. The rate limits and fault
+        policies of the routes are reset the next time they are used.
+        This does not depend on the number of routes.
+        """
+        self._generation.bump()
+        self.clock.reset()
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        matched = self.match(request.method, request.url, request)
+        if matched is None:
+            raise AssertionError(
+                "No route matched {0} {1}".format(request.method, request.url)
+            )
+        route, params = matched
+        return route.respond(
+            request, stream=stream, timeout=timeout, params=params, limit=self.limit
+        )
+
+    def close(self):
+        pass
+
+
+def _walk(node, segments, index, values, request, view):
+    """
+    Depth-first walk of the trie, preferring literal segments over
+    templated ones.
+    """
+    if index == len(segments):
+        return _select(node.routes, request, view)
+    child = node.children.get(segments[index])
+    if child is not None:
+        found = _walk(child, segments, index + 1, values, request, view)
+        if found is not None:
+            return found
+    if node.param is not None and segments[index]:
+        values.append(segments[index])
+        found = _walk(node.param, segments, index + 1, values, request, view)
+        if found is not None:
+            return found
+        values.pop()
+    return None
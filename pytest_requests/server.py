@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+from requests.exceptions import RequestException
+from requests.models import PreparedRequest
+from requests.structures import CaseInsensitiveDict
+import asyncio
+import functools
+import http.client
+import threading
+from .router import RequestsRouterAdapter
+
+__all__ = ["MockServer"]
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class _Dropped(Exception):
+    """
+    The connection is closed without a complete response, as a failing
+    server would
+    """
+
+
+class MockServer(object):
+    """
+    In-process asyncio HTTP/1.1 server on the loopback interface, serving
+    the routes of a :class:`pytest_requests.router.RequestsRouterAdapter`.
+
+    Unlike :func:`pytest_requests.patch.patch` the traffic goes through
+    real sockets, so connection pooling, keep-alive and chunked transfer
+    are exercised, and any HTTP client or subprocess can use it.
+
+    Responses are built and their bodies read in the default executor, so
+    a slow route does not hold up the other connections. Simulated
+    connection errors and read timeouts close the connection, and other
+    errors raised while serving a request are answered
+    ``500 Internal Server Error`` with the error as the body.
+    """
+
+    def __init__(self, router=None, host="127.0.0.1", port=0, backlog=4096):
+        """
+        Instantiate a MockServer
+
+        :param router: The routes to serve, a new router by default
+        :type  router: :class:`pytest_requests.router.RequestsRouterAdapter`
+
+        :param host: The address to listen on
+        :type  host: ``str``
+
+        :param port: The port to listen on, ``0`` for any free port
+        :type  port: ``int``
+
+        :param backlog: The number of pending connections to allow
+        :type  backlog: ``int``
+        """
+        self.router = router if router is not None else RequestsRouterAdapter()
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        #: The number of connections accepted
+        self.connections = 0
+        self._writers = set()
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._error = None
+
+    @property
+    def url(self):
+        """
+        The base URL of the server, e.g. ``http://127.0.0.1:8080``
+
+        :rtype: ``str``
+        """
+        return "http://{0}:{1}".format(self.host, self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Start serving from a background thread
+        """
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, args=(ready,))
+        self._thread.daemon = True
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+
+    def stop(self):
+        """
+        Close every connection and stop the server
+        """
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def hits(self):
+        """
+        The number of requests served by each route
+
+        :returns: Counts keyed on ``(method, uri)``
+        :rtype: ``dict``
+        """
+        return dict(
+            ((method, uri), route.call_count)
+            for method, _, uri, route in self.router.routes
+        )
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(
+                    self._handle, self.host, self.port, backlog=self.backlog
+                )
+            )
+        except Exception as error:
+            self._error = error
+            ready.set()
+            self._loop.close()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _BadRequest:
+                    writer.write(
+                        b"HTTP/1.1 400 Bad Request\r\n"
+                        b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+                    )
+                    break
+                if request is None:
+                    break
+                keep_alive = request.headers.get("Connection", "").lower() != "close"
+                await self._write_response(writer, request, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, _Dropped):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest()
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise _BadRequest()
+        headers = CaseInsensitiveDict()
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip()] = value.strip()
+
+        if headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        else:
+            length = int(headers.get("Content-Length", 0))
+            body = await reader.readexactly(length) if length else None
+
+        request = PreparedRequest()
+        request.method = method
+        request.url = "http://{0}{1}".format(headers.get("Host", self.host), target)
+        request.headers = headers
+        request.body = body
+        return request
+
+    async def _write_response(self, writer, request, keep_alive):
+        matched = self.router.match(request.method, request.url, request)
+        if matched is None:
+            writer.write(
+                b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n"
+                + (b"" if keep_alive else b"Connection: close\r\n")
+                + b"\r\n"
+            )
+            await writer.drain()
+            return
+        route, params = matched
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(
+                None,
+                functools.partial(route.respond, request, stream=True, params=params),
+            )
+        except RequestException:
+            raise _Dropped()
+        except Exception as error:
+            message = "{0}: {1}".format(type(error).__name__, error).encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 500 Internal Server Error\r\n"
+                + b"Content-Type: text/plain; charset=utf-8\r\n"
+                + "Content-Length: {0}\r\n".format(len(message)).encode("latin-1")
+                + (b"" if keep_alive else b"Connection: close\r\n")
+                + b"\r\n"
+                + message
+            )
+            await writer.drain()
+            return
+        content = response._content
+        head = [
+            "HTTP/1.1 {0} {1}".format(
+                response.status_code,
+                http.client.responses.get(response.status_code, ""),
+            )
+        ]
+        for name, value in response.headers.items():
+            if name.lower() not in (
+                "content-length",
+                "transfer-encoding",
+                "connection",
+            ):
+                head.append("{0}: {1}".format(name, value))
+        if content is False:
+            head.append("Transfer-Encoding: chunked")
+        else:
+            head.append("Content-Length: {0}".format(len(content)))
+        if not keep_alive:
+            head.append("Connection: close")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+        if content is False:
+            read = functools.partial(
+                response.raw.read, _CHUNK_SIZE, decode_content=False
+            )
+            while True:
+                try:
+                    chunk = await loop.run_in_executor(None, read)
+                except Exception:
+                    # The head is sent, the body can only be cut short
+                    raise _Dropped()
+                if not chunk:
+                    break
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        elif request.method != "HEAD":
+            writer.write(content)
+        await writer.drain()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Per-test record of the mocked HTTP traffic, reported by the plugin.
+
+Counting calls and bytes is always exact. Once a test has made
+``SAMPLE_THRESHOLD`` calls only one call in ``SAMPLE_EVERY`` is timed and
+the time spent is extrapolated, so very chatty tests stay cheap.
+"""
+
+import json
+import threading
+
+__all__ = ["TestTraffic", "begin", "end", "current", "top", "report", "write_json"]
+
+SAMPLE_THRESHOLD = 1000
+SAMPLE_EVERY = 16
+
+_current = None
+_stack = []
+
+
+class TestTraffic(object):
+    """
+    The mocked HTTP traffic of a single test
+    """
+
+    __test__ = False
+    __slots__ = (
+        "nodeid",
+        "calls",
+        "routes",
+        "bytes",
+        "timed_calls",
+        "send_time",
+        "build_time",
+        "_lock",
+    )
+
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+        self.calls = 0
+        self.routes = {}
+        self.bytes = 0
+        self.timed_calls = 0
+        self.send_time = 0.0
+        self.build_time = 0.0
+        self._lock = threading.Lock()
+
+    def sampled(self):
+        """
+        Whether the next call should be timed
+        """
+        return self.calls < SAMPLE_THRESHOLD or self.calls % SAMPLE_EVERY == 0
+
+    def record(self, method, uri, size, send_time=None, build_time=None):
+        """
+        Record a call
+
+        :param method: The HTTP method
+        :type  method: ``str``
+
+        :param uri: The URI of the route that served the call
+        :type  uri: ``str``
+
+        :param size: The number of bytes served
+        :type  size: ``int``
+
+        :param send_time: Seconds spent in ``send()``, if the call was timed
+        :type  send_time: ``float``
+
+        :param build_time: Seconds spent building the response
+        :type  build_time: ``float``
+        """
+        key = "{0} {1}".format(method, uri)
+        with self._lock:
+            self.calls += 1
+            self.routes[key] = self.routes.get(key, 0) + 1
+            self.bytes += size
+            if send_time is not None:
+                self.timed_calls += 1
+                self.send_time += send_time
+                self.build_time += build_time
+
+    def add_bytes(self, size):
+        """
+        Count the bytes of a body streamed after its call was recorded
+
+        :param size: The number of bytes read
+        :type  size: ``int``
+        """
+        with self._lock:
+            self.bytes += size
+
+    def _scale(self, seconds):
+        if not self.timed_calls:
+            return 0.0
+        return seconds * self.calls / self.timed_calls
+
+    @property
+    def estimated_send_time(self):
+        return self._scale(self.send_time)
+
+    @property
+    def estimated_build_time(self):
+        return self._scale(self.build_time)
+
+    def state(self):
+        """
+        The raw counters, to send the traffic from a pytest-xdist worker
+
+        :rtype: ``dict``
+        """
+        return dict(
+            (name, getattr(self, name)) for name in self.__slots__ if name != "_lock"
+        )
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Rebuild the traffic sent by a pytest-xdist worker
+
+        :param state: See :meth:`state`
+        :type  state: ``dict``
+
+        :rtype: :class:`TestTraffic`
+        """
+        traffic = cls(state["nodeid"])
+        for name, value in state.items():
+            setattr(traffic, name, value)
+        return traffic
+
+    def as_dict(self):
+        return {
+            "nodeid": self.nodeid,
+            "calls": self.calls,
+            "routes": self.routes,
+            "bytes": self.bytes,
+            "timed_calls": self.timed_calls,
+            "send_seconds": self.estimated_send_time,
+            "build_seconds": self.estimated_build_time,
+        }
+
+
+def current():
+    """
+    The traffic of the running test, or ``None`` outside of a test
+
+    :rtype: :class:`TestTraffic`
+    """
+    return _current
+
+
+def begin(nodeid):
+    """
+    Start recording the traffic of a test
+    """
+    global _current
+    _stack.append(_current)
+    _current = TestTraffic(nodeid)
+
+
+def end():
+    """
+    Stop recording the traffic of the running test
+
+    :rtype: :class:`TestTraffic`
+    """
+    global _current
+    traffic, _current = _current, _stack.pop()
+    return traffic
+
+
+def top(results, count):
+    """
+    The tests with the most calls, then the most time spent
+
+    :rtype: ``list`` of :class:`TestTraffic`
+    """
+    ranked = sorted(
+        results, key=lambda t: (t.calls, t.estimated_send_time), reverse=True
+    )
+    return ranked[:count]
+
+
+def report(terminalreporter, results, count):
+    """
+    Write the top ``count`` tests to the terminal
+    """
+    ranked = top(results, count)
+    if not ranked:
+        return
+    terminalreporter.write_sep(
+        "=", "requests traffic: top {0} tests by mocked calls".format(len(ranked))
+    )
+    terminalreporter.write_line(
+        "{0:>8} {1:>10} {2:>10} {3:>12}  {4}".format(
+            "calls", "send ms", "build ms", "bytes", "test (busiest route)"
+        )
+    )
+    for traffic in ranked:
+        route = max(traffic.routes, key=traffic.routes.get)
+        terminalreporter.write_line(
+            "{0:>8} {1:>10.2f} {2:>10.2f} {3:>12}  {4} ({5} x{6})".format(
+                traffic.calls,
+                traffic.estimated_send_time * 1000,
+                traffic.estimated_build_time * 1000,
+                traffic.bytes,
+                traffic.nodeid,
+                route,
+                traffic.routes[route],
+            )
+        )
+
+
+def write_json(path, results):
+    """
+    Write the traffic of every test as JSON
+    """
+    with open(path, "w") as fh:
+        json.dump(
+            {"tests": [traffic.as_dict() for traffic in results]},
+            fh,
+            indent=2,
+            sort_keys=True,
+        )
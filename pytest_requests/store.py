@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Read-only route store shared by the pytest-xdist workers.
+
+The interactions added by the ``pytest_requests_build_store`` hook are
+encoded once, by the controller, into a cassette file. Each worker maps
+the file with :class:`pytest_requests.cassette.Cassette`: the pages are
+shared between the processes by the operating system, and a worker only
+reads the records of the requests its tests make.
+"""
+
+import os
+import shutil
+import tempfile
+from .cassette import write_cassette
+
+__all__ = ["StoreBuilder", "build_store", "remove_store"]
+
+#: The file name of the store, in its temporary directory
+STORE_NAME = "requests-store.cas"
+
+
+class StoreBuilder(object):
+    """
+    The interactions of the store, collected from the
+    ``pytest_requests_build_store`` hook
+    """
+
+    def __init__(self):
+        self.interactions = []
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def add(self, method, target, response):
+        """
+        Add an interaction
+
+        :param method: The HTTP method
+        :type  method: ``str``
+
+        :param target: The URI path, with the query string if any
+        :type  target: ``str``
+
+        :param response: The response to serve
+        :type  response: :class:`pytest_requests.response.RequestsResponse`
+        """
+        self.interactions.append((method, target, response))
+
+    def get(self, target, response):
+        self.add("GET", target, response)
+
+
+def build_store(config):
+    """
+    Build the store from the ``pytest_requests_build_store`` hook
+
+    :param config: The pytest config
+    :type  config: :class:`_pytest.config.Config`
+
+    :returns: The path of the store
+    :rtype: ``str``
+    """
+    builder = StoreBuilder()
+    config.hook.pytest_requests_build_store(config=config, store=builder)
+    path = os.path.join(tempfile.mkdtemp(prefix="pytest-requests-"), STORE_NAME)
+    write_cassette(path, builder.interactions)
+    return path
+
+
+def remove_store(path):
+    """
+    Remove a store built by :func:`build_store`
+    """
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+import pytest
+from pytest_requests.aio import AsyncTransport
+from pytest_requests.clock import RealClock
+from pytest_requests.faults import FaultPolicy
+from pytest_requests.ratelimit import RateLimit
+from pytest_requests.response import good
+from pytest_requests.router import RequestsRouterAdapter
+
+
+def _transport(clock=None):
+    router = RequestsRouterAdapter(clock=clock)
+    return router, AsyncTransport(router)
+
+
+def test_async_send():
+    router, transport = _transport()
+    router.get("/api/users/{id}").returns = good({"id": 1})
+
+    async def main():
+        response = await transport.send("GET", "https://test.api/api/users/1")
+        await response.read()
+        return response
+
+    response = asyncio.run(main())
+    assert response.status_code == 200
+    assert response.json() == {"id": 1}
+    assert router.match("GET", "https://test.api/api/users/1")[0].was_called_once()
+
+
+def test_async_streaming_body():
+    router, transport = _transport()
+
+    async def chunks():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield "chunk{0}".format(i)
+
+    router.get("/api/export").returns = good(chunks)
+
+    async def main():
+        response = await transport.send("GET", "https://test.api/api/export")
+        return [chunk async for chunk in response.aiter_bytes()]
+
+    assert asyncio.run(main()) == [b"chunk0", b"chunk1", b"chunk2"]
+
+
+def test_async_bandwidth_of_streaming_bodies():
+    router, transport = _transport()
+    route = router.get("/api/export")
+    route.returns = good(lambda: iter([b"x" * 1000] * 3))
+    route.bandwidth = 1000
+
+    async def main():
+        response = await transport.send("GET", "https://test.api/api/export")
+        assert router.clock.now() == 0
+        assert len(await response.read()) == 3000
+        assert router.clock.now() == 3
+        response = await transport.send(
+            "GET", "https://test.api/api/export", timeout=0.5
+        )
+        with pytest.raises(asyncio.TimeoutError):
+            await response.read()
+
+    asyncio.run(main())
+    assert router.clock.now() == 3.5
+
+
+def test_async_timeout_on_virtual_clock():
+    router, transport = _transport()
+    route = router.get("/api/slow")
+    route.returns = good("slow")
+    route.latency = 30
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await transport.send("GET", "https://test.api/api/slow", timeout=5)
+
+    asyncio.run(main())
+    assert router.clock.now() == 5
+
+
+def test_real_delays_do_not_block_the_loop():
+    router, transport = _transport(clock=RealClock())
+    route = router.get("/api/slow")
+    route.returns = good("slow")
+    route.latency = 0.2
+
+    async def main():
+        return await asyncio.gather(
+            *[transport.send("GET", "https://test.api/api/slow") for _ in range(50)]
+        )
+
+    started = time.time()
+    assert len(asyncio.run(main())) == 50
+    assert time.time() - started < 2
+
+
+def test_10k_concurrent_coroutines():
+    router, transport = _transport()
+    state = {"in_flight": 0, "peak": 0}
+
+    async def chunks():
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await state["gate"].wait()
+        state["in_flight"] -= 1
+        yield b"done"
+
+    router.get("/api/test").returns = good(chunks)
+
+    async def call():
+        response = await transport.send("GET", "https://test.api/api/test")
+        return await response.read()
+
+    async def main():
+        state["gate"] = asyncio.Event()
+        tasks = [asyncio.ensure_future(call()) for _ in range(10000)]
+        while state["peak"] < 10000:
+            await asyncio.sleep(0.01)
+        state["gate"].set()
+        return await asyncio.gather(*tasks)
+
+    started = time.time()
+    results = asyncio.run(main())
+    elapsed = time.time() - started
+    assert results == [b"done"] * 10000
+    assert state["peak"] == 10000
+    assert elapsed < 10
+
+
+def test_httpx_transport():
+    httpx = pytest.importorskip("httpx")
+    router, transport = _transport()
+    router.get("/api/test").returns = good("hello")
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get("https://test.api/api/test")
+
+    assert asyncio.run(main()).text == "hello"
+
+
+def test_httpx_streaming_and_timeout():
+    httpx = pytest.importorskip("httpx")
+    router, transport = _transport()
+    route = router.get("/api/export")
+    route.returns = good(lambda: iter([b"a" * 10, b"b" * 10]))
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("GET", "https://test.api/api/export") as response:
+                chunks = [chunk async for chunk in response.aiter_raw()]
+            route.latency = 30
+            with pytest.raises(httpx.ReadTimeout):
+                await client.get("https://test.api/api/export", timeout=5)
+        return chunks
+
+    assert b"".join(asyncio.run(main())) == b"a" * 10 + b"b" * 10
+
+
+def test_async_faults_and_rate_limits():
+    router, transport = _transport()
+    route = router.get("/api/test")
+    route.returns = good("hello")
+    url = "https://test.api/api/test"
+
+    async def outcome(**kwargs):
+        try:
+            response = await transport.send("GET", url, **kwargs)
+            await response.read()
+            return response.status_code
+        except ConnectionError:
+            return "ConnectionError"
+        except asyncio.TimeoutError:
+            return "TimeoutError"
+
+    async def main():
+        outcomes = []
+        for fault in ("connection_error", "read_timeout", "truncated_body"):
+            route.faults = getattr(FaultPolicy(), fault)(1.0)
+            outcomes.append(await outcome(timeout=5))
+        route.faults = None
+        router.limit = RateLimit(1)
+        outcomes.append(await outcome())
+        response = await transport.send("GET", url)
+        outcomes.append((response.status_code, response.headers["Retry-After"]))
+        return outcomes
+
+    assert asyncio.run(main()) == [
+        "ConnectionError",
+        "TimeoutError",
+        "ConnectionError",
+        200,
+        (429, "1"),
+    ]
+    assert router.clock.now() == 5
+    assert route.call_count == 5
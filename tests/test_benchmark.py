@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+import json
+from pytest_requests import benchmark
+
+
+def test_benchmark_results_are_machine_readable(tmp_path):
+    path = tmp_path / "bench.json"
+    assert benchmark.main(["--number", "5", "--repeat", "1", "--json", str(path)]) == 0
+    report = json.loads(path.read_text())
+    names = set(result["name"] for result in report["results"])
+    assert names == {
+        "patch_enter_exit",
+        "send_patch",
+        "send_router",
+        "match_pattern",
+        "to_response",
+        "send_concurrent",
+        "session_get",
+        "store_worker_setup",
+    }
+    for result in report["results"]:
+        assert result["best_us"] > 0
+    transports = [r["transport"] for r in report["results"] if "transport" in r]
+    assert transports == ["loopback", "mock"]
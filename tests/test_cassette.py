@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import timeit
+import pytest
+import requests
+from pytest_requests.cassette import Cassette, replay, write_cassette
+from pytest_requests.response import good, bad
+
+
+def _interactions(count):
+    for i in range(count):
+        yield "GET", "/api/items/{0}".format(i), good("item {0}".format(i))
+
+
+def test_replay_cassette(tmp_path):
+    write_cassette(
+        str(tmp_path / "api.cassette"),
+        [
+            ("GET", "/api/test", good({"a": "b"}, headers={"X-Special": "value"})),
+            ("GET", "/api/test?page=2", good("page 2")),
+            ("POST", "/api/test", bad("nope", status_code=400)),
+        ],
+    )
+    with replay("api.cassette", directory=str(tmp_path)) as adapter:
+        response = requests.get("https://test.api/api/test")
+        assert response.json() == {"a": "b"}
+        assert response.headers["X-Special"] == "value"
+        assert requests.get("https://test.api/api/test?page=2").text == "page 2"
+        assert requests.post("https://test.api/api/test").status_code == 400
+        with pytest.raises(AssertionError):
+            requests.delete("https://test.api/api/test")
+        assert adapter.journal.count(method="GET") == 2
+
+
+def test_replay_unpatches_on_error(tmp_path):
+    write_cassette(str(tmp_path / "api.cassette"), _interactions(1))
+    original = requests.sessions.HTTPAdapter
+    with pytest.raises(AssertionError):
+        with replay("api.cassette", directory=str(tmp_path)):
+            requests.get("https://test.api/api/missing")
+    assert requests.sessions.HTTPAdapter is original
+
+
+def test_cassette_builds_responses_once(tmp_path):
+    path = str(tmp_path / "api.cassette")
+    write_cassette(path, _interactions(100))
+    with Cassette(path) as cassette:
+        assert len(cassette) == 100
+        response = cassette.lookup("get", "/api/items/42")
+        assert response.content == b"item 42"
+        assert cassette.lookup("GET", "/api/items/42") is response
+        assert cassette.lookup("GET", "/api/items/100") is None
+
+
+def test_not_a_cassette(tmp_path):
+    path = tmp_path / "api.cassette"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        Cassette(str(path))
+
+
+def test_fixture_replay(testdir):
+    write_cassette(
+        str(testdir.mkdir("cassettes").join("api.cassette")),
+        [("GET", "/api/test", good("hello"))],
+    )
+    testdir.makepyfile(
+        """
+        import requests
+
+        def test_replay(requests_mock):
+            with requests_mock.replay('api.cassette'):
+                assert requests.get('https://test.api/api/test').text == 'hello'
+    """
+    )
+    result = testdir.runpytest("-v")
+    result.stdout.fnmatch_lines(["*::test_replay PASSED*"])
+    assert result.ret == 0
+
+
+def test_startup_does_not_depend_on_size(tmp_path):
+    timings = []
+    for count in (10, 50000):
+        path = str(tmp_path / "{0}.cassette".format(count))
+        write_cassette(path, _interactions(count))
+
+        def startup():
+            with Cassette(path) as cassette:
+                cassette.lookup("GET", "/api/items/7")
+
+        timings.append(min(timeit.repeat(startup, number=200, repeat=5)))
+    assert timings[1] < timings[0] * 3
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import time
+import pytest
+import requests
+import requests.exceptions
+from pytest_requests.clock import RealClock, VirtualClock
+from pytest_requests.response import good
+from pytest_requests.router import router
+
+
+def test_slow_endpoint_times_out_on_virtual_clock(requests_mock):
+    with requests_mock.patch("/api/slow") as patch:
+        patch.returns = requests_mock.good("hello")
+        patch.latency = 30
+        started = time.time()
+        with pytest.raises(requests.exceptions.Timeout):
+            requests.get("https://test.api/api/slow", timeout=5)
+        assert time.time() - started < 1
+        assert patch.clock.now() == 5
+        assert patch.was_called_once()
+
+
+def test_latency_within_timeout(requests_mock):
+    with requests_mock.patch("/api/slow") as patch:
+        patch.returns = requests_mock.good("hello")
+        patch.latency = 30
+        assert requests.get("https://test.api/api/slow", timeout=(1, 60)).ok
+        assert requests.get("https://test.api/api/slow").ok
+        assert patch.clock.now() == 60
+
+
+def test_bandwidth_and_latency_range():
+    clock = VirtualClock()
+    with router(clock=clock) as adapter:
+        route = adapter.get("/api/export")
+        route.returns = good("x" * 3000)
+        route.latency = (1, 2)
+        route.bandwidth = 1000
+        requests.get("https://test.api/api/export")
+        assert 4 <= clock.now() <= 5
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            requests.get("https://test.api/api/export", timeout=3.5)
+
+
+def test_bandwidth_of_streaming_bodies():
+    clock = VirtualClock()
+    with router(clock=clock) as adapter:
+        route = adapter.get("/api/export")
+        route.returns = good(lambda: iter([b"x" * 1000] * 3))
+        route.bandwidth = 1000
+        response = requests.get("https://test.api/api/export", stream=True)
+        assert clock.now() == 0
+        chunks = response.iter_content(1000)
+        next(chunks)
+        assert clock.now() == 1
+        assert len(b"".join(chunks)) == 2000
+        assert clock.now() == 3
+        assert len(requests.get("https://test.api/api/export").content) == 3000
+        assert clock.now() == 6
+        response = requests.get("https://test.api/api/export", stream=True, timeout=0.5)
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            response.content
+        assert clock.now() == 6.5
+
+
+def test_latency_distribution(requests_mock):
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = requests_mock.good("hello")
+        patch.latency = lambda rng: rng.expovariate(10)
+        for _ in range(100):
+            requests.get("https://test.api/api/test")
+        assert 5 < patch.clock.now() < 20
+
+
+def test_real_clock(requests_mock):
+    with requests_mock.patch("/api/test", clock=RealClock()) as patch:
+        patch.returns = requests_mock.good("hello")
+        patch.latency = 0.05
+        started = time.time()
+        requests.get("https://test.api/api/test")
+        assert time.time() - started >= 0.05
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import requests
+from pytest_requests.directory import FixtureDirectory, scan
+from pytest_requests.router import router
+
+
+class DictCache(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        # the pytest cache stores values as JSON
+        self.values[key] = json.loads(json.dumps(value))
+
+
+def _tree(tmpdir):
+    users = tmpdir.mkdir("api").mkdir("v1").mkdir("users")
+    users.join("123.json").write('{"id": 123}')
+    users.join("index.json").write("[123]")
+    tmpdir.join("api", "v1", "logo.png").write(b"\x89PNG", mode="wb")
+    tmpdir.join("api", "v1", "readme.txt").write("")
+    return tmpdir
+
+
+def test_scan(tmpdir):
+    index = scan(str(_tree(tmpdir)))
+    files = index["files"]
+    assert files["/api/v1/users/123"] == [
+        os.path.join("api", "v1", "users", "123.json"),
+        "application/json",
+    ]
+    assert files["/api/v1/users/123.json"] == files["/api/v1/users/123"]
+    assert files["/api/v1/users"][0].endswith("index.json")
+    assert files["/api/v1/logo"][1] == "image/png"
+    assert files["/api/v1/readme"][1] == "text/plain"
+    assert set(index["dirs"]) == {
+        "",
+        "api",
+        os.path.join("api", "v1"),
+        os.path.join("api", "v1", "users"),
+    }
+
+
+def test_serve_directory(tmpdir):
+    with FixtureDirectory(str(_tree(tmpdir))) as directory, router() as mocked:
+        mocked.get("/*").returns = directory
+        mocked.get("/api/v1/users/1").returns = directory.lookup("/api/v1/users/123")
+        response = requests.get("https://test.api/api/v1/users/123?expand=1")
+        assert response.json() == {"id": 123}
+        assert response.headers["Content-Type"] == "application/json"
+        assert requests.get("https://test.api/api/v1/users").json() == [123]
+        assert requests.get("https://test.api/api/v1/users/1").json() == {"id": 123}
+        assert requests.get("https://test.api/api/v1/logo.png").content == b"\x89PNG"
+        assert requests.get("https://test.api/api/v1/readme").content == b""
+        assert requests.get("https://test.api/api/v1/missing").status_code == 404
+        # files are mapped when first served
+        assert len(directory._maps) == 3
+
+
+def test_index_cache(tmpdir):
+    root = _tree(tmpdir)
+    cache = DictCache()
+    first = FixtureDirectory(str(root), cache=cache)
+    assert first.scanned
+    second = FixtureDirectory(str(root), cache=cache)
+    assert not second.scanned
+    assert second.files == first.files
+
+    users = root.join("api", "v1", "users")
+    users.join("456.json").write('{"id": 456}')
+    os.utime(str(users), (0, 0))
+    third = FixtureDirectory(str(root), cache=cache)
+    assert third.scanned
+    assert "/api/v1/users/456" in third.files
+
+
+def test_requests_fixtures(testdir):
+    _tree(testdir.tmpdir.mkdir("fixtures"))
+    testdir.makepyfile(
+        """
+        import requests
+        from pytest_requests.response import good
+
+        def test_users(requests_fixtures):
+            requests_fixtures.get("/api/v1/users/1").returns = good({"id": 1})
+            response = requests.get("https://test.api/api/v1/users/123")
+            assert response.json() == {"id": 123}
+            assert requests.get("https://test.api/api/v1/users/1").json() == {"id": 1}
+    """
+    )
+    result = testdir.runpytest()
+    result.assert_outcomes(passed=1)
+    cached = testdir.tmpdir.join(".pytest_cache", "v", "pytest_requests")
+    assert cached.check(dir=True)
+    result = testdir.runpytest("-p", "no:cacheprovider")
+    result.assert_outcomes(passed=1)
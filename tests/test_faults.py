@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pytest_requests.faults import FaultPolicy
+from pytest_requests.response import good
+from pytest_requests.router import router
+
+
+def _outcomes(seed, calls=500):
+    outcomes = []
+    with router() as mocked:
+        route = mocked.get("/api/test")
+        route.returns = good("hello" * 10)
+        route.faults = (
+            FaultPolicy(seed=seed)
+            .connection_error(0.1)
+            .read_timeout(0.1)
+            .truncated_body(0.1)
+            .server_error(0.1, burst=3)
+        )
+        for _ in range(calls):
+            try:
+                response = requests.get("https://test.api/api/test", timeout=5)
+                outcomes.append(response.status_code)
+            except requests.exceptions.RequestException as error:
+                outcomes.append(type(error).__name__)
+    return outcomes, route
+
+
+def test_faults_are_reproducible():
+    first, route = _outcomes(seed=1)
+    second, _ = _outcomes(seed=1)
+    other, _ = _outcomes(seed=2)
+    assert first == second
+    assert first != other
+    assert set(first) == {
+        200,
+        503,
+        "ConnectionError",
+        "ReadTimeout",
+        "ChunkedEncodingError",
+    }
+    injected = route.faults.injected
+    assert first.count("ConnectionError") == injected["connection_error"]
+    assert first.count("ReadTimeout") == injected["read_timeout"]
+    assert first.count("ChunkedEncodingError") == injected["truncated_body"]
+    assert first.count(503) == injected["server_error"]
+    assert route.call_count == 500
+    assert route.clock.now() == 5 * injected["read_timeout"]
+
+
+def test_server_error_bursts():
+    outcomes, _ = _outcomes(seed=3)
+    errors = "".join("x" if outcome == 503 else "." for outcome in outcomes)
+    assert "xxx" in errors
+    assert all(len(run) % 3 == 0 for run in errors.split(".") if run)
+
+
+def test_retry_amplification(requests_mock):
+    with requests_mock.router() as mocked:
+        route = mocked.get("/api/items/{id}")
+        route.returns = good("item")
+        route.faults = FaultPolicy(seed=4).server_error(0.3).connection_error(0.2)
+        retry = Retry(total=10, status_forcelist=[503], backoff_factor=0.5)
+        with requests.Session() as session:
+            session.mount("https://", HTTPAdapter(max_retries=retry))
+            for i in range(100):
+                response = session.get("https://test.api/api/items/{0}".format(i))
+                assert response.text == "item"
+        faults = route.faults
+        assert faults.requests == 100
+        assert faults.attempts == route.call_count
+        assert faults.attempts == 100 + sum(faults.injected.values())
+        assert sum(faults.retries().values()) == faults.attempts - 100
+        assert 1.5 < faults.amplification() < 2.5
+        # backing off happens on the virtual clock
+        assert mocked.clock.now() > 0
+
+
+def test_retries_exhausted(requests_mock):
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = good("hello")
+        patch.faults = FaultPolicy().server_error(1.0, retry_after=2)
+        with requests.Session() as session:
+            retry = Retry(total=3, status_forcelist=[503])
+            session.mount("https://", HTTPAdapter(max_retries=retry))
+            with pytest.raises(requests.exceptions.RetryError):
+                session.get("https://test.api/api/test")
+        assert patch.call_count == 4
+        assert patch.clock.now() == 6
+        patch.faults = FaultPolicy().connection_error(1.0)
+        with requests.Session() as session:
+            session.mount("https://", patch(max_retries=2))
+            with pytest.raises(requests.exceptions.ConnectionError):
+                session.get("https://test.api/api/test")
+        assert patch.faults.attempts == 3
+
+
+def test_fault_probabilities_are_checked():
+    with pytest.raises(ValueError):
+        FaultPolicy().connection_error(0.6).read_timeout(0.6)
+    with pytest.raises(ValueError):
+        FaultPolicy().server_error(0.1, burst=0)
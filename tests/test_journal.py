@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import pytest
+import sys
+import threading
+import tracemalloc
+import requests
+from pytest_requests.journal import CallJournal, Generation
+from pytest_requests.response import good
+from pytest_requests.router import RequestsRouterAdapter
+
+
+def _request(method="GET", path="/api/test", headers=None, body=None):
+    url = "https://test.api" + path
+    return requests.Request(method, url, headers=headers, data=body).prepare()
+
+
+def test_journal_reset_by_generation():
+    generation = Generation()
+    one, two = CallJournal(generation), CallJournal(generation)
+    one.record(_request(path="/a"))
+    two.record(_request(path="/b"))
+    generation.bump()
+    assert one.count() == two.count() == 0
+    one.record(_request(path="/c"))
+    assert [call.path for call in one.calls()] == ["/c"]
+
+
+def test_route_reset_keeps_the_other_routes():
+    from pytest_requests.faults import FaultPolicy
+
+    router = RequestsRouterAdapter()
+    one, two = router.get("/api/one"), router.get("/api/two")
+    for route in (one, two):
+        route.returns = good("hello")
+        route.faults = FaultPolicy().server_error(0.0)
+    for path in ("/api/one", "/api/two", "/api/two"):
+        router.send(requests.Request("GET", "https://test.api" + path).prepare())
+    one.reset()
+    assert one.call_count == 0
+    assert two.call_count == 2
+    router.send(requests.Request("GET", "https://test.api/api/two").prepare())
+    assert two.faults.attempts == 3
+    router.reset()
+    assert one.call_count == two.call_count == 0
+
+
+def test_journal_attributes_calls_to_threads():
+    journal = CallJournal()
+    journal.record(_request(path="/main"))
+    worker = threading.Thread(target=journal.record, args=(_request(path="/worker"),))
+    worker.start()
+    worker.join()
+    assert journal.last().path == "/worker"
+    assert journal.last(thread=threading.get_ident()).path == "/main"
+    assert journal.counts_by_thread() == {threading.get_ident(): 1, worker.ident: 1}
+
+
+def test_journal_records_are_compact():
+    journal = CallJournal(headers=["X-Order"])
+    record = journal.record(
+        _request(
+            "POST", "/orders?a=1", headers={"X-Order": "1", "X-Other": "2"}, body="abc"
+        )
+    )
+    assert not hasattr(record, "__dict__")
+    assert record.method == "POST"
+    assert record.path == "/orders"
+    assert record.query == "a=1"
+    assert record.headers == {"x-order": "1"}
+    assert record.body_size == 3
+    assert record.body_digest == hashlib.sha1(b"abc").hexdigest()
+
+
+def test_journal_ring_buffer_keeps_counts_exact():
+    journal = CallJournal(capacity=10)
+    for i in range(25):
+        journal.record(_request("POST" if i % 2 else "GET", "/orders"))
+    assert len(journal.calls()) == 10
+    assert journal.count() == 25
+    assert journal.count(method="post", path="/orders") == 12
+    assert journal.count(method="GET") == 13
+    assert [c.sequence for c in journal.calls(method="GET")] == [16, 18, 20, 22, 24]
+
+
+def test_journal_index_by_method_path_and_headers():
+    journal = CallJournal()
+    for i in range(100):
+        journal.record(_request("POST", "/orders", headers={"X-Tenant": str(i % 4)}))
+        journal.record(_request("GET", "/orders"))
+        journal.record(_request("POST", "/users"))
+    assert journal.count(method="POST", path="/orders", headers={"x-tenant": "1"}) == 25
+    assert journal.count(path="/orders") == 200
+    assert journal.count(method="POST") == 200
+
+
+def test_journal_stress():
+    journal = CallJournal()
+    requests_ = [_request(path="/{0}".format(i)) for i in range(20000)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            for _ in pool.map(journal.record, requests_):
+                pass
+    finally:
+        sys.setswitchinterval(interval)
+    calls = journal.calls()
+    assert journal.count() == 20000
+    assert sorted(int(call.path[1:]) for call in calls) == list(range(20000))
+    assert [call.sequence for call in calls] == sorted(set(c.sequence for c in calls))
+    assert sum(journal.counts_by_thread().values()) == 20000
+
+
+def test_adapter_from_thread_pool(requests_mock):
+    def call(user):
+        headers = {"X-User": str(user)}
+        with requests.Session() as session:
+            session.get("https://test.api/api/users", headers=headers)
+        return threading.get_ident(), headers
+
+    with requests_mock.router() as router:
+        route = router.get("/api/users")
+        route.returns = good("users")
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            results = list(pool.map(call, range(1000)))
+        assert route.call_count == 1000
+        users = sorted(int(c.headers["x-user"]) for c in route.journal.calls())
+        assert users == list(range(1000))
+        by_thread = {}
+        for thread, headers in results:
+            by_thread.setdefault(thread, []).append(headers)
+        for thread, sent in by_thread.items():
+            assert len(route.journal.calls(thread=thread)) == len(sent)
+            assert route.was_called_with_headers(sent[-1], thread=thread)
+
+
+def test_router_reset_clears_all_threads():
+    router = RequestsRouterAdapter()
+    route = router.get("/api/test")
+    route.returns = good("hello")
+    request = requests.Request("GET", "https://test.api/api/test").prepare()
+    workers = [threading.Thread(target=router.send, args=(request,)) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert route.call_count == 8
+    router.reset()
+    assert route.call_count == 0
+
+
+def test_journal_drains_streaming_bodies(requests_mock):
+    chunk = b"x" * 65536
+    produced = []
+
+    def upload():
+        for i in range(256):
+            produced.append(i)
+            yield chunk
+
+    with requests_mock.patch("/api/upload") as patch:
+        patch.returns = good("stored")
+        tracemalloc.start()
+        try:
+            requests.post("https://test.api/api/upload", data=upload())
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        record = patch.journal.last()
+    assert len(produced) == 256
+    assert peak < 2 * 1024 * 1024
+    assert record.streamed
+    assert record.body_size == 256 * 65536
+    assert record.body_digest == hashlib.sha1(chunk * 256).hexdigest()
+    assert record.body is None
+    assert record.body_prefix == b"x" * CallJournal.body_limit
+    assert record.open_body() is None
+
+
+def test_journal_spills_streaming_bodies():
+    journal = CallJournal(body_limit=4, spill=True)
+    small = journal.record(_request("POST", body=iter([b"ab", "c", b""])))
+    large = journal.record(_request("POST", body=io.BytesIO(b"abcdefgh")))
+    assert small.body == b"abc"
+    assert small.body_prefix == b"abc"
+    assert large.body is None
+    assert large.body_prefix == b"abcd"
+    assert large.body_size == 8
+    assert large.open_body().read() == b"abcdefgh"
+    assert large.body_digest == hashlib.sha1(b"abcdefgh").hexdigest()
+    assert not journal.record(_request("POST", body=b"abcdefgh")).streamed
+
+
+def test_journal_spills_more_bodies_than_file_descriptors():
+    resource = pytest.importorskip("resource")
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (256, hard))
+    try:
+        journal = CallJournal(body_limit=4, spill=True)
+        records = [
+            journal.record(_request("POST", body=io.BytesIO(b"body %d" % i)))
+            for i in range(1000)
+        ]
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert records[0].open_body().read() == b"body 0"
+    assert records[-1].open_body().read() == b"body 999"
+    journal.reset()
+    assert records[-1].open_body() is None
+
+
+def test_journal_closes_spill_files_of_evicted_bodies(monkeypatch):
+    from pytest_requests import journal as module
+
+    monkeypatch.setattr(module._SpillFile, "max_size", 8)
+    journal = CallJournal(capacity=2, body_limit=4, spill=True)
+    records = [
+        journal.record(_request("POST", body=io.BytesIO(b"abcdefgh")))
+        for _ in range(10)
+    ]
+    assert [record.open_body() is None for record in records].count(False) == 2
+    assert records[-2].open_body().read() == b"abcdefgh"
+    assert len(journal._live_shards()[0].spills) == 2
+
+
+def test_journal_options_of_patches_and_routes(requests_mock):
+    with requests_mock.patch("/api/test", capacity=2, headers=["X-Id"]) as patch:
+        patch.returns = good("hello")
+        for i in range(3):
+            requests.get("https://test.api/api/test", headers={"X-Id": str(i)})
+        assert patch.call_count == 3
+        assert [call.headers for call in patch.journal.calls()] == [
+            {"x-id": "1"},
+            {"x-id": "2"},
+        ]
+    router = RequestsRouterAdapter()
+    route = router.post("/api/upload", body_limit=2, spill=True)
+    assert route.journal.body_limit == 2
+    assert route.journal.spill
+    assert router.add("GET", "/api/test").journal.spill is False
+
+
+def test_journal_drops_shards_of_earlier_generations():
+    journal = CallJournal()
+    for _ in range(50):
+        worker = threading.Thread(
+            target=lambda: [journal.record(_request()) for _ in range(100)]
+        )
+        worker.start()
+        worker.join()
+        journal.reset()
+    assert journal._shards == []
+    journal.record(_request())
+    generation = journal.shared
+    generation.bump()
+    assert journal.count() == 0
+    assert journal._shards == []
+    journal.record(_request())
+    assert journal.count() == 1
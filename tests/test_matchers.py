@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import re
+import time
+import pytest
+import requests
+from pytest_requests.journal import CallJournal
+from pytest_requests.matchers import (
+    RequestView,
+    body_regex,
+    header,
+    json_path,
+    json_subset,
+    matches,
+    query,
+)
+
+
+def _request(path="/api/test", headers=None, body=None, json=None):
+    url = "https://test.api" + path
+    return requests.Request(
+        "POST", url, headers=headers, data=body, json=json
+    ).prepare()
+
+
+def test_header_matchers():
+    view = RequestView(_request(headers={"X-Tenant": "acme", "X-Version": "12"}))
+    assert header("x-tenant", "acme")(view)
+    assert not header("X-Tenant", "other")(view)
+    assert header("X-Version", re.compile(r"^\d+$"))(view)
+    assert header("X-Version", lambda value: int(value) > 10)(view)
+    assert header("X-Missing", None)(view)
+    assert not header("X-Tenant", None)(view)
+
+
+def test_query_subset():
+    view = RequestView(_request("/api/users?page=2&tag=a&tag=b&q=hello%20world"))
+    assert query({"page": "2"})(view)
+    assert query({"tag": "b", "q": "hello world"})(view)
+    assert not query({"page": "3"})(view)
+    assert not query({"limit": "10"})(view)
+    assert query({"page": re.compile(r"\d")})(view)
+
+
+def test_json_matchers():
+    view = RequestView(
+        _request(json={"user": {"name": "ada", "roles": ["admin"]}, "items": [1, 2]})
+    )
+    assert json_subset({"user": {"name": "ada"}})(view)
+    assert json_subset({"items": [1, lambda item: item > 1]})(view)
+    assert not json_subset({"items": [1]})(view)
+    assert not json_subset({"user": {"email": "ada@test.api"}})(view)
+    assert json_path("user.roles.0", "admin")(view)
+    assert not json_path("user.roles.1", "admin")(view)
+    assert not json_path("user.name.first", "ada")(view)
+    assert not json_subset({"a": 1})(RequestView(_request(body="not json")))
+
+
+def test_body_regex_and_retained_bodies():
+    journal = CallJournal(body_limit=10)
+    journal.record(_request(body="small body"))
+    journal.record(_request(body="a much larger body"))
+    assert journal.count(match=body_regex("body")) == 1
+    assert journal.count(match=body_regex(b"^small")) == 1
+    assert journal.count(match=body_regex(re.compile("SMALL", re.I))) == 1
+    assert journal.count(match=body_regex("^BODY", re.I | re.M)) == 0
+
+
+def test_json_matchers_and_truncated_bodies():
+    document = {"id": 1, "padding": "x" * 100}
+    journal = CallJournal(body_limit=10)
+    journal.record(_request(json=document))
+    with pytest.raises(ValueError, match="body_limit"):
+        journal.count(match=json_path("id", 1))
+    journal.record(_request(json={"id": 2}))
+    assert journal.last().json() == {"id": 2}
+
+    spilled = CallJournal(body_limit=10, spill=True)
+    body = json.dumps(document).encode("utf-8")
+    spilled.record(_request(body=io.BytesIO(body)))
+    assert spilled.last().truncated is False
+    assert spilled.count(match=json_path("id", 1)) == 1
+    assert spilled.count(match=json_subset({"padding": re.compile("^x+$")})) == 1
+
+
+def test_route_selection(requests_mock):
+    with requests_mock.router() as router:
+        router.post("/api/orders").returns = requests_mock.good("fallback")
+        router.post("/api/orders", match=matches(json={"priority": "high"})).returns = (
+            requests_mock.good("express")
+        )
+        router.post(
+            "/api/orders", match=matches(headers={"X-Tenant": "acme"})
+        ).returns = requests_mock.good("acme")
+        router.get(
+            "/api/users/{id}", match=matches(query={"expand": "true"})
+        ).returns = requests_mock.good("expanded")
+        router.get("/api/users/{id}").returns = requests_mock.good("plain")
+
+        url = "https://test.api/api/orders"
+        assert requests.post(url, json={"priority": "high"}).text == "express"
+        assert requests.post(url, headers={"X-Tenant": "acme"}).text == "acme"
+        assert requests.post(url, json={"priority": "low"}).text == "fallback"
+        assert requests.get("https://test.api/api/users/1?expand=true").text == (
+            "expanded"
+        )
+        assert requests.get("https://test.api/api/users/1").text == "plain"
+
+
+def test_assertions_over_recorded_calls(requests_mock):
+    with requests_mock.patch("/api/orders") as patch:
+        patch.returns = requests_mock.good("ok")
+        for i in range(5):
+            requests.post(
+                "https://test.api/api/orders?page={0}".format(i),
+                json={"id": i},
+                headers={"X-Tenant": "acme"},
+            )
+        assert patch.was_called_with(
+            matches(headers={"X-Tenant": "acme"}, query={"page": "3"}, json={"id": 3})
+        )
+        assert patch.journal.count(match=json_path("id", lambda i: i > 2)) == 2
+        with pytest.raises(AssertionError):
+            patch.was_called_with(matches(query={"page": "9"}))
+
+
+class _Sent(object):
+    """The parts of a sent request a journal records"""
+
+    def __init__(self, url, headers):
+        self.method = "GET"
+        self.url = url
+        self.headers = headers
+        self.body = None
+
+
+def test_matching_100k_records():
+    journal = CallJournal(capacity=100000)
+    for i in range(100000):
+        journal.record(
+            _Sent(
+                "https://test.api/api/items?page={0}&size=10".format(i),
+                {"X-Tenant": "acme" if i % 2 else "other"},
+            )
+        )
+    records = journal.calls()
+    tenant = header("X-Tenant", "acme")
+    page = query({"page": "42"})
+
+    started = time.time()
+    assert len(tenant.filter(records)) == 50000
+    assert len(page.filter(records)) == 1
+    elapsed = time.time() - started
+    assert elapsed < 0.1
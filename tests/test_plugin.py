@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+
+
+def _import_times(statement):
+    output = subprocess.check_output(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.STDOUT,
+    ).decode()
+    times = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_plugin_import_is_cheap():
+    """Loading the plugin must not import requests or mock"""
+    times = _import_times("import pytest; import pytest_requests.plugin")
+    assert "pytest_requests.plugin" in times
+    for heavy in ("requests", "mock", "urllib3", "pytest_requests.patch"):
+        assert heavy not in times
+    assert times["pytest_requests.plugin"] < 50000
+
+
+def test_requests_imported_on_first_use(testdir):
+    testdir.makepyfile("""
+        import sys
+
+        def test_not_imported():
+            assert 'requests' not in sys.modules
+
+        def test_imported(requests_mock):
+            assert 'requests' in sys.modules
+    """)
+    result = testdir.runpytest_subprocess("-v", "-p", "no:cacheprovider")
+    result.stdout.fnmatch_lines(
+        ["*::test_not_imported PASSED*", "*::test_imported PASSED*"]
+    )
+    assert result.ret == 0
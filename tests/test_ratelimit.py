@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pytest_requests.ratelimit import RateLimit, host
+from pytest_requests.response import good
+
+
+def test_rate_limit_headers(requests_mock):
+    with requests_mock.router() as router:
+        route = router.get("/api/test")
+        route.returns = good("hello")
+        route.limit = RateLimit(2, burst=2)
+        first = requests.get("https://test.api/api/test")
+        second = requests.get("https://test.api/api/test")
+        third = requests.get("https://test.api/api/test")
+        assert [first.status_code, second.status_code, third.status_code] == [
+            200,
+            200,
+            429,
+        ]
+        assert first.headers["X-RateLimit-Limit"] == "2"
+        assert first.headers["X-RateLimit-Remaining"] == "1"
+        assert second.headers["X-RateLimit-Remaining"] == "0"
+        assert second.headers["X-RateLimit-Reset"] == "1"
+        assert third.headers["Retry-After"] == "1"
+        assert "Retry-After" not in second.headers
+        assert route.call_count == 3
+
+        router.clock.advance(0.5)
+        assert requests.get("https://test.api/api/test").status_code == 200
+        assert route.limit.allowed == 3
+        assert route.limit.limited == 1
+
+
+def test_rate_limit_per_host(requests_mock):
+    with requests_mock.router() as router:
+        router.get("/api/test").returns = good("hello")
+        router.limit = RateLimit(60, period=60, key=host)
+        statuses = [
+            requests.get("https://{0}/api/test".format(name)).status_code
+            for name in ("one.api", "two.api") * 61
+        ]
+        assert statuses.count(429) == 2
+        assert set(router.limit.stats()) == {"one.api", "two.api"}
+        assert router.limit.stats()["one.api"]["limited"] == 1
+
+
+def test_retrying_client_uses_its_quota(requests_mock):
+    with requests_mock.router() as router:
+        route = router.get("/api/items/{id}")
+        route.returns = good("item")
+        route.limit = RateLimit(5, burst=5)
+        retry = Retry(total=100)
+        with requests.Session() as session:
+            session.mount("https://", HTTPAdapter(max_retries=retry))
+            for i in range(50):
+                response = session.get("https://test.api/api/items/{0}".format(i))
+                assert response.status_code == 200
+        limit = route.limit
+        assert limit.allowed == 50
+        # the burst, then the rest as the tokens come back: Retry-After
+        # is rounded up to whole seconds, which only costs a little quota
+        assert limit.throughput() == pytest.approx(limit.rate, rel=0.15)
+        assert 0.9 <= limit.utilization() <= 1.0
+        assert router.clock.now() == pytest.approx(9, abs=1)
+
+
+def test_hammering_client_is_limited(requests_mock):
+    with requests_mock.router() as router:
+        route = router.get("/api/test")
+        route.returns = good("hello")
+        route.limit = RateLimit(10)
+        for _ in range(100):
+            requests.get("https://test.api/api/test")
+            router.clock.advance(0.01)
+        limit = route.limit
+        assert limit.limited > limit.allowed
+        # the burst, then one call each time a token comes back
+        assert limit.allowed == 19
+        assert limit.utilization() == pytest.approx(1, abs=0.05)
+
+
+def test_rate_limit_arguments():
+    with pytest.raises(ValueError):
+        RateLimit(0)
+    with pytest.raises(KeyError):
+        RateLimit(1).utilization()
+
+
+def test_shared_router_reset_restarts_limits_and_faults():
+    from pytest_requests.faults import FaultPolicy
+    from pytest_requests.router import router
+
+    with router() as mocked:
+        route = mocked.get("/api/test")
+        route.returns = good("hello")
+        route.limit = RateLimit(1)
+        route.faults = FaultPolicy().server_error(0.0)
+        for _ in range(2):
+            mocked.clock.advance(10)
+            statuses = [
+                requests.get("https://test.api/api/test").status_code
+                for _ in range(2)
+            ]
+            assert statuses == [200, 429]
+            assert route.limit.allowed == route.limit.limited == 1
+            assert route.faults.attempts == 1
+            assert mocked.clock.now() == 10
+            mocked.reset()
+        assert mocked.clock.now() == 0
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import requests
+from pytest_requests.responder import (
+    Responder,
+    ResponseSequence,
+    fingerprint,
+    memoize,
+)
+from pytest_requests.response import good
+
+
+def test_callable_responder(requests_mock):
+    with requests_mock.router() as router:
+        route = router.get("/api/users/{id}")
+        route.returns = lambda request, id: good({"id": id, "url": request.url})
+        response = requests.get("https://test.api/api/users/42?x=1")
+        assert response.json() == {
+            "id": "42",
+            "url": "https://test.api/api/users/42?x=1",
+        }
+
+
+def test_callable_responder_must_return_response(requests_mock):
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = Responder(lambda request: "hello")
+        with pytest.raises(TypeError):
+            requests.get("https://test.api/api/test")
+    with pytest.raises(TypeError):
+        patch.returns = "hello"
+
+
+def test_memoized_responder(requests_mock):
+    rendered = []
+
+    @memoize(maxsize=2, key=fingerprint(query=["page"], headers=["X-Tenant"]))
+    def render(request, id):
+        rendered.append(id)
+        return good("user {0}".format(id))
+
+    with requests_mock.router() as router:
+        router.get("/api/users/{id}").returns = render
+        for url in (
+            "https://test.api/api/users/1?page=1&ts=1",
+            "https://test.api/api/users/1?page=1&ts=2",
+            "https://test.api/api/users/2?page=1",
+            "https://test.api/api/users/1?page=2",
+            "https://test.api/api/users/1?page=1",
+        ):
+            assert requests.get(url).text.startswith("user")
+        assert (
+            requests.get(
+                "https://test.api/api/users/2?page=1", headers={"X-Tenant": "a"}
+            ).text
+            == "user 2"
+        )
+    assert rendered == ["1", "2", "1", "1", "2"]
+    assert render.stats() == {
+        "hits": 1,
+        "misses": 5,
+        "evictions": 3,
+        "currsize": 2,
+        "maxsize": 2,
+    }
+    render.cache_clear()
+    assert render.stats()["currsize"] == 0
+
+
+def test_fingerprint_body_hash():
+    key = fingerprint(query=False)
+    one = requests.Request("POST", "https://test.api/a?x=1", data="one").prepare()
+    two = requests.Request("POST", "https://test.api/a?x=2", data="two").prepare()
+    same = requests.Request("POST", "https://test.api/a?x=3", data="one").prepare()
+    assert key(one) != key(two)
+    assert key(one) == key(same)
+
+
+def test_response_sequence_pages(requests_mock):
+    with requests_mock.patch("/api/items") as patch:
+        patch.returns = [good({"page": 1}), good({"page": 2}), good([], 404)]
+        pages = []
+        while True:
+            response = requests.get("https://test.api/api/items")
+            if response.status_code == 404:
+                break
+            pages.append(response.json()["page"])
+        assert pages == [1, 2]
+        assert [call.served for call in patch.journal.calls()] == [0, 1, 2]
+        with pytest.raises(AssertionError, match="exhausted after 3 calls"):
+            requests.get("https://test.api/api/items")
+
+
+def test_response_sequence_repeat_last(requests_mock):
+    with requests_mock.patch("/api/job") as patch:
+        patch.returns = ResponseSequence(
+            [good({"state": "pending"}), good({"state": "done"})], repeat_last=True
+        )
+        states = [
+            requests.get("https://test.api/api/job").json()["state"] for _ in range(4)
+        ]
+        assert states == ["pending", "done", "done", "done"]
+        assert [call.served for call in patch.journal.calls()] == [0, 1, 1, 1]
+
+
+def test_response_sequence_cycle():
+    def pages():
+        for page in range(3):
+            yield good({"page": page})
+
+    for responses in (pages, pages()):
+        sequence = ResponseSequence(responses, cycle=True)
+        served = [sequence.advance() for _ in range(7)]
+        assert [index for index, _ in served] == [0, 1, 2, 0, 1, 2, 0]
+        assert [response.body["page"] for _, response in served] == [
+            0,
+            1,
+            2,
+            0,
+            1,
+            2,
+            0,
+        ]
+    with pytest.raises(ValueError):
+        ResponseSequence([], cycle=True, repeat_last=True)
+    with pytest.raises(AssertionError, match="empty"):
+        ResponseSequence([], cycle=True).advance()
+
+
+def test_response_sequence_is_lazy(requests_mock):
+    produced = []
+
+    def pages():
+        for page in range(1000000):
+            produced.append(page)
+            yield good({"page": page})
+
+    with requests_mock.patch("/api/items") as patch:
+        patch.returns = pages()
+        for page in range(3):
+            assert requests.get("https://test.api/api/items").json() == {"page": page}
+    assert produced == [0, 1, 2]
+
+
+def test_response_sequence_must_hold_responses(requests_mock):
+    with requests_mock.patch("/api/items") as patch:
+        patch.returns = ["hello"]
+        with pytest.raises(TypeError):
+            requests.get("https://test.api/api/items")
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import timeit
+import tracemalloc
+import zlib
+import pytest
+import requests
+import urllib3.response
+from pytest_requests.response import good, set_json_encoder
+
+
+def _request():
+    return requests.Request("GET", "https://test.api/api/test").prepare()
+
+
+def test_body_is_encoded_lazily(monkeypatch):
+    calls = []
+    dumps = json.dumps
+    monkeypatch.setattr(json, "dumps", lambda obj: calls.append(obj) or dumps(obj))
+    response = good({"a": "b"})
+    assert calls == []
+    assert response.to_response(_request()).json() == {"a": "b"}
+    response.to_response(_request())
+    assert len(calls) == 1
+
+
+def test_content_is_reused_across_sends():
+    response = good("hello")
+    first = response.to_response(_request())
+    second = response.to_response(_request())
+    assert first.content is second.content
+    assert first.raw.read() == b"hello"
+    assert second.raw.read() == b"hello"
+
+
+def test_body_change_resets_content():
+    response = good("hello")
+    assert response.content == b"hello"
+    response.body = "goodbye"
+    assert response.to_response(_request()).text == "goodbye"
+
+
+def test_send_cost_does_not_depend_on_body_size():
+    request = _request()
+    small = good(b"x" * 1024)
+    large = good(b"x" * 16 * 1024 * 1024)
+    timings = []
+    for response in (small, large):
+        response.to_response(request)
+        timings.append(
+            min(
+                timeit.repeat(
+                    lambda: response.to_response(request).raw.read(1),
+                    number=200,
+                    repeat=5,
+                )
+            )
+        )
+    assert timings[1] < timings[0] * 3
+
+
+def test_streaming_generator_body(requests_mock):
+    def chunks():
+        for i in range(3):
+            yield "chunk{0}".format(i)
+
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = requests_mock.good(chunks)
+        response = requests.get("https://test.api/api/test", stream=True)
+        assert response._content is False
+        assert list(response.iter_content(6)) == [b"chunk0", b"chunk1", b"chunk2"]
+        assert requests.get("https://test.api/api/test").text == "chunk0chunk1chunk2"
+
+
+def test_iterator_body_is_served_once(requests_mock):
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = requests_mock.good(iter(["a", "b", "c"]))
+        assert requests.get("https://test.api/api/test").text == "abc"
+        with pytest.raises(AssertionError, match="already served"):
+            requests.get("https://test.api/api/test")
+
+
+def test_streaming_file_bodies(requests_mock, tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes(b"a,b\n1,2\n")
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = requests_mock.good(path)
+        response = requests.get("https://test.api/api/test", stream=True)
+        assert list(response.iter_lines()) == [b"a,b", b"1,2"]
+        with path.open("rb") as fh:
+            patch.returns = requests_mock.good(fh)
+            for _ in range(2):
+                response = requests.get("https://test.api/api/test", stream=True)
+                assert response.content == b"a,b\n1,2\n"
+
+
+def test_streaming_memory_is_bounded(requests_mock):
+    chunk_size = 64 * 1024
+    chunks = 4096
+
+    def payload():
+        for i in range(chunks):
+            yield bytes(bytearray([i % 256])) * chunk_size
+
+    with requests_mock.patch("/api/test") as patch:
+        patch.returns = requests_mock.good(payload)
+        tracemalloc.start()
+        try:
+            response = requests.get("https://test.api/api/test", stream=True)
+            total = sum(len(c) for c in response.iter_content(chunk_size))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    assert total == chunk_size * chunks
+    assert peak < 16 * chunk_size
+
+
+def test_json_compatible_bodies():
+    assert good([1, {"a": None}]).to_response(_request()).json() == [1, {"a": None}]
+    assert good((1, 2)).to_response(_request()).json() == [1, 2]
+    assert good(3.5).content == b"3.5"
+    assert good(True).content == b"true"
+
+
+def test_json_encoder_hook():
+    encoded = []
+
+    def encoder(obj):
+        encoded.append(obj)
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    set_json_encoder(encoder)
+    try:
+        assert good({"a": [1, 2]}).content == b'{"a":[1,2]}'
+    finally:
+        set_json_encoder(None)
+    assert encoded == [{"a": [1, 2]}]
+    response = good({"a": [1, 2]})
+    response.json_encoder = lambda obj: "custom"
+    assert response.content == b"custom"
+
+
+def test_parsed_json_copy(monkeypatch):
+    body = {"items": [{"id": i} for i in range(10)]}
+    response = good(body).as_json().parsed_json("copy")
+    monkeypatch.setattr(requests.models.complexjson, "loads", None)
+    parsed = response.to_response(_request()).json()
+    assert parsed == body
+    parsed["items"].append({"id": 10})
+    assert len(body["items"]) == 10
+    assert response.to_response(_request()).json() == body
+
+
+def test_parsed_json_is_faster_than_parsing():
+    body = {"items": [{"id": i, "tags": ["a", "b"]} for i in range(1000)]}
+    parsed = good(body).as_json().parsed_json()
+    plain = good(body).as_json()
+    request = _request()
+    assert parsed.to_response(request).json() is parsed.to_response(request).json()
+
+    def served(response):
+        return lambda: response.to_response(request).json()
+
+    parsed_time = min(timeit.repeat(served(parsed), number=50, repeat=3))
+    plain_time = min(timeit.repeat(served(plain), number=50, repeat=3))
+    assert parsed_time * 5 < plain_time
+
+
+def test_parsed_json_frozen():
+    body = {"items": [{"id": i} for i in range(10)]}
+    response = good(body).parsed_json("frozen")
+    first = response.to_response(_request()).json()
+    assert first == body
+    assert isinstance(first, dict)
+    assert response.to_response(_request()).json() is first
+    with pytest.raises(TypeError):
+        first["items"][0]["id"] = 1
+    with pytest.raises(TypeError):
+        first["items"].append(1)
+    with pytest.raises(ValueError):
+        response.parsed_json("deep")
+
+
+def test_default_headers_are_not_shared():
+    one, two = good("one"), good("two")
+    one.as_json()
+    assert two.headers == {}
+    served = two.to_response(_request())
+    served.headers["X-Added"] = "1"
+    assert two.headers == {}
+
+
+def test_frozen_template():
+    template = good({"items": [1, 2]}, headers={"X-Special": "value"}).freeze()
+    assert template.is_frozen
+    with pytest.raises(AttributeError):
+        template.status_code = 404
+    with pytest.raises(AttributeError):
+        template.body = "other"
+    with pytest.raises(TypeError):
+        template.headers["X-Other"] = "value"
+    with pytest.raises(TypeError):
+        template.body["items"].append(3)
+    served = template.to_response(_request())
+    assert served.headers["x-special"] == "value"
+    assert served.json() == {"items": [1, 2]}
+
+
+def test_derived_templates_share_unchanged_parts():
+    template = good({"items": list(range(1000))}).freeze()
+    content = template.content
+    missing = template.with_status(404)
+    typed = template.as_json()
+    assert missing.status_code == 404 and template.status_code == 200
+    assert missing.content is content
+    assert typed.content is content
+    assert missing.headers is template.headers
+    assert typed.headers == {"Content-Type": "application/json"}
+    assert template.headers == {}
+    assert typed.with_headers({"Content-Type": None}).headers == {}
+    other = template.with_body("other")
+    assert other.content == b"other"
+    assert other.headers is template.headers
+    assert template.content is content
+
+
+def test_template_served_from_many_threads():
+    template = good({"id": 1}).as_json().freeze()
+    variants = [template.with_status(200 + i) for i in range(8)]
+
+    def serve(i):
+        response = variants[i % 8].to_response(_request())
+        return response.status_code, response.json()
+
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(serve, range(2000)))
+    assert results == [(200 + i % 8, {"id": 1}) for i in range(2000)]
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "deflate"])
+def test_compressed_body_is_decoded_by_urllib3(monkeypatch, encoding):
+    decoded = []
+    decoder = {
+        "gzip": urllib3.response.GzipDecoder,
+        "deflate": urllib3.response.DeflateDecoder,
+    }[encoding]
+    decompress = decoder.decompress
+    monkeypatch.setattr(
+        decoder,
+        "decompress",
+        lambda self, data, **kwargs: decoded.append(len(data))
+        or decompress(self, data, **kwargs),
+    )
+    body = {"items": list(range(10000))}
+    template = good(body).as_json().freeze().as_encoded(encoding)
+    response = template.to_response(_request())
+    assert response.headers["Content-Encoding"] == encoding
+    assert response.headers["Content-Length"] == str(len(template.compressed_content()))
+    assert response.json() == body
+    assert sum(decoded) == len(template.compressed_content())
+
+
+def test_compressed_body_is_cached(monkeypatch):
+    calls = []
+    compressobj = zlib.compressobj
+    monkeypatch.setattr(
+        zlib, "compressobj", lambda *args: calls.append(args) or compressobj(*args)
+    )
+    template = good("x" * 100000).freeze()
+    gzipped = template.as_encoded("gzip")
+    chunked = gzipped.with_headers({"X-Variant": "chunked"}).as_encoded(
+        "gzip", chunked=True
+    )
+    for response in (gzipped, chunked, gzipped):
+        assert response.to_response(_request()).text == "x" * 100000
+    assert len(calls) == 1
+    served = chunked.to_response(_request())
+    assert served.headers["Transfer-Encoding"] == "chunked"
+    assert "Content-Length" not in served.headers
+    with pytest.raises(ValueError):
+        template.as_encoded("br")
+
+
+def test_chunked_identity_body():
+    response = good("x" * 1000).as_encoded(None, chunked=True)
+    served = response.to_response(_request())
+    assert served.headers["Transfer-Encoding"] == "chunked"
+    assert "Content-Length" not in served.headers
+    assert "Content-Encoding" not in served.headers
+    assert served.text == "x" * 1000
+    streamed = good(lambda: iter([b"ab", b"cd"])).as_encoded(None, chunked=True)
+    served = streamed.to_response(_request(), stream=True)
+    assert b"".join(served.iter_content(1)) == b"abcd"
+
+
+def test_compressed_streaming_body():
+    response = good(lambda: iter([b"abc" * 1000, b"def" * 1000])).as_encoded()
+    served = response.to_response(_request(), stream=True)
+    assert served.headers["Transfer-Encoding"] == "chunked"
+    assert b"".join(served.iter_content(100)) == b"abc" * 1000 + b"def" * 1000
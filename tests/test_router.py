@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import re
+import timeit
+import pytest
+import requests
+from pytest_requests.benchmark import pattern_router
+from pytest_requests.router import RequestsRouterAdapter
+
+
+def test_router_exact_routes(requests_mock):
+    with requests_mock.router() as router:
+        router.get("/api/users").returns = requests_mock.good("users")
+        router.post("/api/users").returns = requests_mock.good("created", 201)
+        assert requests.get("https://test.api/api/users").text == "users"
+        response = requests.post("https://test.api/api/users")
+        assert response.status_code == 201
+        assert response.text == "created"
+
+
+def test_router_templated_routes(requests_mock):
+    with requests_mock.router() as router:
+        user = router.get("/api/users/{id}")
+        user.returns = requests_mock.good("user")
+        me = router.get("/api/users/me")
+        me.returns = requests_mock.good("me")
+        assert requests.get("https://test.api/api/users/123").text == "user"
+        assert requests.get("https://test.api/api/users/me").text == "me"
+        assert user.was_called_once()
+        assert me.was_called_once()
+
+
+def test_router_match_params():
+    router = RequestsRouterAdapter()
+    posts = router.get("/users/{user}/posts/{post}")
+    route, params = router.match("get", "https://test.api/users/1/posts/2")
+    assert route is posts
+    assert params == {"user": "1", "post": "2"}
+
+
+def test_router_host_and_method():
+    router = RequestsRouterAdapter()
+    one = router.add("GET", "/api", host="one.api")
+    anywhere = router.add(None, "/api")
+    assert router.match("GET", "https://one.api/api")[0] is one
+    assert router.match("GET", "https://two.api/api")[0] is anywhere
+    assert router.match("DELETE", "https://one.api/api")[0] is anywhere
+    assert router.match("GET", "https://one.api/other") is None
+
+
+def test_router_unmatched(requests_mock):
+    with requests_mock.router() as router:
+        router.get("/api/test").returns = requests_mock.good("hello")
+        with pytest.raises(AssertionError):
+            requests.get("https://test.api/api/other")
+
+
+def _build_router(size):
+    router = RequestsRouterAdapter()
+    for i in range(size // 2):
+        router.get("/api/v1/items/{0}".format(i))
+        router.get("/api/v1/groups/{0}/items/{{id}}".format(i))
+    return router
+
+
+def test_router_dispatch_is_flat():
+    """Dispatch time must not grow with the number of routes"""
+    timings = []
+    for size in (10, 100000):
+        router = _build_router(size)
+        exact = "https://test.api/api/v1/items/{0}".format(size // 2 - 1)
+        templated = "https://test.api/api/v1/groups/{0}/items/7".format(size // 4)
+        assert router.match("GET", exact) is not None
+        assert router.match("GET", templated) is not None
+        timings.append(
+            min(
+                timeit.repeat(
+                    lambda: (
+                        router.match("GET", exact),
+                        router.match("GET", templated),
+                    ),
+                    number=2000,
+                    repeat=5,
+                )
+            )
+        )
+    assert timings[1] < timings[0] * 3
+
+
+def test_router_regex_and_prefix_routes(requests_mock):
+    with requests_mock.router() as router:
+        router.get(re.compile(r"/api/users/(?P<id>\d+)")).returns = (
+            lambda request, id: requests_mock.good("user {0}".format(id))
+        )
+        router.get("/static/*").returns = lambda request, rest: requests_mock.good(rest)
+        assert requests.get("https://test.api/api/users/42").text == "user 42"
+        assert requests.get("https://test.api/static/css/site.css").text == (
+            "css/site.css"
+        )
+        with pytest.raises(AssertionError):
+            requests.get("https://test.api/api/users/me")
+
+
+def test_router_priority():
+    router = RequestsRouterAdapter()
+    prefix = router.get("/api/*")
+    longer = router.get("/api/users/*")
+    first = router.get(re.compile(r"/api/users/(?P<id>\w+)"))
+    second = router.get(re.compile(r"/api/users/(?P<id>\d+)"))
+    template = router.get("/api/users/{id}/posts")
+    exact = router.get("/api/users/me/posts")
+    assert router.match("GET", "https://test.api/api/users/me/posts")[0] is exact
+    assert router.match("GET", "https://test.api/api/users/1/posts") == (
+        template,
+        {"id": "1"},
+    )
+    assert router.match("GET", "https://test.api/api/users/1") == (
+        first,
+        {"id": "1"},
+    )
+    assert second is not first
+    assert router.match("GET", "https://test.api/api/users/1/likes") == (
+        longer,
+        {"rest": "1/likes"},
+    )
+    assert router.match("GET", "https://test.api/api/groups") == (
+        prefix,
+        {"rest": "groups"},
+    )
+
+
+def test_router_regex_without_literal_prefix():
+    router = RequestsRouterAdapter()
+    either = router.get(re.compile(r"/(api|v2)/items"))
+    alternation = router.get(re.compile(r"/old/items|/new/items"))
+    optional = router.get(re.compile(r"/apis?/things"))
+    assert router.match("GET", "https://test.api/v2/items")[0] is either
+    assert router.match("GET", "https://test.api/new/items")[0] is alternation
+    assert router.match("GET", "https://test.api/api/things")[0] is optional
+
+
+def test_patch_prefix_and_regex(requests_mock):
+    with requests_mock.patch(re.compile(r"/api/v\d+/test")) as patch:
+        patch.returns = requests_mock.good("hello")
+        assert requests.get("https://test.api/api/v2/test").text == "hello"
+    with requests_mock.patch("/api/*") as patch:
+        patch.returns = requests_mock.good("hello")
+        assert requests.get("https://test.api/api/anything").text == "hello"
+        with pytest.raises(AssertionError):
+            requests.get("https://test.api/other")
+
+
+def test_pattern_dispatch_is_sub_linear():
+    """Matching regex and prefix routes must not try every route"""
+    timings = []
+    for count in (10, 5000):
+        router, urls = pattern_router(count)
+        for url in urls:
+            assert router.match("GET", url) is not None
+        timings.append(
+            min(
+                timeit.repeat(
+                    lambda: [router.match("GET", url) for url in urls],
+                    number=1000,
+                    repeat=5,
+                )
+            )
+        )
+    assert timings[1] < timings[0] * 3
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import timeit
+from pytest_requests.dispatch import held, install
+from pytest_requests.patch import patch
+from pytest_requests.response import good
+from pytest_requests.router import RequestsRouterAdapter
+
+
+def test_session_router_is_shared_and_reset(testdir):
+    testdir.makepyfile(
+        """
+        import pytest
+        import requests
+        from pytest_requests.response import good
+
+        def test_first(requests_mock_session):
+            route = requests_mock_session.get('/api/test')
+            route.returns = good('hello')
+            assert requests.get('https://test.api/api/test').text == 'hello'
+            assert route.was_called_once()
+
+        def test_second(requests_mock_session):
+            route, _ = requests_mock_session.match('GET', 'https://test.api/api/test')
+            assert requests.get('https://test.api/api/test').text == 'hello'
+            assert route.was_called_once()
+
+        @pytest.mark.requests_mock_keep
+        def test_keep(requests_mock_session):
+            route, _ = requests_mock_session.match('GET', 'https://test.api/api/test')
+            requests.get('https://test.api/api/test')
+            with pytest.raises(AssertionError):
+                route.was_called_once()
+    """
+    )
+    result = testdir.runpytest("-v")
+    result.stdout.fnmatch_lines(
+        ["*::test_first PASSED*", "*::test_second PASSED*", "*::test_keep PASSED*"]
+    )
+    assert result.ret == 0
+
+
+def test_module_router_is_reinstalled_per_module(testdir):
+    testdir.makepyfile(
+        test_one="""
+        import requests
+        from pytest_requests.response import good
+
+        def test_one(requests_mock_module):
+            requests_mock_module.get('/api/one').returns = good('one')
+            assert requests.get('https://test.api/api/one').text == 'one'
+    """,
+        test_two="""
+        import requests.sessions
+
+        def test_two(requests_mock_module):
+            assert requests_mock_module.match('GET', 'https://test.api/api/one') is None
+    """,
+    )
+    result = testdir.runpytest("-v")
+    result.stdout.fnmatch_lines(["*::test_one PASSED*", "*::test_two PASSED*"])
+    assert result.ret == 0
+
+
+def test_reset_is_cheaper_than_patching():
+    """Per-test setup of the shared router against a fresh patch"""
+
+    def function_scoped():
+        with patch("/api/test") as adapter:
+            adapter.returns = good("hello")
+
+    shared = RequestsRouterAdapter()
+    for i in range(10000):
+        shared.get("/api/{0}".format(i)).returns = good("hello")
+
+    def shared_scoped():
+        shared.reset()
+        with install(shared):
+            pass
+
+    function_time = min(timeit.repeat(function_scoped, number=500, repeat=3))
+    with held():
+        shared_time = min(timeit.repeat(shared_scoped, number=500, repeat=3))
+    assert shared_time * 5 < function_time
+
+
+def test_module_and_session_routers_across_modules(testdir):
+    testdir.makepyfile(
+        test_one="""
+        import requests
+
+        def adapter():
+            return requests.Session().get_adapter('https://test.api/')
+
+        def test_module(requests_mock_module):
+            assert adapter() is requests_mock_module
+
+        def test_session(requests_mock_session):
+            assert adapter() is requests_mock_session
+    """,
+        test_two="""
+        import requests
+
+        def adapter():
+            return requests.Session().get_adapter('https://test.api/')
+
+        def test_session(requests_mock_session):
+            assert adapter() is requests_mock_session
+
+        def test_module(requests_mock_module):
+            assert adapter() is requests_mock_module
+
+        def test_unpatched():
+            assert type(adapter()) is requests.adapters.HTTPAdapter
+    """,
+    )
+    result = testdir.runpytest("-v")
+    result.assert_outcomes(passed=5)
+
+
+def test_dispatch_is_patched_once():
+    import requests.sessions
+
+    real = requests.sessions.HTTPAdapter
+    first, second = RequestsRouterAdapter(), RequestsRouterAdapter()
+    with held():
+        dispatcher = requests.sessions.HTTPAdapter
+        assert dispatcher is not real
+        assert type(requests.Session().get_adapter("https://test.api/")) is real
+        with install(first):
+            with install(second):
+                assert requests.Session().get_adapter("https://test.api/") is second
+                assert requests.sessions.HTTPAdapter is dispatcher
+            assert requests.Session().get_adapter("https://test.api/") is first
+    assert requests.sessions.HTTPAdapter is real
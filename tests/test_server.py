@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import subprocess
+import sys
+import time
+import pytest
+import requests
+from pytest_requests.clock import RealClock
+from pytest_requests.faults import FaultPolicy
+from pytest_requests.response import good
+
+
+def test_server_serves_routes(requests_server):
+    requests_server.router.get("/api/test").returns = good(
+        {"a": "b"}, headers={"Content-Type": "application/json"}
+    )
+    requests_server.router.post("/api/items/{id}").returns = good("created", 201)
+    response = requests.get(requests_server.url + "/api/test")
+    assert response.json() == {"a": "b"}
+    assert response.headers["Content-Type"] == "application/json"
+    response = requests.post(requests_server.url + "/api/items/7", data=b"x" * 10)
+    assert response.status_code == 201
+    assert requests.get(requests_server.url + "/api/other").status_code == 404
+    assert requests_server.hits() == {
+        ("GET", "/api/test"): 1,
+        ("POST", "/api/items/{id}"): 1,
+    }
+
+
+def test_server_keep_alive(requests_server):
+    route = requests_server.router.get("/api/test")
+    route.returns = good("hello")
+    with requests.Session() as session:
+        for _ in range(20):
+            assert session.get(requests_server.url + "/api/test").text == "hello"
+    assert requests_server.connections == 1
+    assert route.call_count == 20
+
+
+def test_server_chunked_streaming(requests_server):
+    def chunks():
+        for i in range(100):
+            yield b"x" * 1000
+
+    requests_server.router.get("/api/export").returns = good(chunks)
+    response = requests.get(requests_server.url + "/api/export", stream=True)
+    assert response.headers["Transfer-Encoding"] == "chunked"
+    assert sum(len(chunk) for chunk in response.iter_content(4096)) == 100000
+
+
+def test_server_compressed_body(requests_server):
+    body = {"items": list(range(1000))}
+    requests_server.router.get("/api/items").returns = good(body).as_encoded("gzip")
+    response = requests.get(requests_server.url + "/api/items")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json() == body
+
+
+def test_server_from_subprocess(requests_server):
+    requests_server.router.get("/api/test").returns = good("hello")
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            "import sys, urllib.request;"
+            "sys.stdout.write(urllib.request.urlopen(sys.argv[1]).read().decode())",
+            requests_server.url + "/api/test",
+        ]
+    )
+    assert output == b"hello"
+
+
+def test_server_concurrent_connections(requests_server):
+    requests_server.router.get("/api/test").returns = good("hello")
+    request = "GET /api/test HTTP/1.1\r\nHost: {0}\r\n\r\n".format(
+        requests_server.host
+    ).encode()
+
+    async def client():
+        reader, writer = await asyncio.open_connection(
+            requests_server.host, requests_server.port
+        )
+        writer.write(request)
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        body = await reader.readexactly(5)
+        writer.close()
+        return head.split(b" ")[1], body
+
+    async def clients(count):
+        return await asyncio.gather(*[client() for _ in range(count)])
+
+    results = asyncio.run(clients(2000))
+    assert results == [(b"200", b"hello")] * 2000
+    assert requests_server.hits() == {("GET", "/api/test"): 2000}
+
+
+def test_server_slow_route_does_not_block(requests_server):
+    slow = requests_server.router.get("/api/slow")
+    slow.returns = good("slow")
+    slow.clock = RealClock()
+    slow.latency = 0.5
+    requests_server.router.get("/api/fast").returns = good("fast")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(requests.get, requests_server.url + "/api/slow")
+        time.sleep(0.05)
+        started = time.time()
+        assert requests.get(requests_server.url + "/api/fast").text == "fast"
+        assert time.time() - started < 0.3
+        assert pending.result().text == "slow"
+
+
+def test_server_errors(requests_server):
+    route = requests_server.router.get("/api/pages")
+    route.returns = [good("one")]
+    assert requests.get(requests_server.url + "/api/pages").text == "one"
+    response = requests.get(requests_server.url + "/api/pages")
+    assert response.status_code == 500
+    assert "AssertionError" in response.text
+
+    failing = requests_server.router.get("/api/failing")
+    failing.returns = good("never")
+    failing.faults = FaultPolicy().connection_error(1.0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        requests.get(requests_server.url + "/api/failing")
+    assert requests.get(requests_server.url + "/api/pages").status_code == 500
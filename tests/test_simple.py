@@ -57,6 +57,14 @@ def test_mock_context(requests_mock):
     assert requests.sessions.HTTPAdapter is original
 
 
+def test_mock_context_unpatches_on_error(requests_mock):
+    original = requests.sessions.HTTPAdapter
+    with pytest.raises(AssertionError):
+        with requests_mock.patch("/api/not_test"):
+            requests.get("https://test.api/api/test")
+    assert requests.sessions.HTTPAdapter is original
+
+
 def test_returned_headers(requests_mock):
     with requests_mock.patch("/api/test") as patch:
         patch.returns = requests_mock.good("hello", headers={"X-Special": "value"})
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import pytest
+from pytest_requests import stats
+
+
+def test_timing_is_sampled_after_threshold():
+    traffic = stats.TestTraffic("test_chatty")
+    for _ in range(stats.SAMPLE_THRESHOLD + 10 * stats.SAMPLE_EVERY):
+        if traffic.sampled():
+            traffic.record("GET", "/api/test", 5, 0.001, 0.0005)
+        else:
+            traffic.record("GET", "/api/test", 5)
+    assert traffic.calls == stats.SAMPLE_THRESHOLD + 10 * stats.SAMPLE_EVERY
+    assert traffic.bytes == 5 * traffic.calls
+    assert traffic.timed_calls == stats.SAMPLE_THRESHOLD + 10
+    assert abs(traffic.estimated_send_time - 0.001 * traffic.calls) < 1e-9
+    assert traffic.routes == {"GET /api/test": traffic.calls}
+
+
+def test_traffic_report(testdir):
+    testdir.makepyfile(
+        """
+        import requests
+
+        def test_busy(requests_mock):
+            with requests_mock.router() as router:
+                router.get("/api/users/{id}").returns = requests_mock.good("user")
+                router.post("/api/users").returns = requests_mock.good("created")
+                for i in range(1500):
+                    requests.get("https://test.api/api/users/{0}".format(i))
+                requests.post("https://test.api/api/users")
+
+        def test_quiet(requests_mock):
+            with requests_mock.patch("/api/test") as patch:
+                patch.returns = requests_mock.good("hello")
+                requests.get("https://test.api/api/test")
+
+        def test_silent():
+            pass
+    """
+    )
+    report = testdir.tmpdir.join("traffic.json")
+    result = testdir.runpytest(
+        "--requests-report=5", "--requests-report-json={0}".format(report)
+    )
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(
+        [
+            "*requests traffic: top 2 tests by mocked calls*",
+            "*1501 * test_traffic_report.py::test_busy (GET /api/users/{id} x1500)",
+            "*1 * test_traffic_report.py::test_quiet (GET /api/test x1)",
+        ]
+    )
+    tests = json.loads(report.read())["tests"]
+    assert [test["calls"] for test in tests] == [1501, 1]
+    busy = tests[0]
+    assert busy["bytes"] == 1500 * 4 + 7
+    assert busy["routes"] == {"GET /api/users/{id}": 1500, "POST /api/users": 1}
+    assert busy["timed_calls"] < busy["calls"]
+
+
+def test_no_report_by_default(testdir):
+    testdir.makepyfile(
+        """
+        import requests
+
+        def test_quiet(requests_mock):
+            with requests_mock.patch("/api/test") as patch:
+                patch.returns = requests_mock.good("hello")
+                requests.get("https://test.api/api/test")
+    """
+    )
+    result = testdir.runpytest()
+    assert result.ret == 0
+    assert "requests traffic" not in result.stdout.str()
+
+
+def test_counts_are_exact_across_threads():
+    traffic = stats.TestTraffic("test_threads")
+
+    def calls(_):
+        for _ in range(20000):
+            traffic.record("GET", "/api/test", 1)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(calls, range(8)))
+    assert traffic.calls == 160000
+    assert traffic.routes == {"GET /api/test": 160000}
+    assert traffic.bytes == 160000
+
+
+def test_streamed_replayed_and_async_bytes(tmp_path):
+    import asyncio
+    import requests
+    from pytest_requests.aio import AsyncTransport
+    from pytest_requests.cassette import replay, write_cassette
+    from pytest_requests.response import good
+    from pytest_requests.router import router
+
+    write_cassette(str(tmp_path / "api.cassette"), [("GET", "/api/test", good("abc"))])
+    stats.begin("test_streams")
+    try:
+        with router() as mocked:
+            mocked.get("/api/stream").returns = good(lambda: iter([b"ab", b"cd"]))
+            mocked.get("/api/chunked").returns = good("hello").as_encoded(None, chunked=True)
+            response = requests.get("https://test.api/api/stream", stream=True)
+            assert b"".join(response.iter_content(1)) == b"abcd"
+            assert requests.get("https://test.api/api/chunked").text == "hello"
+
+            async def main():
+                response = await AsyncTransport(mocked).send(
+                    "GET", "https://test.api/api/stream"
+                )
+                return await response.read()
+
+            assert asyncio.run(main()) == b"abcd"
+        with replay("api.cassette", directory=str(tmp_path)):
+            assert requests.get("https://test.api/api/test").text == "abc"
+    finally:
+        traffic = stats.end()
+    assert traffic.calls == 4
+    assert traffic.bytes == 4 + 5 + 4 + 3
+    assert traffic.routes == {
+        "GET /api/stream": 2,
+        "GET /api/chunked": 1,
+        "GET /api/test": 1,
+    }
+
+
+def test_traffic_report_with_xdist(testdir):
+    pytest.importorskip("xdist")
+    testdir.makepyfile(
+        """
+        import pytest
+        import requests
+
+        @pytest.mark.parametrize("calls", [1, 2, 3, 4])
+        def test_calls(requests_mock, calls):
+            with requests_mock.patch("/api/test") as patch:
+                patch.returns = requests_mock.good("hello")
+                for _ in range(calls):
+                    requests.get("https://test.api/api/test")
+    """
+    )
+    report = testdir.tmpdir.join("traffic.json")
+    result = testdir.runpytest(
+        "-n", "2", "--requests-report=2", "--requests-report-json={0}".format(report)
+    )
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(
+        [
+            "*requests traffic: top 2 tests by mocked calls*",
+            "*4 *::test_calls?4? (GET /api/test x4)",
+            "*3 *::test_calls?3? (GET /api/test x3)",
+        ]
+    )
+    tests = json.loads(report.read())["tests"]
+    assert sorted(test["calls"] for test in tests) == [1, 2, 3, 4]
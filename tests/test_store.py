@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+
+CONFTEST = """
+    import os
+    from pytest_requests.response import good
+
+    def pytest_requests_build_store(config, store):
+        with open(os.path.join(str(config.rootdir), "built.log"), "a") as fh:
+            fh.write("built\\n")
+        for i in range(100):
+            store.get("/api/items/{0}".format(i), good({"id": i}))
+        store.add("POST", "/api/items", good("created", 201))
+"""
+
+TESTS = """
+    import os
+    import pytest
+    import requests
+
+    @pytest.mark.parametrize("i", range(20))
+    def test_items(requests_store, i):
+        response = requests.get("https://test.api/api/items/{0}".format(i))
+        assert response.json() == {"id": i}
+        assert requests.post("https://test.api/api/items").status_code == 201
+        assert requests_store.journal.count() == 2
+        with open("paths.log", "a") as fh:
+            fh.write(requests_store.cassette.path + "\\n")
+"""
+
+
+def test_store_single_process(testdir):
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile(TESTS)
+    result = testdir.runpytest()
+    result.assert_outcomes(passed=20)
+    assert testdir.tmpdir.join("built.log").read() == "built\n"
+    paths = set(testdir.tmpdir.join("paths.log").read().split())
+    assert len(paths) == 1
+    assert not any(os.path.exists(path) for path in paths)
+
+
+def test_store_shared_by_xdist_workers(testdir):
+    pytest.importorskip("xdist")
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile(TESTS)
+    result = testdir.runpytest("-n", "2", "-p", "no:cacheprovider")
+    result.assert_outcomes(passed=20)
+    assert testdir.tmpdir.join("built.log").read() == "built\n"
+    assert len(set(testdir.tmpdir.join("paths.log").read().split())) == 1
+
+
+def test_store_needs_the_hook(testdir):
+    testdir.makepyfile(
+        """
+        def test_store(requests_store):
+            pass
+    """
+    )
+    result = testdir.runpytest()
+    assert result.ret != 0
+    result.stdout.fnmatch_lines(["*pytest_requests_build_store*"])